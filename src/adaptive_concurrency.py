@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Adaptive request concurrency for clients of the face service
+Grows the number of in-flight requests while latency stays near its no-load
+baseline and the service's batch queue is not backed up; backs off multiplicatively
+when either signal says the GPU is already saturated (gradient / AIMD style).
+"""
+
+import threading
+
+
+class AdaptiveConcurrency:
+    """
+    In-flight request limit driven by observed latency and service queue depth
+
+    Args:
+        min_limit, max_limit: Bounds on concurrent requests (max = executor size)
+        initial: Starting limit (defaults to min_limit)
+        window: Latency samples per adjustment
+        tolerance: Back off when window latency > baseline * tolerance
+        max_queue_depth: Back off when the service reports more queued faces than this
+    """
+
+    def __init__(self, min_limit=1, max_limit=16, initial=None, window=20, tolerance=2.0,
+                 max_queue_depth=64):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(max_limit, initial or min_limit))
+        self.window = window
+        self.tolerance = tolerance
+        self.max_queue_depth = max_queue_depth
+
+        self.baseline = None
+        self.queue_depth = 0
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def observe_queue_depth(self, depth):
+        """Latest queue depth reported by the service's /status"""
+        self.queue_depth = depth or 0
+
+    def record(self, latency):
+        """Add one request latency (seconds); adjusts the limit once per window"""
+        with self._lock:
+            self._samples.append(latency)
+            if len(self._samples) < self.window:
+                return self.limit
+            samples = sorted(self._samples)
+            self._samples = []
+            # Median resists the odd huge photo; baseline is the best window seen,
+            # allowed to drift up slowly so it tracks a changed workload
+            current = samples[len(samples) // 2]
+            if self.baseline is None or current < self.baseline:
+                self.baseline = current
+            else:
+                self.baseline = self.baseline * 0.95 + current * 0.05
+
+            if current > self.baseline * self.tolerance or self.queue_depth > self.max_queue_depth:
+                self.limit = max(self.min_limit, int(self.limit * 0.75))
+            elif current < self.baseline * (1 + (self.tolerance - 1) / 2):
+                self.limit = min(self.max_limit, self.limit + 1)
+            return self.limit
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "baseline_ms": (self.baseline or 0.0) * 1000.0,
+                "queue_depth": self.queue_depth,
+            }
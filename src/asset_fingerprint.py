@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+File fingerprints for incremental face processing
+Every processed asset's (path, size, mtime, content hash) is recorded in
+face_asset_files. A re-scan only stats files: unchanged ones are skipped, files whose
+size/mtime moved but whose bytes hash the same just get their stat refreshed, and
+edited or replaced photos lose their old faces and go back to pending.
+"""
+
+import os
+import sqlite3
+import time
+
+from face_cache import content_hash
+from face_work_queue import DONE, NO_FACES, PENDING, FaceWorkQueue
+
+RECORD_FINGERPRINT_SQL = """
+    INSERT OR REPLACE INTO face_asset_files (asset_id, path, size, mtime_ns, content_hash, recorded_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Finished assets with their current asset path and last recorded fingerprint
+SCAN_SQL = """
+    SELECT q.asset_id, a.path, f.path, f.size, f.mtime_ns, f.content_hash
+    FROM face_work_queue q
+    JOIN assets a ON a.id = q.asset_id
+    LEFT JOIN face_asset_files f ON f.asset_id = q.asset_id
+    WHERE q.status IN (?, ?)
+    ORDER BY q.asset_id
+"""
+
+
+def fingerprint_params(asset_id, path, local_path=None, digest=None, stat=None):
+    """
+    Parameters for RECORD_FINGERPRINT_SQL, or None when the file cannot be read
+
+    ``path`` is the asset path as stored in assets; ``local_path`` is where this
+    process reads it (e.g. the WSL mount). Pass ``digest`` when the bytes were
+    already hashed (content cache, decode stage) to avoid a second read, and
+    ``stat`` ((size, mtime_ns) taken with that read) to skip the stat as well.
+    """
+    local_path = local_path or path
+    try:
+        if stat is None:
+            st = os.stat(local_path)
+            stat = (st.st_size, st.st_mtime_ns)
+        digest = digest or content_hash(local_path)
+    except OSError:
+        return None
+    return (asset_id, path, *stat, digest, time.time())
+
+
+def rescan(db_path, to_local_path=None, verify_hash=True):
+    """
+    Requeue finished assets whose files changed since they were processed
+
+    Args:
+        db_path: Metadata database
+        to_local_path: Maps an asset path to a readable local path
+        verify_hash: Hash files whose size/mtime changed and skip those with
+            identical bytes (touched, copied back, restored from backup)
+
+    Finished assets without a fingerprint (processed before fingerprints were
+    recorded) are adopted from their current stat, so the first scan is metadata-only
+    too. Missing files are counted but keep their faces (drive may be offline).
+
+    Returns:
+        dict of counts: scanned, unchanged, touched, changed, adopted, missing
+    """
+    start = time.time()
+    to_local_path = to_local_path or (lambda path: path)
+    FaceWorkQueue(db_path)  # schema, plus newly imported assets as pending
+    stats = dict.fromkeys(["scanned", "unchanged", "touched", "changed", "adopted", "missing"], 0)
+    refresh, changed = [], []
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for asset_id, path, old_path, old_size, old_mtime, old_hash in conn.execute(SCAN_SQL, (DONE, NO_FACES)):
+            stats["scanned"] += 1
+            local_path = to_local_path(path)
+            try:
+                st = os.stat(local_path)
+            except OSError:
+                stats["missing"] += 1
+                continue
+
+            now = time.time()
+            if old_path is None:
+                refresh.append((asset_id, path, st.st_size, st.st_mtime_ns, None, now))
+                stats["adopted"] += 1
+            elif (path, st.st_size, st.st_mtime_ns) == (old_path, old_size, old_mtime):
+                stats["unchanged"] += 1
+            elif verify_hash and old_hash and st.st_size == old_size and content_hash(local_path) == old_hash:
+                refresh.append((asset_id, path, st.st_size, st.st_mtime_ns, old_hash, now))
+                stats["touched"] += 1
+            else:
+                changed.append((asset_id, path))
+                stats["changed"] += 1
+
+        with conn:
+            conn.executemany(RECORD_FINGERPRINT_SQL, refresh)
+            ids = [(asset_id,) for asset_id, _ in changed]
+            conn.executemany("DELETE FROM face_detections WHERE asset_id = ?", ids)
+            conn.executemany("DELETE FROM face_asset_files WHERE asset_id = ?", ids)
+            conn.executemany("""
+                UPDATE face_work_queue
+                SET status = ?, path = ?, claimed_by = NULL, face_count = NULL, error = NULL, updated_at = ?
+                WHERE asset_id = ?
+            """, [(PENDING, path, time.time(), asset_id) for asset_id, path in changed])
+    finally:
+        conn.close()
+
+    print(f"🔎 Re-scan: {stats['scanned']:,} files in {time.time() - start:.1f}s | "
+          f"unchanged {stats['unchanged']:,} | touched {stats['touched']:,} | "
+          f"changed {stats['changed']:,} (requeued) | adopted {stats['adopted']:,} | "
+          f"missing {stats['missing']:,}")
+    return stats
+
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+asyncio face processing client
+Keeps a configurable window of requests in flight against /process_image from one
+event loop (hundreds of cheap coroutines instead of a few blocking threads) and
+streams every outcome into the shared bulk DB writer.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+
+import requests
+
+from asset_fingerprint import fingerprint_params, rescan
+from face_processing_orchestrator import FaceProcessingOrchestrator
+from face_work_queue import FaceWorkQueue
+
+# aiohttp gives a real non-blocking pooled client; without it requests run on threads
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, requests.RequestException, aiohttp.ClientError)
+except ImportError as e:
+    AIOHTTP_AVAILABLE = False
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, requests.RequestException)
+    print(f"⚠️ aiohttp not available ({e}), falling back to threaded requests")
+
+# Latency percentiles are taken over the most recent requests only
+LATENCY_WINDOW = 10000
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class AsyncFaceProcessingOrchestrator(FaceProcessingOrchestrator):
+    """
+    Event-loop variant of FaceProcessingOrchestrator
+
+    A producer claims pages from the work queue into a bounded asyncio.Queue and
+    ``max_in_flight`` consumer coroutines post them to /process_image; files are
+    read off-loop (asyncio.to_thread) when uploading bytes.
+    """
+
+    def __init__(self, db_path="metadata.sqlite", service_url="http://127.0.0.1:8003",
+                 upload_mode="path", max_in_flight=128, request_timeout=60):
+        super().__init__(db_path=db_path, service_url=service_url, upload_mode=upload_mode)
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.in_flight = 0
+
+    # ---- HTTP -----------------------------------------------------------
+    async def post_image(self, client, asset_id, image_path, wsl_path):
+        """POST one image to /process_image and return the decoded JSON result"""
+        url = f"{self.service_url}/process_image"
+        if self.upload_mode == 'binary':
+            data = await asyncio.to_thread(read_file, wsl_path)
+            kwargs = {'data': data, 'params': {'image_path': image_path, 'asset_id': asset_id},
+                      'headers': {'Content-Type': 'application/octet-stream'}}
+        else:
+            # The service reads the mapped path; asset_id attributes the faces to the asset
+            kwargs = {'json': {'image_path': wsl_path, 'asset_id': asset_id}}
+
+        if AIOHTTP_AVAILABLE:
+            async with client.post(url, **kwargs) as response:
+                if response.status != 200:
+                    return {'error': f"HTTP {response.status}", 'transient': response.status >= 500}
+                return await response.json()
+
+        response = await asyncio.to_thread(client.post, url, timeout=self.request_timeout, **kwargs)
+        if response.status_code != 200:
+            return {'error': f"HTTP {response.status_code}", 'transient': response.status_code >= 500}
+        return response.json()
+
+    def open_client(self):
+        if AIOHTTP_AVAILABLE:
+            return aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+        return self.make_session(self.max_in_flight)
+
+    # ---- pipeline -------------------------------------------------------
+    async def process_one(self, client, asset_id, image_path):
+        wsl_path = self.to_wsl_path(image_path)
+        start = time.perf_counter()
+        try:
+            exists = await asyncio.to_thread(os.path.exists, wsl_path)
+            result = await self.post_image(client, asset_id, image_path, wsl_path) if exists \
+                else {'error': 'File not found'}
+        except TRANSIENT_ERRORS as e:
+            result = {'error': str(e) or type(e).__name__, 'transient': True}
+        except Exception as e:
+            result = {'error': str(e)}
+        self.latencies.append(time.perf_counter() - start)
+        if result.get('transient'):
+            self.requeue(asset_id, result['error'], start)
+            return False
+        fingerprint = None
+        if 'error' not in result:
+            fingerprint = await asyncio.to_thread(fingerprint_params, asset_id, image_path, wsl_path)
+
+        # Outcome goes to the bulk writer (queue put, never a per-image commit)
+        self.mark_finished(asset_id, face_count=result.get('faces', 0), error=result.get('error'), started=start,
+                           fingerprint=fingerprint)
+        if 'error' in result:
+            self.error_count += 1
+            return False
+        self.processed_count += 1
+        if self.processed_count % 50 == 0:
+            self.print_progress()
+        return True
+
+    async def consumer(self, client, queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            self.in_flight += 1
+            try:
+                await self.process_one(client, *item)
+            finally:
+                self.in_flight -= 1
+
+    async def producer(self, queue, batch_size):
+        while not self.stop_processing:
+            page = await asyncio.to_thread(self.get_pending_images, batch_size)
+            if not page:
+                if self.in_flight or not queue.empty() or self.requeued_since_wrap:
+                    # Outstanding requests may still hand assets back after a transient error
+                    await asyncio.sleep(0.2)
+                    continue
+                break
+            for item in page:
+                await queue.put(item)  # blocks while the in-flight window is full
+        for _ in range(self.max_in_flight):
+            await queue.put(None)
+
+    async def run(self, batch_size=200):
+        queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+        client = self.open_client()
+        try:
+            consumers = [asyncio.create_task(self.consumer(client, queue)) for _ in range(self.max_in_flight)]
+            await self.producer(queue, batch_size)
+            await asyncio.gather(*consumers)
+        finally:
+            if AIOHTTP_AVAILABLE:
+                await client.close()
+            else:
+                client.close()
+
+    def start_processing(self, batch_size=200, resume=False, run_id=None):
+        """Run the event loop until the work queue is drained"""
+        print("🚀 STARTING ASYNC FACE PROCESSING")
+        print("=" * 60)
+        journal = self.open_run(resume=resume, run_id=run_id, kind='async_orchestrator')
+        print(f"🎯 Target: {journal.total:,} images ({journal.done:,} already done in this run)")
+        print(f"🔧 In-flight window: {self.max_in_flight} ({'aiohttp' if AIOHTTP_AVAILABLE else 'threaded fallback'})")
+        print(f"📦 Claim page size: {batch_size}")
+        print()
+
+        self.start_time = time.time()
+        interrupted = False
+        try:
+            asyncio.run(self.run(batch_size))
+        except KeyboardInterrupt:
+            print("\n⏹️  Processing stopped by user (resume with --resume)")
+            interrupted = True
+
+        self.stop_processing = True
+        self.finish_run(interrupted)
+        elapsed = time.time() - self.start_time
+
+        print(f"\n🎉 PROCESSING COMPLETE!")
+        print("=" * 40)
+        print(f"✅ Successfully processed: {self.processed_count:,} images")
+        print(f"❌ Errors: {self.error_count}")
+        print(f"♻️ Retried after transient errors: {self.requeued_count}")
+        print(f"⏱️  Total time: {elapsed/60:.1f} minutes")
+        if elapsed > 0:
+            print(f"📈 Average rate: {self.processed_count/elapsed:.1f} images/second")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            print(f"⏱️  Latency p50/p95 (last {len(latencies):,}): {latencies[len(latencies) // 2] * 1000:.0f}/"
+                  f"{latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms")
+
+        return self.processed_count, self.error_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio face processing client')
+    parser.add_argument('--db', default='metadata.sqlite', help='metadata database path')
+    parser.add_argument('--service-url', default='http://127.0.0.1:8003', help='unified face service URL')
+    parser.add_argument('--max-in-flight', type=int, default=128, help='concurrent requests')
+    parser.add_argument('--batch-size', type=int, default=200, help='assets claimed per work-queue page')
+    parser.add_argument('--upload-mode', choices=['path', 'binary'], default='path',
+                        help='path: service reads the file; binary: upload the bytes')
+    parser.add_argument('--resume', action='store_true', help='continue the last unfinished run')
+    parser.add_argument('--run-id', help='run id to create or resume')
+    parser.add_argument('--rescan', action='store_true',
+                        help='stat processed files first and requeue the ones that changed')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='put assets that failed in earlier runs back in the queue first')
+    args = parser.parse_args()
+
+    try:
+        requests.get(f"{args.service_url}/health", timeout=5).raise_for_status()
+    except Exception as e:
+        print(f"❌ Cannot connect to service: {e}")
+        return
+
+    orchestrator = AsyncFaceProcessingOrchestrator(
+        db_path=args.db,
+        service_url=args.service_url,
+        upload_mode=args.upload_mode,
+        max_in_flight=args.max_in_flight
+    )
+    if args.rescan:
+        rescan(args.db, orchestrator.to_wsl_path)
+    if args.retry_failed:
+        print(f"♻️ Requeued {FaceWorkQueue(args.db).retry_failed():,} failed assets")
+    processed, errors = orchestrator.start_processing(
+        batch_size=args.batch_size, resume=args.resume, run_id=args.run_id
+    )
+    print(f"\n📊 Final Results: {processed:,} processed, {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Request-coalescing micro-batch scheduler for ONNX inference
+Collects inputs from concurrent callers into one queue and runs them as a single batch
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+_STOP = object()
+
+
+class MicroBatchScheduler:
+    """
+    Coalesce single-item inference calls from many threads into batched runs
+
+    A background thread pulls queued items and flushes them as one batch as soon as
+    ``max_batch_size`` items are waiting or ``max_wait_ms`` has passed since the first
+    item of the batch arrived. ``run_batch`` receives the stacked inputs (N, ...) and
+    must return an array whose first axis has length N; row i is scattered back to the
+    caller that submitted item i.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=2.0, name="micro-batcher"):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}")
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batch_count = 0
+        self.item_count = 0
+        self.busy_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one input and return a Future resolving to its output row"""
+        future = Future()
+        with self._lock:
+            # Under the lock so nothing can be queued behind _STOP
+            if self._closed:
+                raise RuntimeError("scheduler closed")
+            self._queue.put((item, future))
+        return future
+
+    def run_many(self, items, timeout=None):
+        """Queue several inputs at once and block until all outputs are ready"""
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def stats(self):
+        """Return batching counters for status reporting"""
+        with self._lock:
+            batches = self.batch_count
+            items = self.item_count
+            busy = self.busy_seconds
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "busy_seconds": busy,
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    def close(self, timeout=5.0):
+        """Flush items queued so far and stop the worker thread; later submits raise"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            pending = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                pending.append(item)
+
+            self._flush(pending)
+
+        # Nothing will run what is still queued: fail it instead of leaving callers blocked
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("scheduler closed"))
+
+    def _flush(self, pending):
+        futures = [future for _, future in pending]
+        start = time.perf_counter()
+        try:
+            batch = np.stack([item for item, _ in pending])
+            outputs = self.run_batch(batch)
+            if len(outputs) != len(pending):
+                raise RuntimeError(f"run_batch returned {len(outputs)} rows for {len(pending)} inputs")
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self.batch_count += 1
+                self.item_count += len(pending)
+                self.busy_seconds += time.perf_counter() - start
+
+        for future, output in zip(futures, outputs):
+            future.set_result(output)
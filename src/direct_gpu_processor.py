@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import argparse
 import sqlite3
 import json
 import time
@@ -9,28 +10,83 @@ from datetime import datetime
 import subprocess
 import sys
 
+import numpy as np
+
+from asset_fingerprint import RECORD_FINGERPRINT_SQL, fingerprint_params, rescan
+from embedding_store import EmbeddingStore, ensure_embedding_columns
+from face_clustering import FaceClusterer
+from face_db_writer import FaceDBWriter, StatementGroup
+from face_work_queue import FINISH_SQL, FaceWorkQueue, finish_params, outcome_status
+from gpu_pipeline import FacePipeline
+from run_journal import open_run
+
 # Add the LVFace directory to Python path
 sys.path.append('/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/LVFace')
 
+INSERT_FACE_EMBEDDING_SQL = """
+    INSERT INTO face_detections 
+    (asset_id, bbox_x, bbox_y, bbox_w, bbox_h, confidence, embedding_shard, embedding_row)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+DB_PATH = "/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/vlmPhotoHouse/metadata.sqlite"
+EMBEDDINGS_DIR = "/mnt/e/VLM_DATA/embeddings/face_store"
+MODEL_PATH = "/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/LVFace/models/LVFace-B_Glint360K.onnx"
+
 class DirectGPUFaceProcessor:
-    def __init__(self):
+    def __init__(self, num_decoders=4, infer_batch_size=32, commit_size=200, use_detector=False,
+                 use_gpu=True, intra_op_threads=None, db_path=DB_PATH, embeddings_dir=EMBEDDINGS_DIR,
+                 model_path=MODEL_PATH, session_profile=None):
         self.processed_count = 0
         self.error_count = 0
         self.start_time = None
         self.stop_processing = False
         self.inferencer = None
+        self.detector = None
+        self.pipeline = None
+        self.db_path = db_path
+        self.embeddings_dir = embeddings_dir
+        self.model_path = model_path
+        self.embedding_store = None
+        self.db_writer = None
+        self.db_lock = threading.Lock()
+        self.work_queue = None
+        self.journal = None
+        self.worker_id = f"direct-gpu-{os.getpid()}"
+        
+        # Pipeline settings
+        self.num_decoders = num_decoders
+        self.infer_batch_size = infer_batch_size
+        self.commit_size = commit_size
+        self.use_detector = use_detector
+        
+        # CPU-only hosts: CPUExecutionProvider, thread pools sized per process (see sharded_processor)
+        self.use_gpu = use_gpu
+        self.intra_op_threads = intra_op_threads
+        self.session_profile = session_profile
         
     def initialize_gpu_model(self):
         """Initialize LVFace model directly with GPU"""
         try:
             from inference_onnx import LVFaceONNXInferencer
             
-            model_path = "/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/LVFace/models/LVFace-B_Glint360K.onnx"
+            model_path = self.model_path
             print(f"🤖 Loading model: {model_path}")
             
-            # Initialize with GPU
-            self.inferencer = LVFaceONNXInferencer(model_path, use_gpu=True)
-            print("✅ GPU model loaded successfully")
+            # Initialize with GPU (or CPU with a bounded thread pool)
+            self.inferencer = LVFaceONNXInferencer(model_path, use_gpu=self.use_gpu, batch_size=self.infer_batch_size,
+                                                   intra_op_threads=self.intra_op_threads,
+                                                   profile=self.session_profile)
+            print(f"✅ {'GPU' if self.use_gpu else 'CPU'} model loaded successfully")
+            
+            if self.use_detector:
+                from scrfd_detector import SCRFDDetector
+                self.detector = SCRFDDetector(
+                    providers=None if self.use_gpu else ['CPUExecutionProvider'],
+                    intra_op_threads=self.intra_op_threads,
+                    profile=self.session_profile
+                )
+                print(f"✅ SCRFD detector loaded: {self.detector.model_path}")
             
             # Test inference to warm up GPU
             import numpy as np
@@ -57,114 +113,96 @@ class DirectGPUFaceProcessor:
             print(f"❌ Failed to load GPU model: {e}")
             return False
     
-    def get_pending_images(self, batch_size=50):
-        """Get images that need processing from Windows database"""
-        db_path = "/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/vlmPhotoHouse/metadata.sqlite"
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT a.id, a.path
-            FROM assets a
-            WHERE a.mime LIKE 'image/%'
-            AND a.path IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM face_detections fd 
-                WHERE fd.asset_id = a.id
-            )
-            ORDER BY a.id
-            LIMIT ?
-        """, (batch_size,))
-        
-        pending_images = cursor.fetchall()
-        conn.close()
-        return pending_images
+    def get_pending_images(self, batch_size=50, after_id=0):
+        """Claim images that need processing from the work queue"""
+        if self.work_queue is None:
+            self.work_queue = FaceWorkQueue(self.db_path)
+        return self.work_queue.claim(self.worker_id, batch_size, after_id=after_id)
     
-    def save_face_embedding(self, asset_id, embedding):
-        """Save embedding to Windows database"""
-        db_path = "/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/vlmPhotoHouse/metadata.sqlite"
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                INSERT INTO face_detections 
-                (asset_id, bbox_x, bbox_y, bbox_w, bbox_h)
-                VALUES (?, ?, ?, ?, ?)
-            """, (asset_id, 0, 0, 112, 112))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            print(f"❌ DB Error for asset {asset_id}: {e}")
-            return False
-        finally:
-            conn.close()
+    def open_run(self, resume=False, run_id=None):
+        """Start or resume the run journal; claims are made under the run id"""
+        if self.work_queue is None:
+            self.work_queue = FaceWorkQueue(self.db_path)
+        self.journal = open_run(self.db_path, self.work_queue, 'direct_gpu', resume=resume, run_id=run_id)
+        self.worker_id = self.journal.run_id
+        return self.journal
     
-    def process_image_direct(self, asset_id, image_path):
-        """Process image directly with GPU (no network overhead)"""
-        if self.stop_processing or not self.inferencer:
-            return False
-            
-        try:
-            # Convert Windows path to WSL path
-            if image_path.startswith('E:\\'):
-                wsl_path = image_path.replace('E:\\', '/mnt/e/').replace('\\', '/')
-            elif image_path.startswith('C:\\'):
-                wsl_path = image_path.replace('C:\\', '/mnt/c/').replace('\\', '/')
-            else:
-                wsl_path = image_path
-            
-            if not os.path.exists(wsl_path):
-                self.error_count += 1
-                return False
-            
-            # Load image directly
-            import cv2
-            img = cv2.imread(wsl_path)
-            if img is None:
-                self.error_count += 1
-                return False
-            
-            # Direct GPU inference (no network overhead!)
-            start_inference = time.time()
-            embedding = self.inferencer._infer_onnx(img)
-            inference_time = time.time() - start_inference
-            
-            # Save to database
-            if self.save_face_embedding(asset_id, embedding.tolist()):
-                self.processed_count += 1
-                
-                # Print detailed timing for first few
-                if self.processed_count <= 10:
-                    print(f"  📸 Asset {asset_id}: {inference_time:.3f}s inference | Embedding: {len(embedding)}")
-                
-                if self.processed_count % 10 == 0:
-                    self.print_progress()
-                    
-                return True
-            
-            self.error_count += 1
-            return False
-            
-        except Exception as e:
-            self.error_count += 1
-            return False
+    def journal_outcome(self, writer, asset_id, face_count=None, error=None, seconds=None):
+        if self.journal is not None:
+            self.journal.record(writer, asset_id, outcome_status(face_count, error), seconds)
+    
+    def iter_pending_images(self, batch_size=500):
+        """
+        Yield claimed (asset_id, path) pairs page by page
+        Claims are keyset-paginated (id > last claimed id) and atomic, so several
+        processors can share the queue without handing out an asset twice.
+        """
+        last_id = 0
+        while not self.stop_processing:
+            page = self.get_pending_images(batch_size, after_id=last_id)
+            if not page:
+                return
+            for asset_id, image_path in page:
+                yield asset_id, image_path
+            last_id = page[-1][0]
+    
+    def get_db_writer(self):
+        """Shared bulk writer (one WAL connection, grouped commits), opened on first use"""
+        with self.db_lock:
+            if self.db_writer is None:
+                ensure_embedding_columns(self.db_path)
+                self.embedding_store = EmbeddingStore(self.embeddings_dir)
+                self.db_writer = FaceDBWriter(self.db_path, commit_size=self.commit_size)
+            return self.db_writer
+    
+    def save_face_results(self, records):
+        """
+        Append a group of pipeline embeddings to the store, then queue the assets' status,
+        face rows, journal entries and fingerprints as one atomic write
+        """
+        writer = self.get_db_writer()
+        faces = [(record["asset_id"], face) for record in records if record["error"] is None
+                 for face in record["faces"]]
+        # Embeddings first: a committed face row always points at stored vectors
+        refs = self.embedding_store.append(np.stack([face["embedding"] for _, face in faces])) if faces else []
+
+        group = StatementGroup()
+        group.insert_many(FINISH_SQL, [
+            finish_params(record["asset_id"], len(record["faces"]), record["error"]) for record in records
+        ])
+        group.insert_many(INSERT_FACE_EMBEDDING_SQL, [
+            (asset_id, *face["bbox"], face["confidence"], shard, row)
+            for (asset_id, face), (shard, row) in zip(faces, refs)
+        ])
+        for record in records:
+            self.journal_outcome(group, record["asset_id"], len(record["faces"]), record["error"],
+                                 record.get("seconds"))
+        # Fingerprints of the files just processed (hashed in the decode stage), compared by the next --rescan
+        fingerprints = [
+            fingerprint_params(record["asset_id"], record["path"], self.to_wsl_path(record["path"]),
+                               record.get("digest"), record.get("stat"))
+            for record in records if record["error"] is None and record.get("path")
+        ]
+        group.insert_many(RECORD_FINGERPRINT_SQL, [params for params in fingerprints if params is not None])
+        writer.insert_group(group.statements)
+        self.print_progress()
+        return True
+    
+    @staticmethod
+    def to_wsl_path(image_path):
+        """Convert Windows path to WSL path"""
+        if image_path.startswith('E:\\'):
+            return image_path.replace('E:\\', '/mnt/e/').replace('\\', '/')
+        elif image_path.startswith('C:\\'):
+            return image_path.replace('C:\\', '/mnt/c/').replace('\\', '/')
+        return image_path
     
     def print_progress(self):
-        """Print processing progress"""
-        if self.start_time:
-            elapsed = time.time() - self.start_time
-            rate = self.processed_count / elapsed if elapsed > 0 else 0
-            remaining = 6559 - self.processed_count
-            eta_seconds = remaining / rate if rate > 0 else 0
-            eta_minutes = eta_seconds / 60
-            
-            progress_pct = (self.processed_count / 6559) * 100
-            print(f"🚀 Progress: {self.processed_count:,}/6,559 ({progress_pct:.1f}%) | Errors: {self.error_count} | Rate: {rate:.1f}/sec | ETA: {eta_minutes:.0f}m")
+        """Print progress against the real total, ETA from the recent rate"""
+        if self.journal is not None:
+            print(f"🚀 {self.journal.progress_line()}")
+        else:
+            print(f"🚀 Processed: {self.processed_count:,} | Errors: {self.error_count}")
     
     def monitor_gpu(self):
         """Monitor RTX 3090 usage"""
@@ -195,8 +233,11 @@ class DirectGPUFaceProcessor:
             
             time.sleep(10)
     
-    def start_direct_processing(self, batch_size=100):
-        """Start direct GPU processing (no network overhead)"""
+    def start_direct_processing(self, batch_size=100, resume=False, run_id=None):
+        """
+        Start direct GPU processing (no network overhead)
+        resume=True continues the last unfinished run (or run_id) from its journal.
+        """
         print("🚀 STARTING DIRECT RTX 3090 PROCESSING")
         print("=" * 60)
         print("💡 Processing directly on GPU (no network/API overhead)")
@@ -205,6 +246,9 @@ class DirectGPUFaceProcessor:
         if not self.initialize_gpu_model():
             return
         
+        journal = self.open_run(resume=resume, run_id=run_id)
+        print(f"🎯 Target: {journal.total:,} images ({journal.done:,} already done in this run)")
+        
         self.start_time = time.time()
         
         # Start GPU monitoring
@@ -212,37 +256,40 @@ class DirectGPUFaceProcessor:
         gpu_thread.daemon = True
         gpu_thread.start()
         
+        # Staged pipeline: decoder threads -> batched GPU inference -> grouped DB commits
+        self.pipeline = FacePipeline(
+            self.inferencer,
+            self.save_face_results,
+            detector=self.detector,
+            num_decoders=self.num_decoders,
+            batch_size=self.infer_batch_size,
+            commit_size=self.commit_size,
+            to_local_path=self.to_wsl_path
+        )
+        print(f"🔧 Decoders: {self.num_decoders} | Inference batch: {self.infer_batch_size} | Commit every: {self.commit_size}")
+        
         try:
-            batch_num = 0
-            while not self.stop_processing:
-                # Get next batch
-                pending_images = self.get_pending_images(batch_size)
-                
-                if not pending_images:
-                    print("✅ All images processed!")
-                    break
-                
-                batch_num += 1
-                print(f"\n📦 Batch {batch_num}: Processing {len(pending_images)} images directly...")
-                
-                batch_start = time.time()
-                
-                for asset_id, image_path in pending_images:
-                    if self.stop_processing:
-                        break
-                    
-                    self.process_image_direct(asset_id, image_path)
-                
-                batch_time = time.time() - batch_start
-                batch_rate = len(pending_images) / batch_time
-                print(f"   ⚡ Batch completed: {batch_rate:.1f} images/sec")
+            summary = self.pipeline.run(self.iter_pending_images(batch_size))
+            self.processed_count = summary["saved"]
+            self.error_count = summary["errors"]
+            
+            print("✅ All images processed!")
+            print("📊 Stage utilization (highest = bottleneck):")
+            for stage, utilization in summary["utilization"].items():
+                print(f"   {stage:<7} {utilization * 100:5.1f}%")
         
         except KeyboardInterrupt:
-            print("\n⏹️  Processing stopped by user")
+            print("\n⏹️  Processing stopped by user (resume with --resume)")
             self.stop_processing = True
+            self.pipeline.stop()
         
         # Final results
+        interrupted = self.stop_processing
         self.stop_processing = True
+        self.journal.finish(self.get_db_writer(), 'interrupted' if interrupted else 'finished')
+        if self.db_writer is not None:
+            self.db_writer.close()
+            print(f"💾 DB writer: {self.db_writer.stats()}")
         elapsed = time.time() - self.start_time
         
         print(f"\n🎉 DIRECT GPU PROCESSING COMPLETE!")
@@ -262,13 +309,30 @@ class DirectGPUFaceProcessor:
             print(f"📊 Improvement: {improvement:.0f}% vs previous method")
 
 def main():
-    processor = DirectGPUFaceProcessor()
+    parser = argparse.ArgumentParser(description='Direct GPU face processing')
+    parser.add_argument('--batch-size', type=int, default=500, help='assets claimed per work-queue page')
+    parser.add_argument('--use-detector', action='store_true', help='detect and align faces with SCRFD')
+    parser.add_argument('--resume', action='store_true', help='continue the last unfinished run')
+    parser.add_argument('--run-id', help='run id to create or resume')
+    parser.add_argument('--rescan', action='store_true',
+                        help='stat processed files first and requeue the ones that changed')
+    parser.add_argument('--session-profile', default=None, help='ONNX Runtime session profile (see session_profiles)')
+    parser.add_argument('--cluster', action='store_true', help='assign person clusters to the new faces afterwards')
+    args = parser.parse_args()
+    
+    processor = DirectGPUFaceProcessor(use_detector=args.use_detector, session_profile=args.session_profile)
+    if args.rescan:
+        rescan(processor.db_path, processor.to_wsl_path)
     
     print("🚀 Starting direct RTX 3090 processing in 3 seconds...")
     print("   This bypasses all network overhead!")
     time.sleep(3)
     
-    processor.start_direct_processing(batch_size=50)
+    processor.start_direct_processing(batch_size=args.batch_size, resume=args.resume, run_id=args.run_id)
+    if args.cluster:
+        stats = FaceClusterer(processor.db_path, EmbeddingStore(processor.embeddings_dir)).update()
+        print(f"👥 Clustered {stats['faces']:,} faces: {stats['joined']:,} joined existing clusters, "
+              f"{stats['new_clusters']:,} new, {stats['merged']} merged ({stats['seconds']:.1f}s)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Append-only sharded binary embedding store
+Embeddings are appended as fixed-size rows to raw shard files (shard_00000.bin, ...);
+a face is addressed by (shard, row), so the byte offset is row * dim * itemsize and
+reads are a np.memmap slice with no parsing.
+"""
+
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+STORE_META = "store.json"
+# Held by the one process allowed to append (see EmbeddingStore)
+WRITER_LOCK = "writer.lock"
+
+# face_detections columns that reference a stored embedding
+EMBEDDING_COLUMNS = (("embedding_shard", "INTEGER"), ("embedding_row", "INTEGER"))
+
+
+def ensure_embedding_columns(db_path):
+    """Add embedding_shard / embedding_row to face_detections if they are missing"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(face_detections)")}
+        for name, sql_type in EMBEDDING_COLUMNS:
+            if existing and name not in existing:
+                conn.execute(f"ALTER TABLE face_detections ADD COLUMN {name} {sql_type}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class EmbeddingStore:
+    """
+    Sharded float32/float16 embedding rows on disk
+
+    Args:
+        root: Store directory (created if needed)
+        dim: Embedding dimension
+        dtype: 'float16' (default, 1 KB per 512-d face) or 'float32'
+        shard_rows: Rows per shard before a new shard file is started
+
+    An existing store keeps the dim/dtype/shard_rows recorded in its store.json.
+
+    Single writer: the tail (shard, row) is cached per process, so only one process
+    may append. The first append creates writer.lock (O_EXCL, which also holds
+    between WSL and Windows on a shared drive) and raises RuntimeError if another
+    live writer owns it; close() or interpreter exit removes it. Any number of
+    processes may read.
+    """
+
+    def __init__(self, root, dim=512, dtype="float16", shard_rows=65536):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        meta_path = os.path.join(root, STORE_META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            meta = {"dim": int(dim), "dtype": np.dtype(dtype).name, "shard_rows": int(shard_rows)}
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.shard_rows = meta["shard_rows"]
+        self.row_bytes = self.dim * self.dtype.itemsize
+
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._shard, self._rows = self._find_tail()
+        self._writer = False
+
+    def shard_path(self, shard):
+        return os.path.join(self.root, f"shard_{shard:05d}.bin")
+
+    def _shard_len(self, shard):
+        path = self.shard_path(shard)
+        return os.path.getsize(path) // self.row_bytes if os.path.exists(path) else 0
+
+    def _find_tail(self):
+        """Locate the last shard and drop any partial row left by an interrupted append"""
+        shard = 0
+        while os.path.exists(self.shard_path(shard + 1)):
+            shard += 1
+        path = self.shard_path(shard)
+        rows = self._shard_len(shard)
+        if os.path.exists(path) and os.path.getsize(path) != rows * self.row_bytes:
+            with open(path, "r+b") as f:
+                f.truncate(rows * self.row_bytes)
+        return shard, rows
+
+    def _owner(self):
+        return {"host": socket.gethostname(), "platform": sys.platform, "pid": os.getpid()}
+
+    def _stale(self, owner):
+        """True only for a lock left by a dead process of this host and OS"""
+        if owner.get("host") != socket.gethostname() or owner.get("platform") != sys.platform or os.name != "posix":
+            return False
+        try:
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except (KeyError, TypeError, PermissionError):
+            return False
+        return False
+
+    def _acquire_writer(self):
+        """Take writer.lock and re-read the tail another writer may have moved"""
+        lock_path = os.path.join(self.root, WRITER_LOCK)
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(lock_path) as f:
+                        owner = json.load(f)
+                except (OSError, ValueError):
+                    owner = {}
+                if self._stale(owner):
+                    print(f"⚠️ Removing stale embedding store lock of pid {owner['pid']}")
+                    os.remove(lock_path)
+                    continue
+                raise RuntimeError(f"Embedding store {self.root} already has a writer {owner or ''}; "
+                                   f"stop it (or delete {lock_path} if it is gone) before appending")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._owner(), f)
+            break
+        self._writer = True
+        atexit.register(self.close)
+        self._shard, self._rows = self._find_tail()
+
+    def close(self):
+        """Give up the writer lock (reads keep working)"""
+        with self._lock:
+            if self._writer:
+                self._writer = False
+                try:
+                    os.remove(os.path.join(self.root, WRITER_LOCK))
+                except FileNotFoundError:
+                    pass
+
+    def append(self, embeddings):
+        """
+        Append (N, dim) embeddings
+
+        Returns:
+            list of (int, int): (shard, row) for each embedding, in order
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        data = embeddings.astype(self.dtype, copy=False)
+        refs = []
+        with self._lock:
+            if not self._writer:
+                self._acquire_writer()
+            start = 0
+            while start < len(data):
+                if self._rows >= self.shard_rows:
+                    self._shard, self._rows = self._shard + 1, 0
+                take = min(len(data) - start, self.shard_rows - self._rows)
+                with open(self.shard_path(self._shard), "ab") as f:
+                    f.write(data[start:start + take].tobytes())
+                refs.extend((self._shard, self._rows + i) for i in range(take))
+                self._rows += take
+                start += take
+        return refs
+
+    def shard(self, shard):
+        """Memory-map one shard as a read-only (rows, dim) array"""
+        rows = self._shard_len(shard)
+        cached = self._maps.get(shard)
+        if cached is None or len(cached) < rows:
+            if rows == 0:
+                return np.zeros((0, self.dim), dtype=self.dtype)
+            cached = np.memmap(self.shard_path(shard), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            self._maps[shard] = cached
+        return cached
+
+    def get(self, shard, row):
+        """Return one embedding as float32"""
+        return np.asarray(self.shard(shard)[row], dtype=np.float32)
+
+    def get_many(self, refs):
+        """Gather (shard, row) references into one (N, dim) float32 array"""
+        out = np.empty((len(refs), self.dim), dtype=np.float32)
+        refs = np.asarray(refs, dtype=np.int64).reshape(-1, 2)
+        for shard in np.unique(refs[:, 0]):
+            mask = refs[:, 0] == shard
+            out[mask] = self.shard(int(shard))[refs[mask, 1]]
+        return out
+
+    def count(self):
+        with self._lock:
+            return self._shard * self.shard_rows + self._rows
+
+    def sync(self):
+        """fsync the active shard"""
+        with self._lock:
+            path = self.shard_path(self._shard)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    os.fsync(f.fileno())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Batched 5-point face alignment for LVFace
+Vectorized similarity-transform estimation + warpAffine into a preallocated 112x112 batch
+"""
+
+import cv2
+import numpy as np
+
+from face_preprocess import INPUT_SIZE, normalize_batch
+
+# ArcFace 5-point template (eyes, nose, mouth corners) for 112x112 crops,
+# the same SRC used by onnx_ijbc.AlignedDataSet and eval_ijbc.Embedding
+ARCFACE_SRC = np.array(
+    [
+        [30.2946, 51.6963],
+        [65.5318, 51.5014],
+        [48.0252, 71.7366],
+        [33.5493, 92.3655],
+        [62.7299, 92.2041]]
+    , dtype=np.float32)
+ARCFACE_SRC[:, 0] += 8.0
+
+
+def estimate_similarity_transforms(landmarks, template=ARCFACE_SRC):
+    """
+    Estimate similarity transforms mapping each face's landmarks onto the template
+
+    Batched Umeyama solution, equivalent to skimage.transform.SimilarityTransform.estimate
+    applied face by face, but solved for all faces with one stacked SVD.
+
+    Args:
+        landmarks: (N, 5, 2) detected keypoints in image coordinates
+        template: (5, 2) destination keypoints in crop coordinates
+
+    Returns:
+        np.ndarray: (N, 2, 3) affine matrices for cv2.warpAffine
+    """
+    src = np.asarray(landmarks, dtype=np.float64).reshape(-1, len(template), 2)
+    dst = np.asarray(template, dtype=np.float64)[np.newaxis]
+    n_faces = src.shape[0]
+
+    src_mean = src.mean(axis=1, keepdims=True)
+    dst_mean = dst.mean(axis=1, keepdims=True)
+    src_demean = src - src_mean
+    dst_demean = dst - dst_mean
+
+    cov = np.einsum('nki,nkj->nij', np.broadcast_to(dst_demean, src.shape), src_demean) / src.shape[1]
+    U, S, Vt = np.linalg.svd(cov)
+
+    d = np.ones((n_faces, 2))
+    d[np.linalg.det(cov) < 0, 1] = -1.0
+    R = np.einsum('nij,nj,njk->nik', U, d, Vt)
+
+    src_var = (src_demean ** 2).sum(axis=2).mean(axis=1)
+    scale = (S * d).sum(axis=1) / np.maximum(src_var, 1e-12)
+
+    M = np.empty((n_faces, 2, 3), dtype=np.float64)
+    M[:, :, :2] = scale[:, None, None] * R
+    M[:, :, 2] = dst_mean[:, 0] - np.einsum('nij,nj->ni', M[:, :, :2], src_mean[:, 0])
+    return M
+
+
+def align_faces(image, landmarks, out=None, image_size=INPUT_SIZE, template=ARCFACE_SRC):
+    """
+    Warp every face of one image straight into an (N, H, W, 3) uint8 batch
+
+    Args:
+        image: Source image (BGR uint8)
+        landmarks: (N, 5, 2) keypoints for the faces in ``image``
+        out: Optional preallocated (>=N, H, W, 3) uint8 buffer to fill
+        image_size: (width, height) of the aligned crops
+
+    Returns:
+        np.ndarray: (N, H, W, 3) aligned faces, a view of ``out`` when one is supplied
+    """
+    matrices = estimate_similarity_transforms(landmarks, template)
+    n_faces = len(matrices)
+    width, height = image_size
+    if out is None:
+        out = np.empty((n_faces, height, width, 3), dtype=np.uint8)
+    out = out[:n_faces]
+
+    for i in range(n_faces):
+        cv2.warpAffine(image, matrices[i], (width, height), dst=out[i], borderValue=0.0)
+    return out
+
+
+def align_and_preprocess(image, landmarks, out=None, image_size=INPUT_SIZE):
+    """Align faces and return the normalized (N, 3, H, W) LVFace input batch"""
+    return normalize_batch(align_faces(image, landmarks, image_size=image_size), out=out)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Content-addressed face result cache
+Results (detections + embeddings) are keyed by a hash of the image bytes plus the model
+id and PREPROCESS_VERSION, so byte-identical copies and re-imports are answered with
+one lookup instead of decode -> detect -> embed. An LRU dict sits in front of an
+optional sqlite table that persists across restarts and is shared between processes.
+"""
+
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from face_preprocess import PREPROCESS_VERSION
+
+HASH_CHUNK = 1 << 20
+
+CACHE_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS face_result_cache (
+        cache_key TEXT PRIMARY KEY,
+        faces TEXT NOT NULL,
+        embeddings BLOB,
+        dim INTEGER,
+        created_at REAL
+    )
+"""
+
+CACHE_PUT_SQL = """
+    INSERT OR REPLACE INTO face_result_cache (cache_key, faces, embeddings, dim, created_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def content_hash(source):
+    """BLAKE2b-128 of a file (path, read in 1 MB chunks) or of encoded bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def cache_key(digest, model_id):
+    return f"{digest}:{model_id}:p{PREPROCESS_VERSION}"
+
+
+class FaceResultCache:
+    """
+    Two-tier cache of per-image face results
+
+    Args:
+        model_id: Identifies everything that changes results (models, detector mode)
+        capacity: Entries kept in the in-memory LRU tier
+        db_path: Optional sqlite file for the persistent tier
+        writer: Optional FaceDBWriter; persistent puts are queued on it instead of
+            committed one by one
+
+    Values are (faces, embeddings): a list of JSON-able face dicts and an (N, D)
+    float32 array (None when there are no faces).
+    """
+
+    def __init__(self, model_id, capacity=4096, db_path=None, writer=None):
+        self.model_id = model_id
+        self.capacity = capacity
+        self.db_path = db_path
+        self.writer = writer
+        self._lru = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(CACHE_SCHEMA_SQL)
+            self._conn.commit()
+
+    def key_for(self, source):
+        """Cache key for an image path or encoded bytes"""
+        return cache_key(content_hash(source), self.model_id)
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT faces, embeddings, dim FROM face_result_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            faces = json.loads(row[0])
+            embeddings = np.frombuffer(row[1], dtype=np.float32).reshape(-1, row[2]) if row[1] else None
+            value = (faces, embeddings)
+            self._remember(key, value)
+            self.disk_hits += 1
+            return value
+
+    def put(self, key, faces, embeddings=None):
+        if embeddings is not None:
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if embeddings.size == 0:
+                embeddings = None
+        with self._lock:
+            self._remember(key, (faces, embeddings))
+        if self._conn is None:
+            return
+        params = (
+            key,
+            json.dumps(faces),
+            embeddings.tobytes() if embeddings is not None else None,
+            embeddings.shape[1] if embeddings is not None else None,
+            time.time(),
+        )
+        if self.writer is not None:
+            self.writer.insert(CACHE_PUT_SQL, params)
+        else:
+            with self._lock:
+                self._conn.execute(CACHE_PUT_SQL, params)
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+            }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Incremental face clustering (person grouping)
+Faces are linked to their k nearest neighbours from the search index when the
+cosine similarity clears a threshold, and the connected components of that k-NN
+graph are the clusters, so no N x N similarity matrix is ever built. Cluster ids
+are persisted in face_clusters: update() only clusters faces that have none yet
+(joining, or merging, the existing clusters they link to), and a full recluster()
+keeps the previous id of every cluster that still mostly exists.
+"""
+
+import sqlite3
+import time
+
+import numpy as np
+
+from face_index import FaceIndex
+from ivf_index import IVFIndex
+
+CLUSTER_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS face_clusters (
+        face_id INTEGER PRIMARY KEY,
+        cluster_id INTEGER NOT NULL,
+        updated_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_face_clusters_cluster_id
+        ON face_clusters (cluster_id);
+"""
+
+# Faces with a stored embedding and no cluster yet
+UNCLUSTERED_SQL = """
+    SELECT fd.id, fd.embedding_shard, fd.embedding_row
+    FROM face_detections fd LEFT JOIN face_clusters fc ON fc.face_id = fd.id
+    WHERE fc.face_id IS NULL AND fd.embedding_shard IS NOT NULL
+    ORDER BY fd.id
+"""
+
+# Clusters of faces whose row was deleted (e.g. by a re-scan)
+PRUNE_SQL = """
+    DELETE FROM face_clusters
+    WHERE face_id NOT IN (SELECT id FROM face_detections WHERE embedding_shard IS NOT NULL)
+"""
+
+ASSIGN_SQL = "INSERT OR REPLACE INTO face_clusters (face_id, cluster_id, updated_at) VALUES (?, ?, ?)"
+
+
+def connected_components(num_nodes, a, b):
+    """
+    Component label of every node of an undirected graph with edges a[i] -- b[i]
+
+    Min-label propagation with pointer jumping, in NumPy; a component's label is its
+    smallest node.
+    """
+    labels = np.arange(num_nodes)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while len(a):
+        low = np.minimum(labels[a], labels[b])
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[a], low)
+        np.minimum.at(hooked, labels[b], low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+    return labels
+
+
+def knn_edges(probe_ids, probes, search, k, threshold):
+    """(probe row, neighbour face id) pairs with similarity >= threshold, self-matches excluded"""
+    ids, scores = search(probes, k + 1)
+    keep = (scores >= threshold) & (ids != np.asarray(probe_ids)[:, None]) & (ids >= 0)
+    rows = np.nonzero(keep)[0]
+    return rows, ids[keep]
+
+
+class FaceClusterer:
+    """
+    Threshold k-NN graph clustering over face_detections, persisted in face_clusters
+
+    Args:
+        db_path: metadata.sqlite
+        store: EmbeddingStore the face rows point into
+        threshold: Cosine similarity that links two faces
+        k: Neighbours looked up per face
+        search: ``search(probes, k) -> (ids, scores)`` over all stored faces (default:
+            an exact FaceIndex synced from the database on each update)
+    """
+
+    def __init__(self, db_path, store, threshold=0.5, k=10, search=None):
+        self.db_path = db_path
+        self.store = store
+        self.threshold = threshold
+        self.k = k
+        self.index = None
+        self.search = search
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            conn.executescript(CLUSTER_SCHEMA_SQL)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _search(self):
+        if self.search is not None:
+            return self.search
+        if self.index is None:
+            self.index = FaceIndex(dim=self.store.dim)
+        self.index.sync(self.db_path, self.store)
+        return self.index.search
+
+    @staticmethod
+    def _cluster_of(conn, face_ids):
+        """{face_id: cluster_id} for the given faces that have a cluster"""
+        clusters = {}
+        face_ids = sorted(set(face_ids))
+        for start in range(0, len(face_ids), 900):  # sqlite host-parameter limit
+            chunk = face_ids[start:start + 900]
+            clusters.update(conn.execute(
+                f"SELECT face_id, cluster_id FROM face_clusters WHERE face_id IN ({','.join('?' * len(chunk))})",
+                chunk))
+        return clusters
+
+    def update(self, batch_size=4096):
+        """
+        Cluster every face without a cluster id
+
+        Each face joins the cluster its above-threshold neighbours belong to; a face
+        linking several clusters merges them into the oldest (smallest) id; faces
+        linking to no clustered face form new clusters among themselves.
+
+        Returns:
+            dict: faces, joined, new_clusters, merged, pruned, seconds
+        """
+        start_time = time.time()
+        search = self._search()
+        stats = {"faces": 0, "joined": 0, "new_clusters": 0, "merged": 0, "pruned": 0}
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            stats["pruned"] = conn.execute(PRUNE_SQL).rowcount
+            next_id = (conn.execute("SELECT MAX(cluster_id) FROM face_clusters").fetchone()[0] or 0) + 1
+            rows = conn.execute(UNCLUSTERED_SQL).fetchall()
+            for first in range(0, len(rows), batch_size):
+                batch = rows[first:first + batch_size]
+                face_ids = np.array([row[0] for row in batch], dtype=np.int64)
+                vectors = self.store.get_many([(row[1], row[2]) for row in batch])
+                src, neighbours = knn_edges(face_ids, vectors, search, self.k, self.threshold)
+
+                # Nodes: the batch's faces, then every existing cluster they link to
+                local = np.searchsorted(face_ids, neighbours)
+                local = np.minimum(local, len(face_ids) - 1)
+                in_batch = face_ids[local] == neighbours
+                known = self._cluster_of(conn, neighbours[~in_batch].tolist())
+                linked = np.array([known.get(face_id, -1) for face_id in neighbours[~in_batch].tolist()],
+                                  dtype=np.int64)
+                cluster_ids = np.unique(linked[linked >= 0])
+                cluster_nodes = len(face_ids) + np.searchsorted(cluster_ids, linked[linked >= 0])
+                a = np.concatenate([src[in_batch], src[~in_batch][linked >= 0]])
+                b = np.concatenate([local[in_batch], cluster_nodes])
+                labels = connected_components(len(face_ids) + len(cluster_ids), a, b)
+
+                # Oldest existing cluster of each component (or -1)
+                target = np.full(len(labels), -1, dtype=np.int64)
+                for node, cluster_id in zip(range(len(face_ids), len(labels)), cluster_ids.tolist()):
+                    root = labels[node]
+                    if target[root] < 0:
+                        target[root] = cluster_id  # cluster_ids ascend: first seen is the oldest
+                    else:
+                        conn.execute("UPDATE face_clusters SET cluster_id = ?, updated_at = ? WHERE cluster_id = ?",
+                                     (int(target[root]), time.time(), cluster_id))
+                        stats["merged"] += 1
+
+                stats["joined"] += int((target[labels[:len(face_ids)]] >= 0).sum())
+                assigned = []
+                now = time.time()
+                for face_id, root in zip(face_ids.tolist(), labels[:len(face_ids)].tolist()):
+                    if target[root] < 0:
+                        target[root] = next_id
+                        next_id += 1
+                        stats["new_clusters"] += 1
+                    assigned.append((face_id, int(target[root]), now))
+                conn.executemany(ASSIGN_SQL, assigned)
+                stats["faces"] += len(assigned)
+            conn.commit()
+        finally:
+            conn.close()
+        stats["seconds"] = round(time.time() - start_time, 2)
+        return stats
+
+    def recluster(self, nprobe=8, nlist=None, batch_size=4096, search=None):
+        """
+        Rebuild every cluster from the k-NN graph of the whole gallery, searched with
+        ``search`` or else a throwaway IVF index (``nlist`` cells, ``nprobe`` probed)
+
+        New components keep the old id most of their faces had, when no larger
+        component claimed it first; the rest get fresh ids.
+
+        Returns:
+            dict: faces, clusters, kept_ids, seconds
+        """
+        start_time = time.time()
+        gallery = FaceIndex(dim=self.store.dim)
+        gallery.sync(self.db_path, self.store)
+        face_ids = gallery.ids
+        order = np.argsort(face_ids)
+        face_ids = face_ids[order]
+        vectors = gallery.embeddings[order]
+        del gallery
+        if not len(face_ids):
+            return {"faces": 0, "clusters": 0, "kept_ids": 0, "seconds": 0.0}
+
+        if search is None:
+            ivf = IVFIndex.build(face_ids, vectors, nlist)
+            search = lambda probes, k: ivf.search(probes, k, nprobe)  # noqa: E731
+        a, b = [], []
+        for first in range(0, len(face_ids), batch_size):
+            src, neighbours = knn_edges(face_ids[first:first + batch_size], vectors[first:first + batch_size],
+                                        search, self.k, self.threshold)
+            nodes = np.minimum(np.searchsorted(face_ids, neighbours), len(face_ids) - 1)
+            known = face_ids[nodes] == neighbours  # an ANN search may return deleted faces
+            a.append(src[known] + first)
+            b.append(nodes[known])
+        labels = connected_components(len(face_ids), np.concatenate(a), np.concatenate(b))
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            old = dict(conn.execute("SELECT face_id, cluster_id FROM face_clusters"))
+            previous = np.array([old.get(face_id, -1) for face_id in face_ids.tolist()], dtype=np.int64)
+            next_id = max(old.values(), default=0) + 1
+
+            # Largest (component, old id) overlaps claim their old id first
+            roots, sizes = np.unique(labels, return_counts=True)
+            size_of = dict(zip(roots.tolist(), sizes.tolist()))
+            pairs, counts = np.unique(np.stack([labels, previous])[:, previous >= 0], axis=1, return_counts=True)
+            new_id, taken = {}, set()
+            for i in sorted(range(len(counts)), key=lambda i: (-counts[i], -size_of[pairs[0, i]])):
+                root, cluster_id = int(pairs[0, i]), int(pairs[1, i])
+                if root not in new_id and cluster_id not in taken:
+                    new_id[root] = cluster_id
+                    taken.add(cluster_id)
+            kept = len(new_id)
+            for root in roots.tolist():
+                if root not in new_id:
+                    new_id[root] = next_id
+                    next_id += 1
+
+            now = time.time()
+            conn.execute("DELETE FROM face_clusters")
+            conn.executemany(ASSIGN_SQL, ((face_id, new_id[root], now)
+                                          for face_id, root in zip(face_ids.tolist(), labels.tolist())))
+            conn.commit()
+        finally:
+            conn.close()
+        return {"faces": len(face_ids), "clusters": len(roots), "kept_ids": kept,
+                "seconds": round(time.time() - start_time, 2)}
+
+    def stats(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            faces, clusters = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT cluster_id) FROM face_clusters").fetchone()
+            largest = conn.execute(
+                "SELECT COUNT(*) AS n FROM face_clusters GROUP BY cluster_id ORDER BY n DESC LIMIT 1").fetchone()
+        finally:
+            conn.close()
+        return {"faces": faces, "clusters": clusters, "largest": largest[0] if largest else 0,
+                "threshold": self.threshold, "k": self.k}
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Compressed gallery encodings for FaceIndex
+A 512-d float32 embedding is 2 KB; these codecs keep the search gallery in
+  float16  2 bytes/dim
+  int8     1 byte/dim plus a per-vector scale
+  pq       product quantization: one byte per sub-vector (64 bytes for 64
+           sub-spaces), scored with asymmetric distance tables (the probe stays
+           float32, only the gallery is quantized)
+and FaceIndex re-ranks the best candidates with the full-precision embeddings from
+the embedding store. PQ only trains once the gallery is big enough to fit its
+centroids (FaceIndex keeps float16 until then) and is retrained as the gallery grows.
+"""
+
+import numpy as np
+
+# Gallery rows decoded / scored per block, bounding the float32 temporaries
+SCORE_ROWS = 65536
+
+# Centroids per PQ sub-space (one uint8 code)
+PQ_CENTROIDS = 256
+
+
+class Float32Codec:
+    """Uncompressed (the exact gallery)"""
+
+    name = "float32"
+    dtype = np.float32
+    trained = True
+    # Training policy of codecs learned from the gallery (see PQCodec)
+    train_size = 0
+    min_train_size = 0
+    retrain_growth = None
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    @property
+    def code_size(self):
+        return self.dim
+
+    @property
+    def bytes_per_face(self):
+        return self.code_size * np.dtype(self.dtype).itemsize
+
+    def train(self, vectors):
+        pass
+
+    def encode(self, vectors):
+        """(N, dim) unit vectors -> (codes, scales)"""
+        return np.asarray(vectors, dtype=self.dtype), np.ones(len(vectors), dtype=np.float32)
+
+    def decode(self, codes, scales):
+        return codes.astype(np.float32) * scales[:, None]
+
+    def scores(self, probes, codes, scales):
+        """(Q, N) similarities between float32 probes and encoded gallery rows"""
+        out = np.empty((len(probes), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_ROWS):
+            block = slice(start, start + SCORE_ROWS)
+            out[:, block] = probes @ codes[block].astype(np.float32, copy=False).T
+        return out
+
+
+class Float16Codec(Float32Codec):
+    name = "float16"
+    dtype = np.float16
+
+
+class Int8Codec(Float32Codec):
+    """Symmetric int8 per vector: x ~= codes * scale, scale = max|x| / 127"""
+
+    name = "int8"
+    dtype = np.int8
+
+    @property
+    def bytes_per_face(self):
+        return self.code_size + 4
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, probes, codes, scales):
+        return super().scores(probes, codes, scales) * scales
+
+
+def kmeans(vectors, clusters, iterations=15, seed=0):
+    """Euclidean k-means; empty clusters are re-seeded from random rows"""
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=len(vectors) < clusters)].copy()
+    for _ in range(iterations):
+        labels = nearest(vectors, centroids)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.stack([np.bincount(labels, weights=column, minlength=clusters)
+                         for column in vectors.T], axis=1)
+        used = counts > 0
+        centroids[used] = sums[used] / counts[used, None]
+        centroids[~used] = vectors[rng.choice(len(vectors), int((~used).sum()))]
+    return centroids
+
+
+def nearest(vectors, centroids):
+    """Index of the closest centroid (L2) for each row"""
+    distances = (centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+
+class PQCodec(Float32Codec):
+    """
+    Product quantization: ``subspaces`` sub-vectors of dim / subspaces values, each
+    replaced by the index of its nearest of 256 trained centroids
+
+    A probe is scored against all codes through a (subspaces, 256) table of its
+    sub-vector dot products with the centroids (asymmetric distance computation).
+
+    Args:
+        train_size: Rows sampled for k-means
+        min_train_size: Gallery size FaceIndex waits for before training (at least
+            256, so every centroid is a distinct row; default 16 rows per centroid)
+        retrain_growth: FaceIndex retrains and re-encodes once the gallery has grown
+            by this factor since the last training (None = never)
+    """
+
+    name = "pq"
+    dtype = np.uint8
+
+    def __init__(self, dim=512, subspaces=64, train_size=16384, min_train_size=16 * PQ_CENTROIDS,
+                 retrain_growth=2.0):
+        if dim % subspaces:
+            raise ValueError(f"dim {dim} is not divisible into {subspaces} PQ sub-spaces")
+        self.dim = dim
+        self.subspaces = subspaces
+        self.sub_dim = dim // subspaces
+        self.train_size = train_size
+        self.min_train_size = max(min_train_size, PQ_CENTROIDS)
+        self.retrain_growth = retrain_growth
+        self.centroids = None  # (subspaces, 256, sub_dim)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def code_size(self):
+        return self.subspaces
+
+    def _split(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.subspaces, self.sub_dim)
+
+    def train(self, vectors):
+        """Per-sub-space k-means on at most ``train_size`` rows (at least 256 needed)"""
+        if len(vectors) < PQ_CENTROIDS:
+            raise ValueError(f"PQ needs at least {PQ_CENTROIDS} training vectors, got {len(vectors)}")
+        if len(vectors) > self.train_size:
+            vectors = vectors[np.random.RandomState(0).choice(len(vectors), self.train_size, replace=False)]
+        parts = self._split(vectors)
+        self.centroids = np.stack([kmeans(parts[:, s], PQ_CENTROIDS, seed=s) for s in range(self.subspaces)])
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty((len(parts), self.subspaces), dtype=np.uint8)
+        for s in range(self.subspaces):
+            codes[:, s] = nearest(parts[:, s], self.centroids[s])
+        return codes, np.ones(len(parts), dtype=np.float32)
+
+    def decode(self, codes, scales):
+        return self.centroids[np.arange(self.subspaces), codes].reshape(len(codes), self.dim)
+
+    def scores(self, probes, codes, scales):
+        # tables[s, q, c] = <probe q sub-vector s, centroid c of sub-space s>
+        tables = np.einsum("qsd,scd->sqc", self._split(probes), self.centroids)
+        out = np.zeros((len(probes), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_ROWS):
+            # Sub-space-major codes: each lookup reads one contiguous code column
+            columns = np.ascontiguousarray(codes[start:start + SCORE_ROWS].T)
+            block = out[:, start:start + SCORE_ROWS]
+            for s in range(self.subspaces):
+                block += np.take(tables[s], columns[s], axis=1)
+        return out
+
+
+CODECS = {
+    "float32": Float32Codec,
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": PQCodec,
+}
+
+
+def make_codec(name="float32", dim=512, **options):
+    """Codec by name: float32, float16, int8 or pq"""
+    if name not in CODECS:
+        raise ValueError(f"Unknown gallery encoding '{name}' (available: {', '.join(CODECS)})")
+    return CODECS[name](dim, **options)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Shared persistence layer for face_detections
+One long-lived WAL-mode sqlite connection owned by a single writer thread; callers on
+any thread enqueue rows, which are written with executemany and committed in groups.
+Statements that must land together (an asset's status and its face rows) are queued
+as one group and always written in the same transaction.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+_FLUSH = object()
+_STOP = object()
+_GROUP = object()
+
+
+class StatementGroup:
+    """
+    Collects rows with the FaceDBWriter insert / insert_many interface, to be queued
+    together with ``writer.insert_group(group.statements)``
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def insert(self, sql, params):
+        self.insert_many(sql, [params])
+
+    def insert_many(self, sql, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        if self.statements and self.statements[-1][0] == sql:
+            self.statements[-1][1].extend(rows)
+        else:
+            self.statements.append((sql, rows))
+
+
+class FaceDBWriter:
+    """
+    Single-writer queue in front of a sqlite database
+
+    Consecutive rows for the same SQL statement are merged into one executemany, and
+    everything queued is committed in order when ``commit_size`` rows are pending or
+    ``commit_interval`` seconds have passed since the last commit, so a DB on /mnt/c
+    pays one fsync per group instead of one per face.
+    """
+
+    def __init__(self, db_path, commit_size=500, commit_interval=2.0, queue_size=10000):
+        self.db_path = db_path
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.commit_count = 0
+        self.last_error = None
+
+        # Opened here so connection errors surface to the caller; only the writer thread uses it
+        self._conn = self.connect()
+        self._thread = threading.Thread(target=self._loop, name="face-db-writer", daemon=True)
+        self._thread.start()
+
+    def connect(self):
+        """Open the writer connection with WAL journaling"""
+        conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def insert(self, sql, params):
+        """Queue one row for ``sql``"""
+        self._queue.put((sql, [params]))
+
+    def insert_many(self, sql, rows):
+        """Queue several rows for ``sql``"""
+        rows = list(rows)
+        if rows:
+            self._queue.put((sql, rows))
+
+    def insert_group(self, statements):
+        """
+        Queue ``[(sql, rows), ...]`` to be written in order within one transaction
+
+        A group is never split across commits, and if any of its rows fails the whole
+        group is rolled back and counted as failed.
+        """
+        statements = [(sql, list(rows)) for sql, rows in statements]
+        statements = [(sql, rows) for sql, rows in statements if rows]
+        if statements:
+            self._queue.put((_GROUP, statements))
+
+    def flush(self, timeout=None):
+        """Commit everything queued so far and wait for it"""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=30):
+        """Commit pending rows and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows_written": self.rows_written,
+                "rows_failed": self.rows_failed,
+                "commits": self.commit_count,
+                "queue_depth": self._queue.qsize(),
+                "last_error": self.last_error,
+            }
+
+    def _write(self, conn, pending):
+        """
+        Write pending entries in order in one transaction; if it fails, retry each
+        group atomically and each plain statement row by row to isolate bad rows
+        """
+        written, failed = 0, 0
+        try:
+            with conn:
+                for group, statements in pending:
+                    for sql, rows in statements:
+                        conn.executemany(sql, rows)
+                        written += len(rows)
+        except sqlite3.Error as e:
+            written = 0
+            self.last_error = str(e)
+            print(f"⚠️ Batch write failed ({e}), retrying row by row")
+            for group, statements in pending:
+                if group:
+                    size = sum(len(rows) for _, rows in statements)
+                    try:
+                        with conn:
+                            for sql, rows in statements:
+                                conn.executemany(sql, rows)
+                        written += size
+                    except sqlite3.Error as group_error:
+                        failed += size
+                        self.last_error = str(group_error)
+                    continue
+                for sql, rows in statements:
+                    for row in rows:
+                        try:
+                            with conn:
+                                conn.execute(sql, row)
+                            written += 1
+                        except sqlite3.Error as row_error:
+                            failed += 1
+                            self.last_error = str(row_error)
+        with self._lock:
+            self.rows_written += written
+            self.rows_failed += failed
+            self.commit_count += 1
+
+    def _loop(self):
+        conn = self._conn
+        pending = []  # (is_group, [(sql, rows), ...]) in queue order
+        pending_rows = 0
+        last_commit = time.monotonic()
+        stopping = False
+
+        while not stopping:
+            timeout = max(0.0, self.commit_interval - (time.monotonic() - last_commit))
+            try:
+                item = self._queue.get(timeout=timeout if pending_rows else None)
+            except queue.Empty:
+                item = None
+
+            waiter = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None and item[0] is _FLUSH:
+                waiter = item[1]
+            elif item is not None and item[0] is _GROUP:
+                pending.append((True, item[1]))
+                pending_rows += sum(len(rows) for _, rows in item[1])
+            elif item is not None:
+                sql, rows = item
+                if pending and not pending[-1][0] and pending[-1][1][0][0] == sql:
+                    pending[-1][1][0][1].extend(rows)
+                else:
+                    pending.append((False, [(sql, list(rows))]))
+                pending_rows += len(rows)
+
+            due = time.monotonic() - last_commit >= self.commit_interval
+            if pending_rows and (stopping or waiter or due or pending_rows >= self.commit_size):
+                self._write(conn, pending)
+                pending = []
+                pending_rows = 0
+                last_commit = time.monotonic()
+            elif not pending_rows:
+                last_commit = time.monotonic()
+            if waiter is not None:
+                waiter.set()
+
+        conn.close()
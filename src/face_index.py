@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+1:N face search over stored LVFace embeddings
+FaceIndex keeps the gallery as one contiguous, L2-normalized float32 matrix, so a
+query for one or many probes is a single matrix multiply (cosine similarity) plus
+argpartition for the top k, instead of a normalize-and-compare call per pair.
+Rows are keyed by face_detections.id and kept in sync with the database as the
+pipeline adds faces and re-scans drop them. The gallery can be held compressed
+(float16 / int8 / product-quantized, see face_codecs), with the best candidates
+re-ranked from the full-precision embedding store; a codec that has to be trained
+(pq) is stood in for by float16 until the gallery is large enough, and retrained on
+the grown gallery from time to time.
+"""
+
+import copy
+import sqlite3
+import threading
+
+import numpy as np
+
+from face_codecs import SCORE_ROWS, Float16Codec, make_codec
+
+# Largest probes x gallery score block materialized at once (floats)
+SCORE_BLOCK = 1 << 25
+
+GALLERY_SQL = """
+    SELECT id, embedding_shard, embedding_row FROM face_detections
+    WHERE id > ? AND embedding_shard IS NOT NULL
+    ORDER BY id
+"""
+
+LIVE_COUNT_SQL = """
+    SELECT COUNT(*) FROM face_detections WHERE id > ? AND id <= ? AND embedding_shard IS NOT NULL
+"""
+
+LIVE_IDS_SQL = """
+    SELECT id FROM face_detections WHERE id > ? AND id <= ? AND embedding_shard IS NOT NULL
+"""
+
+
+def l2_normalize(vectors):
+    """Rows scaled to unit length as float32 (zero rows stay zero)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class FaceIndex:
+    """
+    Exact cosine-similarity gallery
+
+    Args:
+        dim: Embedding size
+        capacity: Initial rows allocated; the matrix doubles when full
+        base_id: Only faces with a larger id are synced (the rest are served by a
+            prebuilt index, see ivf_index)
+        encoding: Gallery codec name (float32, float16, int8, pq) or instance; an
+            untrained codec is used once ``codec.min_train_size`` faces are indexed
+        rerank: Candidates re-scored from the embedding store when the encoding is
+            lossy (0 = rank by the compressed scores alone)
+        store: EmbeddingStore holding the full-precision rows (set by sync)
+
+    Removal moves the last row into the freed slot, so the first ``len(index)``
+    rows are always the whole gallery.
+    """
+
+    def __init__(self, dim=512, capacity=1024, base_id=0, encoding="float32", rerank=0, store=None):
+        self.dim = dim
+        self.target_codec = make_codec(encoding, dim) if isinstance(encoding, str) else encoding
+        # Gallery codec in use: float16 until the target codec can be trained
+        self.codec = self.target_codec if self.target_codec.trained else Float16Codec(dim)
+        self._trained_size = 0  # gallery size at the last training
+        self._dirty = None  # ids added or replaced while a training runs (None: no training)
+        self.rerank = rerank
+        self._matrix = np.empty((capacity, self.codec.code_size), dtype=self.codec.dtype)
+        self._scales = np.empty(capacity, dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        # (shard, row) of each face in the embedding store, for re-ranking
+        self._refs = np.empty((capacity, 2), dtype=np.int64)
+        self.store = store
+        self._count = 0
+        self._slots = {}
+        self._lock = threading.RLock()
+        self.base_id = base_id
+        self.synced_id = base_id
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def ids(self):
+        return self._ids[:self._count].copy()
+
+    @property
+    def embeddings(self):
+        """(N, dim) normalized gallery (decoded), in the order of ``ids``"""
+        with self._lock:
+            return self.codec.decode(self._matrix[:self._count], self._scales[:self._count])
+
+    def _reserve(self, rows):
+        if rows <= len(self._ids):
+            return
+        capacity = max(rows, 2 * len(self._ids))
+        for name in ("_matrix", "_scales", "_ids", "_refs"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def add(self, ids, embeddings, refs=None):
+        """
+        Insert or replace faces; ``embeddings`` is (N, dim) in any float dtype and
+        ``refs`` their (shard, row) in the embedding store (needed for re-ranking)
+
+        A codec that needs training (pq) is trained, and every face re-encoded, once
+        the gallery reaches its min_train_size and again whenever it has grown by
+        retrain_growth since. Training runs on a snapshot outside the lock, so searches
+        (and other adds) go on with the current codec until the new one is swapped in.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = l2_normalize(embeddings)
+        refs = np.full((len(ids), 2), -1, dtype=np.int64) if refs is None else np.asarray(refs, dtype=np.int64)
+        id_list = ids.tolist()
+        with self._lock:
+            codes, scales = self.codec.encode(vectors)
+            self._reserve(self._count + len(ids))
+            new_ids = set(id_list)
+            if len(new_ids) == len(id_list) and not new_ids & self._slots.keys():
+                # Only new faces (the sync path): one block copy
+                start, end = self._count, self._count + len(id_list)
+                self._matrix[start:end] = codes
+                self._scales[start:end] = scales
+                self._ids[start:end] = ids
+                self._refs[start:end] = refs
+                self._slots.update(zip(id_list, range(start, end)))
+                self._count = end
+            else:
+                for i, face_id in enumerate(id_list):
+                    slot = self._slots.get(face_id)
+                    if slot is None:
+                        slot = self._count
+                        self._slots[face_id] = slot
+                        self._ids[slot] = face_id
+                        self._count += 1
+                    self._matrix[slot] = codes[i]
+                    self._scales[slot] = scales[i]
+                    self._refs[slot] = refs[i]
+            if self._dirty is not None:
+                self._dirty.update(id_list)
+                return
+            if not self._needs_training():
+                return
+            n = self._count
+            snapshot_ids, snapshot_refs = self._ids[:n].copy(), self._refs[:n].copy()
+            self._dirty = set()
+        try:
+            codec, codes, scales = self._train(snapshot_ids, snapshot_refs)
+            with self._lock:
+                self._swap_codec(codec, snapshot_ids, codes, scales)
+        finally:
+            with self._lock:
+                self._dirty = None
+
+    def _needs_training(self):
+        target, n = self.target_codec, self._count
+        if target is not self.codec:
+            return n >= target.min_train_size
+        return bool(target.retrain_growth and self._trained_size and n >= self._trained_size * target.retrain_growth)
+
+    def _full_vectors(self, slots):
+        """Normalized vectors of ``slots``: from the embedding store when referenced, else decoded"""
+        vectors = self.codec.decode(self._matrix[slots], self._scales[slots])
+        refs = self._refs[slots]
+        stored = refs[:, 0] >= 0
+        if self.store is not None and stored.any():
+            vectors[stored] = l2_normalize(self.store.get_many(refs[stored]))
+        return vectors
+
+    def _snapshot_vectors(self, ids, refs):
+        """Normalized vectors of snapshot rows: store reads unlocked, decoded rows under the lock"""
+        vectors = np.zeros((len(ids), self.dim), dtype=np.float32)
+        stored = refs[:, 0] >= 0 if self.store is not None else np.zeros(len(ids), dtype=bool)
+        if stored.any():
+            vectors[stored] = l2_normalize(self.store.get_many(refs[stored]))
+        if not stored.all():
+            with self._lock:
+                for i in np.nonzero(~stored)[0]:
+                    slot = self._slots.get(int(ids[i]))
+                    if slot is not None:  # removed faces are dropped at the swap
+                        vectors[i] = self.codec.decode(self._matrix[slot:slot + 1], self._scales[slot:slot + 1])[0]
+        return vectors
+
+    def _train(self, ids, refs):
+        """Train a copy of the target codec on (a sample of) the snapshot and encode the snapshot with it"""
+        target, n = copy.deepcopy(self.target_codec), len(ids)
+        sample = np.sort(np.random.RandomState(n).choice(n, min(n, target.train_size or n), replace=False))
+        target.train(self._snapshot_vectors(ids[sample], refs[sample]))
+        codes = np.empty((n, target.code_size), dtype=target.dtype)
+        scales = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCORE_ROWS):
+            rows = slice(start, min(n, start + SCORE_ROWS))
+            codes[rows], scales[rows] = target.encode(self._snapshot_vectors(ids[rows], refs[rows]))
+        return target, codes, scales
+
+    def _swap_codec(self, codec, ids, codes, scales):
+        """Install a trained codec: snapshot codes where still valid, re-encode faces added or replaced since"""
+        n = self._count
+        current = self._ids[:n]
+        order = np.argsort(ids)
+        pos = order[np.minimum(np.searchsorted(ids, current, sorter=order), len(ids) - 1)]
+        fresh = ids[pos] == current
+        if self._dirty:
+            fresh &= ~np.isin(current, np.fromiter(self._dirty, dtype=np.int64))
+        matrix = np.empty((len(self._ids), codec.code_size), dtype=codec.dtype)
+        new_scales = np.empty(len(self._ids), dtype=np.float32)
+        matrix[:n][fresh], new_scales[:n][fresh] = codes[pos[fresh]], scales[pos[fresh]]
+        stale = np.nonzero(~fresh)[0]
+        if len(stale):
+            matrix[stale], new_scales[stale] = codec.encode(self._full_vectors(stale))
+        self._matrix, self._scales, self.codec = matrix, new_scales, codec
+        self.target_codec = codec
+        self._trained_size = len(ids)
+
+    def remove(self, ids):
+        """Drop faces by id; returns how many were present"""
+        removed = 0
+        with self._lock:
+            for face_id in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+                slot = self._slots.pop(face_id, None)
+                if slot is None:
+                    continue
+                last = self._count - 1
+                if slot != last:
+                    self._matrix[slot] = self._matrix[last]
+                    self._scales[slot] = self._scales[last]
+                    self._ids[slot] = self._ids[last]
+                    self._refs[slot] = self._refs[last]
+                    self._slots[int(self._ids[slot])] = slot
+                self._count = last
+                removed += 1
+        return removed
+
+    def search(self, probes, k=10):
+        """
+        Top-k gallery faces for each probe
+
+        Args:
+            probes: (dim,) or (Q, dim) embeddings, normalized here
+            k: Matches per probe (capped at the gallery size)
+
+        Returns:
+            (ids, scores): (Q, k) int64 face ids and float32 cosine similarities,
+            best first
+        """
+        probes = l2_normalize(probes)
+        with self._lock:
+            n = self._count
+            k = min(k, n)
+            out_ids = np.empty((len(probes), k), dtype=np.int64)
+            out_scores = np.empty((len(probes), k), dtype=np.float32)
+            if k == 0:
+                return out_ids, out_scores
+            # Lossy encodings shortlist more candidates and re-score them at full precision
+            reranking = self.codec.name != "float32" and self.rerank and self.store is not None
+            shortlist = min(n, max(k, self.rerank)) if reranking else k
+            step = max(1, SCORE_BLOCK // n)
+            for start in range(0, len(probes), step):
+                block = probes[start:start + step]
+                scores = self.codec.scores(block, self._matrix[:n], self._scales[:n])
+                if shortlist < n:
+                    top = np.argpartition(scores, n - shortlist, axis=1)[:, n - shortlist:]
+                else:
+                    top = np.broadcast_to(np.arange(n), scores.shape)
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                if reranking:
+                    top_scores = self._rerank(block, top, top_scores)
+                order = np.argsort(-top_scores, axis=1)[:, :k]
+                out_ids[start:start + step] = self._ids[np.take_along_axis(top, order, axis=1)]
+                out_scores[start:start + step] = np.take_along_axis(top_scores, order, axis=1)
+        return out_ids, out_scores
+
+    def _rerank(self, probes, slots, scores):
+        """Exact cosine similarities for the shortlisted ``slots`` (faces without a store ref keep ``scores``)"""
+        refs = self._refs[slots]
+        stored = refs[..., 0] >= 0
+        exact = scores.copy()
+        if stored.any():
+            vectors = l2_normalize(self.store.get_many(refs[stored]))
+            rows = np.nonzero(stored)[0]
+            exact[stored] = np.einsum("nd,nd->n", vectors, probes[rows])
+        return exact
+
+    def sync(self, db_path, store, batch_size=100000):
+        """
+        Catch up with face_detections: add rows newer than the last sync, and drop
+        faces deleted since (e.g. by a re-scan) when the live count disagrees
+
+        Returns:
+            (added, removed)
+        """
+        added = removed = 0
+        self.store = store
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            cursor = conn.execute(GALLERY_SQL, (self.synced_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                ids = np.array([row[0] for row in rows], dtype=np.int64)
+                refs = [(row[1], row[2]) for row in rows]
+                self.add(ids, store.get_many(refs), refs)
+                self.synced_id = int(ids[-1])
+                added += len(rows)
+
+            bounds = (self.base_id, self.synced_id)
+            live = conn.execute(LIVE_COUNT_SQL, bounds).fetchone()[0]
+            if live != len(self):
+                live_ids = np.fromiter((row[0] for row in conn.execute(LIVE_IDS_SQL, bounds)), dtype=np.int64)
+                removed = self.remove(np.setdiff1d(self.ids, live_ids))
+        finally:
+            conn.close()
+        return added, removed
+
+    def stats(self):
+        return {
+            "faces": self._count,
+            "dim": self.dim,
+            "encoding": self.codec.name,
+            "target_encoding": self.target_codec.name,
+            "bytes_per_face": self.codec.bytes_per_face,
+            "rerank": self.rerank,
+            "memory_mb": round((self._matrix.nbytes + self._scales.nbytes) / 2**20, 1),
+            "synced_id": self.synced_id,
+        }
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Shared LVFace input preprocessing
+Resize, BGR->RGB, normalize and HWC->CHW for a whole batch of faces in one pass
+"""
+
+import cv2
+import numpy as np
+
+# LVFace / ArcFace input layout: 112x112 RGB, (x - 127.5) / 127.5 -> [-1, 1]
+INPUT_SIZE = (112, 112)
+INPUT_MEAN = 127.5
+INPUT_STD = 127.5
+
+# Bump whenever the math below changes so cached embeddings are invalidated
+PREPROCESS_VERSION = 1
+
+
+def _as_bgr(img):
+    """Return a 3-channel BGR view of a grayscale, BGR or BGRA image"""
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    return img
+
+
+def preprocess_batch(imgs, input_size=INPUT_SIZE, mean=INPUT_MEAN, std=INPUT_STD,
+                     swap_rb=True, dtype=np.float32, out=None, staging=None):
+    """
+    Convert a list of uint8 BGR images into a normalized NCHW network input
+
+    Every image is resized straight into a uint8 (N, H, W, 3) staging buffer, then
+    the whole batch is channel-swapped, transposed and scaled into ``out`` by a single
+    float32 multiply-add, so no float64 or per-face float arrays are made.
+
+    Args:
+        imgs: Sequence of uint8 images (BGR, BGRA or grayscale), any size
+        input_size: (width, height) of the network input
+        mean, std: Pixel normalization, output = (pixel - mean) / std
+        swap_rb: Convert BGR input to RGB channel order
+        dtype: np.float32 or np.float16
+        out: Optional preallocated (>=N, 3, H, W) buffer of ``dtype`` to fill
+        staging: Optional preallocated (>=N, H, W, 3) uint8 buffer for resizing
+
+    Returns:
+        np.ndarray: (N, 3, H, W) array, a view of ``out`` when one is supplied
+    """
+    n = len(imgs)
+    width, height = input_size
+
+    if out is None:
+        out = np.empty((n, 3, height, width), dtype=dtype)
+    elif out.shape[0] < n or out.shape[1:] != (3, height, width):
+        raise ValueError(f"out buffer {out.shape} cannot hold {n} x (3, {height}, {width})")
+    if staging is None:
+        staging = np.empty((n, height, width, 3), dtype=np.uint8)
+    elif staging.shape[0] < n or staging.shape[1:] != (height, width, 3):
+        raise ValueError(f"staging buffer {staging.shape} cannot hold {n} x ({height}, {width}, 3)")
+    out = out[:n]
+    staging = staging[:n]
+
+    for i, img in enumerate(imgs):
+        img = _as_bgr(img)
+        if img.shape[0] == height and img.shape[1] == width:
+            staging[i] = img
+        else:
+            cv2.resize(img, (width, height), dst=staging[i])
+
+    return normalize_batch(staging, mean=mean, std=std, swap_rb=swap_rb, out=out)
+
+
+def normalize_batch(faces, mean=INPUT_MEAN, std=INPUT_STD, swap_rb=True, out=None, dtype=np.float32):
+    """
+    Normalize an already-sized uint8 (N, H, W, 3) BGR batch into an (N, 3, H, W) input
+
+    Used directly by stages that write faces at network resolution themselves
+    (e.g. face_align.align_faces), skipping the resize copy in preprocess_batch.
+    """
+    n, height, width = faces.shape[:3]
+    if out is None:
+        out = np.empty((n, 3, height, width), dtype=dtype)
+    out = out[:n]
+
+    # NHWC -> NCHW view, with the channel axis reversed for BGR -> RGB
+    chw = faces.transpose(0, 3, 1, 2)
+    if swap_rb:
+        chw = chw[:, ::-1]
+    scale = np.float32(1.0 / std)
+    bias = np.float32(-mean / std)
+    if out.dtype == np.float32:
+        np.multiply(chw, scale, out=out)
+        out += bias
+    else:
+        # NumPy has no native half-precision arithmetic; do the math in float32, cast once
+        np.copyto(out, np.multiply(chw, scale) + bias, casting='same_kind')
+    return out
+
+
+def preprocess_face(img, **kwargs):
+    """Preprocess one image into a (1, 3, H, W) network input"""
+    return preprocess_batch([img], **kwargs)
@@ -1,55 +1,168 @@
 #!/usr/bin/env python3
 
+import argparse
 import sqlite3
 import requests
 import json
 import time
-import base64
 import threading
 import os
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from requests.adapters import HTTPAdapter
+
+from adaptive_concurrency import AdaptiveConcurrency
+from asset_fingerprint import RECORD_FINGERPRINT_SQL, fingerprint_params, rescan
+from face_cache import FaceResultCache, cache_key, content_hash
+from face_db_writer import FaceDBWriter, StatementGroup
+from face_work_queue import (FINISH_SQL, MAX_ATTEMPTS, RELEASE_SQL, FaceWorkQueue, finish_params,
+                             outcome_status, release_params)
+from run_journal import open_run
+
+# Cache namespace for /embed results (one whole-image embedding per asset)
+EMBED_MODEL_ID = "lvface-embed-whole-image"
+
+
+class ServiceUnavailable(Exception):
+    """The service answered 5xx: worth another try, unlike a 4xx or a bad image"""
 
 class FaceProcessingOrchestrator:
-    def __init__(self, db_path="metadata.sqlite", service_url="http://127.0.0.1:8003"):
+    def __init__(self, db_path="metadata.sqlite", service_url="http://127.0.0.1:8003", upload_mode="path"):
         self.db_path = db_path
         self.service_url = service_url
+        # "path": send the local file path; "binary": upload the file bytes as the request body
+        self.upload_mode = upload_mode
+        self.session = self.make_session(4)
+        self.concurrency = None
         self.processed_count = 0
         self.error_count = 0
+        self.requeued_count = 0
         self.start_time = None
         self.lock = threading.Lock()
         self.stop_processing = False
+        self.db_writer = None
+        self.work_queue = None
+        self.journal = None
+        self.cache = None
+        self.worker_id = f"orchestrator-{os.getpid()}"
+        self.last_claimed_id = 0
+        self.requeued_since_wrap = 0
         
-    def get_pending_images(self, batch_size=50):
-        """Get batch of images that need face processing"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def make_session(pool_size):
+        """Keep-alive HTTP session whose connection pool covers every worker thread"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def get_db_writer(self):
+        """Shared bulk writer (one WAL connection, grouped commits), opened on first use"""
+        with self.lock:
+            if self.db_writer is None:
+                self.db_writer = FaceDBWriter(self.db_path)
+            return self.db_writer
         
-        cursor.execute("""
-            SELECT a.id, a.path
-            FROM assets a
-            WHERE a.mime LIKE 'image/%'
-            AND a.path IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM face_detections fd 
-                WHERE fd.asset_id = a.id
+    def get_cache(self):
+        """/embed results keyed by image content, persisted next to the face rows"""
+        writer = self.get_db_writer()
+        with self.lock:
+            if self.cache is None:
+                self.cache = FaceResultCache(EMBED_MODEL_ID, db_path=self.db_path, writer=writer)
+            return self.cache
+    
+    def fetch_embedding(self, wsl_path):
+        """Whole-image embedding from /embed; returns (embedding, error)"""
+        if self.upload_mode == 'binary':
+            # Stream the file as the raw request body (service on another host)
+            with open(wsl_path, 'rb') as img_file:
+                response = self.session.post(
+                    f"{self.service_url}/embed",
+                    data=img_file,
+                    headers={'Content-Type': 'application/octet-stream'},
+                    timeout=30
+                )
+        else:
+            # Same machine: send the path and let the service read the file
+            response = self.session.post(
+                f"{self.service_url}/embed",
+                json={'image_path': wsl_path},
+                timeout=30
             )
-            ORDER BY a.id
-            LIMIT ?
-        """, (batch_size,))
+        if response.status_code >= 500:
+            raise ServiceUnavailable(f"HTTP {response.status_code}")
+        if response.status_code != 200:
+            return None, f"HTTP {response.status_code}"
+        return response.json().get('embedding', []), None
         
-        pending_images = cursor.fetchall()
-        conn.close()
+    def get_pending_images(self, batch_size=50):
+        """Claim the next batch of images that need face processing"""
+        if self.work_queue is None:
+            self.work_queue = FaceWorkQueue(self.db_path)
+        pending_images = self.work_queue.claim(self.worker_id, batch_size, after_id=self.last_claimed_id)
+        if not pending_images and self.requeued_since_wrap:
+            # Assets released after a transient error sit behind the cursor: go round once more
+            self.requeued_since_wrap = 0
+            self.get_db_writer().flush()
+            self.last_claimed_id = 0
+            pending_images = self.work_queue.claim(self.worker_id, batch_size)
+        if pending_images:
+            self.last_claimed_id = pending_images[-1][0]
         return pending_images
     
-    def save_face_embedding(self, asset_id, embedding, confidence=0.0):
-        """Save face embedding to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def open_run(self, resume=False, run_id=None, kind='orchestrator'):
+        """Start or resume the run journal; claims are made under the run id"""
+        if self.work_queue is None:
+            self.work_queue = FaceWorkQueue(self.db_path)
+        self.journal = open_run(self.db_path, self.work_queue, kind, resume=resume, run_id=run_id)
+        self.worker_id = self.journal.run_id
+        self.last_claimed_id = 0
+        return self.journal
+    
+    def mark_finished(self, asset_id, face_count=None, error=None, started=None, fingerprint=None, group=None):
+        """
+        Queue the asset's final work-queue status (done / no_faces / failed) and journal entry,
+        plus the file fingerprint (see asset_fingerprint) that later re-scans compare against,
+        in one atomic write with the rows already collected in ``group``
+        """
+        group = group or StatementGroup()
+        group.insert(FINISH_SQL, finish_params(asset_id, face_count, error))
+        if fingerprint is not None and error is None:
+            group.insert(RECORD_FINGERPRINT_SQL, fingerprint)
+        if self.journal is not None:
+            seconds = time.perf_counter() - started if started is not None else None
+            self.journal.record(group, asset_id, outcome_status(face_count, error), seconds)
+        self.get_db_writer().insert_group(group.statements)
+    
+    def requeue(self, asset_id, error, started=None):
+        """
+        Transient failure (service down, timeout, 5xx): return the asset to pending for
+        another try in this run, or fail it once it has had MAX_ATTEMPTS
+        """
+        if self.work_queue.attempts(asset_id) + 1 >= MAX_ATTEMPTS:
+            self.mark_finished(asset_id, error=error, started=started)
+            with self.lock:
+                self.error_count += 1
+            return
+        self.get_db_writer().insert(RELEASE_SQL, release_params(asset_id, error))
+        with self.lock:
+            self.requeued_count += 1
+            self.requeued_since_wrap += 1
+    
+    def finish_run(self, interrupted=False):
+        """Checkpoint the journal and commit everything still queued"""
+        if self.journal is not None:
+            self.journal.finish(self.get_db_writer(), 'interrupted' if interrupted else 'finished')
+        if self.db_writer is not None:
+            self.db_writer.close()
+    
+    def save_face_embedding(self, asset_id, embedding, confidence=0.0, writer=None):
+        """Queue a face embedding on the shared bulk writer (or add it to a StatementGroup)"""
         try:
             # Save embedding as face detection
-            cursor.execute("""
+            (writer or self.get_db_writer()).insert("""
                 INSERT INTO face_detections 
                 (asset_id, bbox_x, bbox_y, bbox_width, bbox_height, confidence, embedding)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -59,87 +172,143 @@ class FaceProcessingOrchestrator:
                 confidence,
                 json.dumps(embedding)
             ))
-            
-            conn.commit()
             return True
             
         except Exception as e:
             print(f"❌ DB Error for asset {asset_id}: {e}")
             return False
-        finally:
-            conn.close()
+    
+    def to_wsl_path(self, image_path):
+        """Convert Windows path to WSL path if needed"""
+        if image_path.startswith('E:\\'):
+            return image_path.replace('E:\\', '/mnt/e/').replace('\\', '/')
+        elif image_path.startswith('C:\\'):
+            return image_path.replace('C:\\', '/mnt/c/').replace('\\', '/')
+        return image_path
+    
+    def process_image_batch(self, images):
+        """
+        Send several images to the unified service's /process_images endpoint
+        The service detects them in one batched SCRFD pass and saves the faces itself,
+        under the asset ids sent along with the (mapped) paths.
+        """
+        if self.stop_processing:
+            return 0
+        started = time.perf_counter()
+            
+        wsl_paths = []
+        asset_ids = []
+        image_paths = []
+        for asset_id, image_path in images:
+            wsl_path = self.to_wsl_path(image_path)
+            if os.path.exists(wsl_path):
+                wsl_paths.append(wsl_path)
+                asset_ids.append(asset_id)
+                image_paths.append(image_path)
+            else:
+                self.mark_finished(asset_id, error="File not found", started=started)
+                with self.lock:
+                    self.error_count += 1
+        if not wsl_paths:
+            return 0
+            
+        try:
+            response = self.session.post(
+                f"{self.service_url}/process_images",
+                json={'image_paths': wsl_paths, 'asset_ids': asset_ids},
+                timeout=30 + 5 * len(wsl_paths)
+            )
+            if response.status_code >= 500:
+                raise ServiceUnavailable(f"HTTP {response.status_code}")
+            results = response.json().get('results', []) if response.status_code == 200 else []
+        except (requests.RequestException, ServiceUnavailable) as e:
+            for asset_id in asset_ids:
+                self.requeue(asset_id, str(e), started)
+            return 0
+            
+        for n, asset_id in enumerate(asset_ids):
+            result = results[n] if n < len(results) else {'error': 'No result from service'}
+            fingerprint = None
+            if 'error' not in result:
+                fingerprint = fingerprint_params(asset_id, image_paths[n], wsl_paths[n])
+            self.mark_finished(asset_id, face_count=result.get('faces', 0), error=result.get('error'),
+                               started=started, fingerprint=fingerprint)
+        succeeded = sum(1 for result in results if 'error' not in result)
+        with self.lock:
+            self.error_count += len(wsl_paths) - succeeded
+            for _ in range(succeeded):
+                self.processed_count += 1
+                if self.processed_count % 10 == 0:
+                    self.print_progress()
+        return succeeded
     
     def process_single_image(self, asset_id, image_path):
         """Process a single image for face embedding"""
         if self.stop_processing:
             return False
+        started = time.perf_counter()
             
         try:
             # Convert Windows path to WSL path if needed
-            if image_path.startswith('E:\\'):
-                wsl_path = image_path.replace('E:\\', '/mnt/e/').replace('\\', '/')
-            elif image_path.startswith('C:\\'):
-                wsl_path = image_path.replace('C:\\', '/mnt/c/').replace('\\', '/')
-            else:
-                wsl_path = image_path
+            wsl_path = self.to_wsl_path(image_path)
             
             # Check if file exists
             if not os.path.exists(wsl_path):
+                self.mark_finished(asset_id, error="File not found", started=started)
                 with self.lock:
                     self.error_count += 1
                 return False
             
-            # Read and encode image
-            with open(wsl_path, 'rb') as img_file:
-                image_data = img_file.read()
-                image_b64 = base64.b64encode(image_data).decode('utf-8')
-            
-            # Call face embedding service
-            response = requests.post(
-                f"{self.service_url}/embed",
-                json={'image': image_b64},
-                timeout=30
-            )
+            # Duplicate files (same bytes) reuse the stored embedding instead of a request
+            cache = self.get_cache()
+            digest = content_hash(wsl_path)
+            key = cache_key(digest, EMBED_MODEL_ID)
+            fingerprint = fingerprint_params(asset_id, image_path, wsl_path, digest)
+            cached = cache.get(key)
+            if cached is not None:
+                embedding = cached[1][0].tolist() if cached[1] is not None else []
+            else:
+                embedding, error = self.fetch_embedding(wsl_path)
+                if error:
+                    self.mark_finished(asset_id, error=error, started=started)
+                    with self.lock:
+                        self.error_count += 1
+                    return False
+                cache.put(key, [{}] if embedding else [], [embedding] if embedding else None)
             
-            if response.status_code == 200:
-                result = response.json()
-                embedding = result.get('embedding', [])
-                
-                if embedding:
-                    # Save embedding to database
-                    if self.save_face_embedding(asset_id, embedding):
-                        with self.lock:
-                            self.processed_count += 1
-                            if self.processed_count % 10 == 0:
-                                self.print_progress()
-                        return True
+            if embedding:
+                # Save embedding to database
+                group = StatementGroup()
+                if self.save_face_embedding(asset_id, embedding, writer=group):
+                    self.mark_finished(asset_id, face_count=1, started=started, fingerprint=fingerprint,
+                                       group=group)
+                    with self.lock:
+                        self.processed_count += 1
+                        if self.processed_count % 10 == 0:
+                            self.print_progress()
+                    return True
+            self.mark_finished(asset_id, face_count=0, started=started, fingerprint=fingerprint)
             
             with self.lock:
                 self.error_count += 1
             return False
             
+        except (requests.RequestException, ServiceUnavailable) as e:
+            self.requeue(asset_id, str(e), started)
+            return False
         except Exception as e:
+            self.mark_finished(asset_id, error=str(e), started=started)
             with self.lock:
                 self.error_count += 1
             return False
     
     def print_progress(self):
-        """Print current processing progress"""
-        if self.start_time:
-            elapsed = time.time() - self.start_time
-            rate = self.processed_count / elapsed if elapsed > 0 else 0
-            eta_seconds = (6559 - self.processed_count) / rate if rate > 0 else 0
-            eta_minutes = eta_seconds / 60
-            eta_hours = eta_minutes / 60
-            
-            if eta_hours > 1:
-                eta_str = f"{eta_hours:.1f}h"
-            elif eta_minutes > 1:
-                eta_str = f"{eta_minutes:.0f}m"
-            else:
-                eta_str = f"{eta_seconds:.0f}s"
-            
-            print(f"🚀 Processed: {self.processed_count:,} | Errors: {self.error_count} | Rate: {rate:.1f}/sec | ETA: {eta_str}")
+        """Print progress against the real total, ETA from the recent rate"""
+        in_flight = f" | In flight: {self.concurrency.limit}" if self.concurrency else ""
+        if self.journal is not None:
+            print(f"🚀 {self.journal.progress_line()}{in_flight}")
+        else:
+            print(f"🚀 Processed: {self.processed_count:,} | Errors: {self.error_count}{in_flight}")
     
     def monitor_gpu(self):
         """Monitor RTX 3090 GPU usage during processing"""
@@ -173,79 +342,137 @@ class FaceProcessingOrchestrator:
             
             time.sleep(10)  # Check every 10 seconds
     
-    def start_processing(self, max_workers=4, batch_size=50):
-        """Start the face processing pipeline"""
+    def iter_work(self, batch_size, images_per_request):
+        """Claimed work units, fetched page by page as the executor drains them"""
+        while not self.stop_processing:
+            pending_images = self.get_pending_images(batch_size)
+            if not pending_images:
+                return
+            if images_per_request > 1:
+                for start in range(0, len(pending_images), images_per_request):
+                    yield self.process_image_batch, (pending_images[start:start + images_per_request],)
+            else:
+                for asset_id, image_path in pending_images:
+                    yield self.process_single_image, (asset_id, image_path)
+    
+    def timed_call(self, func, args):
+        """Run one request and feed its latency to the concurrency controller"""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.concurrency.record(time.perf_counter() - start)
+    
+    def monitor_service(self, interval=2.0):
+        """Poll the service's batch queue depth for the concurrency controller"""
+        while not self.stop_processing:
+            try:
+                status = self.session.get(f"{self.service_url}/status", timeout=3).json()
+                self.concurrency.observe_queue_depth(status.get('batching', {}).get('queue_depth', 0))
+            except Exception:
+                pass
+            time.sleep(interval)
+    
+    def start_processing(self, max_workers=4, batch_size=50, images_per_request=1, min_workers=1,
+                         resume=False, run_id=None):
+        """
+        Start the face processing pipeline
+        One executor lives for the whole run and is refilled from the work queue as
+        requests finish; the number of requests in flight adapts between min_workers
+        and max_workers from request latency and the service's queue depth.
+        images_per_request > 1 sends groups of paths to /process_images so the
+        service can detect them with one batched SCRFD forward.
+        resume=True continues the last unfinished run (or run_id) from its journal.
+        """
         print("🚀 STARTING LARGE-SCALE FACE PROCESSING")
         print("=" * 60)
-        print(f"🎯 Target: 6,559 images with RTX 3090 acceleration")
-        print(f"🔧 Workers: {max_workers}")
+        journal = self.open_run(resume=resume, run_id=run_id)
+        print(f"🎯 Target: {journal.total:,} images ({journal.done:,} already done in this run)")
+        print(f"🔧 Workers: {min_workers}-{max_workers} (adaptive)")
         print(f"📦 Batch size: {batch_size}")
+        print(f"🖼️  Images per request: {images_per_request}")
         print()
         
         self.start_time = time.time()
+        # One pooled connection per worker plus one for the /status poller
+        self.session = self.make_session(max_workers + 1)
+        self.concurrency = AdaptiveConcurrency(min_workers, max_workers, initial=max(min_workers, max_workers // 2))
         
-        # Start GPU monitoring in background
-        gpu_thread = threading.Thread(target=self.monitor_gpu)
-        gpu_thread.daemon = True
-        gpu_thread.start()
+        # Start GPU and service monitoring in background
+        for target in (self.monitor_gpu, self.monitor_service):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
         
         try:
-            while not self.stop_processing:
-                # Get next batch of images
-                pending_images = self.get_pending_images(batch_size)
-                
-                if not pending_images:
-                    print("✅ All images processed!")
-                    break
-                
-                print(f"\n📦 Processing batch of {len(pending_images)} images...")
-                
-                # Process batch with thread pool
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    futures = []
-                    
-                    for asset_id, image_path in pending_images:
-                        if self.stop_processing:
+            work = self.iter_work(batch_size, images_per_request)
+            in_flight = set()
+            exhausted = False
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while not self.stop_processing:
+                    if exhausted and self.requeued_since_wrap:
+                        # Requeued after a transient error while the queue was draining
+                        work = self.iter_work(batch_size, images_per_request)
+                        exhausted = False
+                    # Top up to the current limit so the service never sees an idle gap
+                    while not exhausted and len(in_flight) < self.concurrency.limit:
+                        unit = next(work, None)
+                        if unit is None:
+                            exhausted = True
                             break
-                            
-                        future = executor.submit(
-                            self.process_single_image, 
-                            asset_id, image_path
-                        )
-                        futures.append(future)
+                        in_flight.add(executor.submit(self.timed_call, *unit))
                     
-                    # Wait for batch completion
-                    for future in as_completed(futures):
-                        if self.stop_processing:
-                            break
+                    if not in_flight:
+                        print("✅ All images processed!")
+                        break
+                    
+                    done, in_flight = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
                         future.result()
-                
-                # Brief pause between batches
-                if not self.stop_processing:
-                    time.sleep(1)
         
         except KeyboardInterrupt:
-            print("\n⏹️  Processing stopped by user")
+            print("\n⏹️  Processing stopped by user (resume with --resume)")
             self.stop_processing = True
+            interrupted = True
+        else:
+            interrupted = False
         
         # Final stats
         self.stop_processing = True
+        self.finish_run(interrupted)
         elapsed = time.time() - self.start_time
         
         print(f"\n🎉 PROCESSING COMPLETE!")
         print("=" * 40)
         print(f"✅ Successfully processed: {self.processed_count:,} images")
         print(f"❌ Errors: {self.error_count}")
+        print(f"♻️ Retried after transient errors: {self.requeued_count}")
         print(f"⏱️  Total time: {elapsed/60:.1f} minutes")
         print(f"📈 Average rate: {self.processed_count/elapsed:.1f} images/second")
+        print(f"🔧 Final concurrency: {self.concurrency.stats()}")
         
         return self.processed_count, self.error_count
 
 def main():
+    parser = argparse.ArgumentParser(description='Face processing orchestrator')
+    parser.add_argument('--db', default='metadata.sqlite', help='metadata database path')
+    parser.add_argument('--service-url', default='http://127.0.0.1:8003', help='unified face service URL')
+    parser.add_argument('--max-workers', type=int, default=8, help='max concurrent requests')
+    parser.add_argument('--batch-size', type=int, default=100, help='assets claimed per work-queue page')
+    parser.add_argument('--images-per-request', type=int, default=1,
+                        help='images per /process_images request (1 uses /embed per image)')
+    parser.add_argument('--resume', action='store_true', help='continue the last unfinished run')
+    parser.add_argument('--run-id', help='run id to create or resume')
+    parser.add_argument('--rescan', action='store_true',
+                        help='stat processed files first and requeue the ones that changed')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='put assets that failed in earlier runs back in the queue first')
+    args = parser.parse_args()
+    
     # Check service health first
     print("🧪 Checking LVFace service...")
     try:
-        response = requests.get("http://127.0.0.1:8003/health", timeout=5)
+        response = requests.get(f"{args.service_url}/health", timeout=5)
         if response.status_code == 200:
             health = response.json()
             print("✅ Service Status:")
@@ -261,13 +488,23 @@ def main():
     print()
     
     # Create and start orchestrator
-    orchestrator = FaceProcessingOrchestrator()
+    orchestrator = FaceProcessingOrchestrator(db_path=args.db, service_url=args.service_url)
+    if args.rescan:
+        rescan(args.db, orchestrator.to_wsl_path)
+    if args.retry_failed:
+        print(f"♻️ Requeued {FaceWorkQueue(args.db).retry_failed():,} failed assets")
     
     print("🚀 Starting face processing in 3 seconds...")
     print("   Press Ctrl+C to stop gracefully")
     time.sleep(3)
     
-    processed, errors = orchestrator.start_processing(max_workers=4, batch_size=25)
+    processed, errors = orchestrator.start_processing(
+        max_workers=args.max_workers,
+        batch_size=args.batch_size,
+        images_per_request=args.images_per_request,
+        resume=args.resume,
+        run_id=args.run_id
+    )
     
     print(f"\n📊 Final Results: {processed:,} processed, {errors} errors")
 
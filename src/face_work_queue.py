@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Work-queue table for face processing
+Pending image assets are copied once into face_work_queue and claimed in id order
+(keyset pagination on a covering (status, asset_id, path) index) instead of re-scanning
+assets with a NOT EXISTS subquery per batch. Every asset ends in a terminal status,
+so failed and zero-face images are never fetched again.
+"""
+
+import sqlite3
+import time
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+NO_FACES = 'no_faces'
+FAILED = 'failed'
+
+MAX_ASSET_ID = 2 ** 63 - 1
+
+# Claims older than this belong to a crashed worker (a claimed page finishes in minutes)
+STALE_CLAIM_SECONDS = 3600
+
+# Tries an asset gets when the service is unreachable or failing (5xx) before it is failed
+MAX_ATTEMPTS = 3
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS face_work_queue (
+        asset_id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        claimed_by TEXT,
+        claimed_at REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        face_count INTEGER,
+        error TEXT,
+        updated_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_face_work_queue_status
+        ON face_work_queue (status, asset_id, path);
+    CREATE INDEX IF NOT EXISTS idx_face_detections_asset_id
+        ON face_detections (asset_id);
+    CREATE TABLE IF NOT EXISTS face_asset_files (
+        asset_id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER,
+        mtime_ns INTEGER,
+        content_hash TEXT,
+        recorded_at REAL
+    );
+"""
+
+# Rows past the highest queued id; assets already in face_detections start as done
+SEED_SQL = """
+    INSERT OR IGNORE INTO face_work_queue (asset_id, path, status, updated_at)
+    SELECT a.id, a.path,
+           CASE WHEN EXISTS (SELECT 1 FROM face_detections fd WHERE fd.asset_id = a.id)
+                THEN 'done' ELSE 'pending' END,
+           ?
+    FROM assets a
+    WHERE a.id > (SELECT COALESCE(MAX(asset_id), 0) FROM face_work_queue)
+    AND a.mime LIKE 'image/%'
+    AND a.path IS NOT NULL
+"""
+
+FINISH_SQL = """
+    UPDATE face_work_queue
+    SET status = ?, face_count = ?, error = ?, attempts = attempts + 1, updated_at = ?
+    WHERE asset_id = ?
+"""
+
+
+# Transient failure: back to pending for another try, counting the attempt
+RELEASE_SQL = """
+    UPDATE face_work_queue
+    SET status = 'pending', claimed_by = NULL, error = ?, attempts = attempts + 1, updated_at = ?
+    WHERE asset_id = ?
+"""
+
+
+def outcome_status(face_count=None, error=None):
+    """Terminal status: failed on error, no_faces on 0 faces, otherwise done"""
+    if error is not None:
+        return FAILED
+    return DONE if face_count else NO_FACES
+
+
+def finish_params(asset_id, face_count=None, error=None):
+    """Parameters for FINISH_SQL (see outcome_status)"""
+    return (outcome_status(face_count, error), face_count, error, time.time(), asset_id)
+
+
+def release_params(asset_id, error):
+    """Parameters for RELEASE_SQL"""
+    return (error, time.time(), asset_id)
+
+
+class FaceWorkQueue:
+    """Claims batches of pending assets; safe for several workers and processes"""
+
+    def __init__(self, db_path, seed=True):
+        self.db_path = db_path
+        conn = self.connect()
+        try:
+            conn.executescript(SCHEMA_SQL)
+            if seed:
+                conn.execute(SEED_SQL, (time.time(),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        # Autocommit mode so claim() controls its own BEGIN IMMEDIATE transaction
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def claim(self, worker_id, limit=50, after_id=0, last_id=None):
+        """
+        Atomically take up to ``limit`` pending assets with after_id < id <= last_id
+        (no upper bound when last_id is None)
+
+        BEGIN IMMEDIATE holds the write lock across select + update, so two workers
+        never receive the same asset.
+
+        Returns:
+            list of (asset_id, path), in id order
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("""
+                SELECT asset_id, path FROM face_work_queue
+                WHERE status = ? AND asset_id > ? AND asset_id <= ?
+                ORDER BY asset_id
+                LIMIT ?
+            """, (PENDING, after_id, MAX_ASSET_ID if last_id is None else last_id, limit)).fetchall()
+            if rows:
+                conn.execute("""
+                    UPDATE face_work_queue
+                    SET status = ?, claimed_by = ?, claimed_at = ?, updated_at = ?
+                    WHERE asset_id BETWEEN ? AND ? AND status = ?
+                """, (CLAIMED, worker_id, time.time(), time.time(), rows[0][0], rows[-1][0], PENDING))
+            conn.execute("COMMIT")
+            return rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def iter_claims(self, worker_id, batch_size=50):
+        """Yield claimed batches until the queue has no pending assets left"""
+        last_id = 0
+        while True:
+            rows = self.claim(worker_id, batch_size, after_id=last_id)
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+
+    def finish(self, asset_id, face_count=None, error=None):
+        """Record an asset's terminal status immediately (see finish_params)"""
+        conn = self.connect()
+        try:
+            conn.execute(FINISH_SQL, finish_params(asset_id, face_count, error))
+        finally:
+            conn.close()
+
+    def release_stale(self, older_than=STALE_CLAIM_SECONDS):
+        """Return claims abandoned by crashed workers to pending"""
+        conn = self.connect()
+        try:
+            return conn.execute("""
+                UPDATE face_work_queue SET status = ?, claimed_by = NULL
+                WHERE status = ? AND claimed_at < ?
+            """, (PENDING, CLAIMED, time.time() - older_than)).rowcount
+        finally:
+            conn.close()
+
+    def retry_failed(self):
+        """Put failed assets back in the queue with fresh attempts (e.g. after fixing a path mapping)"""
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "UPDATE face_work_queue SET status = ?, attempts = 0 WHERE status = ?", (PENDING, FAILED)
+            ).rowcount
+        finally:
+            conn.close()
+
+    def attempts(self, asset_id):
+        """Attempts recorded for an asset so far"""
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT attempts FROM face_work_queue WHERE asset_id = ?", (asset_id,)).fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def release_claims(self, worker_id):
+        """Return one worker's unfinished claims to pending (used by --resume)"""
+        conn = self.connect()
+        try:
+            return conn.execute("""
+                UPDATE face_work_queue SET status = ?, claimed_by = NULL
+                WHERE status = ? AND claimed_by = ?
+            """, (PENDING, CLAIMED, worker_id)).rowcount
+        finally:
+            conn.close()
+
+    def shard_bounds(self, num_shards):
+        """
+        Split pending assets into ``num_shards`` contiguous id ranges of equal size
+
+        Returns:
+            list of (after_id, last_id) for claim(); the last range is open-ended
+        """
+        conn = self.connect()
+        try:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM face_work_queue WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+            cuts = []
+            for k in range(1, num_shards):
+                row = conn.execute("""
+                    SELECT asset_id FROM face_work_queue WHERE status = ?
+                    ORDER BY asset_id LIMIT 1 OFFSET ?
+                """, (PENDING, max(k * pending // num_shards - 1, 0))).fetchone()
+                cuts.append(row[0] if row else MAX_ASSET_ID)
+        finally:
+            conn.close()
+        lows = [0] + cuts
+        return list(zip(lows, cuts + [None]))
+
+    def remaining(self):
+        """Assets not yet in a terminal status"""
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(CLAIMED, 0)
+
+    def counts(self):
+        """Number of queued assets per status"""
+        conn = self.connect()
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM face_work_queue GROUP BY status").fetchall())
+        finally:
+            conn.close()
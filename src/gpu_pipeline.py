@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Staged decode -> detect/embed -> persist pipeline
+A pool of decoder threads (OpenCV releases the GIL), one batching inference thread and
+one writer thread, connected by bounded queues so memory stays bounded under backpressure.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from face_align import align_and_preprocess
+from face_cache import content_hash
+from face_preprocess import preprocess_face
+from image_decode import decode_for_detection
+
+_DONE = object()
+
+
+class StageStats:
+    """Busy-time and throughput counters for one pipeline stage"""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, items=1):
+        with self._lock:
+            self.busy_seconds += seconds
+            self.items += items
+
+    def utilization(self, elapsed):
+        """Fraction of the stage's worker time spent doing work (not waiting on queues)"""
+        if elapsed <= 0:
+            return 0.0
+        with self._lock:
+            return self.busy_seconds / (elapsed * self.workers)
+
+
+class FacePipeline:
+    """
+    Pipelined face processing over (asset_id, path) work items
+
+    Stages:
+        decode  - ``num_decoders`` threads decode images (reduced JPEG decode) and, when
+                  no detector is set, preprocess the whole image into a (3, 112, 112) row
+        infer   - one thread collects up to ``batch_size`` decoded items, runs batched
+                  SCRFD detection + alignment (if a detector is set) and one batched LVFace run
+        write   - one thread hands results to ``save_batch`` every ``commit_size`` items
+                  or ``commit_interval`` seconds, so the DB sees grouped commits
+
+    ``save_batch(records)`` receives dicts with asset_id, faces (list of dicts with
+    bbox [x, y, w, h], confidence and embedding), error (None on success), seconds
+    (decode start to embedding), path, and for files that were read, digest (content
+    hash of the bytes decoded) and stat ((size, mtime_ns) at read time), so
+    fingerprints need no second read.
+    """
+
+    def __init__(self, inferencer, save_batch, detector=None, num_decoders=4, batch_size=32,
+                 queue_size=64, commit_size=200, commit_interval=2.0, decode_size=(1280, 1280),
+                 to_local_path=None):
+        self.inferencer = inferencer
+        self.save_batch = save_batch
+        self.detector = detector
+        self.num_decoders = num_decoders
+        self.batch_size = batch_size
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+        self.decode_size = decode_size
+        self.to_local_path = to_local_path or (lambda path: path)
+
+        self.input_queue = queue.Queue(maxsize=queue_size)
+        self.decoded_queue = queue.Queue(maxsize=queue_size)
+        self.result_queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = {
+            "decode": StageStats("decode", num_decoders),
+            "infer": StageStats("infer"),
+            "write": StageStats("write"),
+        }
+        self.stop_event = threading.Event()
+        self.start_time = None
+        self.saved_count = 0
+        self.error_count = 0
+        self.face_count = 0
+
+    # ---- decode stage -------------------------------------------------
+    def _decode_one(self, asset_id, image_path):
+        # One read serves both the decode and the fingerprint hash
+        try:
+            with open(self.to_local_path(image_path), 'rb') as f:
+                data = f.read()
+                st = os.fstat(f.fileno())
+        except OSError:
+            return {"asset_id": asset_id, "error": "Could not load image"}
+        image, scale = decode_for_detection(data, self.decode_size)
+        if image is None:
+            return {"asset_id": asset_id, "error": "Could not load image"}
+        file_info = {"digest": content_hash(data), "stat": (st.st_size, st.st_mtime_ns)}
+        if self.detector is None:
+            return dict(file_info, asset_id=asset_id, row=preprocess_face(image)[0], shape=image.shape, scale=scale)
+        return dict(file_info, asset_id=asset_id, image=image, scale=scale)
+
+    def _decoder_loop(self):
+        while True:
+            item = self.input_queue.get()
+            if item is _DONE:
+                self.decoded_queue.put(_DONE)
+                return
+            start = time.perf_counter()
+            try:
+                decoded = self._decode_one(*item)
+            except Exception as e:
+                decoded = {"asset_id": item[0], "error": str(e)}
+            decoded["started"] = start
+            decoded["path"] = item[1]
+            self.stats["decode"].record(time.perf_counter() - start)
+            self.decoded_queue.put(decoded)
+
+    # ---- inference stage ----------------------------------------------
+    def _collect_batch(self, pending_done):
+        """Block for one item, then take whatever else is ready up to batch_size"""
+        batch = []
+        while len(batch) < self.batch_size and pending_done[0] > 0:
+            try:
+                item = self.decoded_queue.get(timeout=0.005) if batch else self.decoded_queue.get()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                pending_done[0] -= 1
+                continue
+            batch.append(item)
+        return batch
+
+    def _infer_batch(self, batch):
+        ok = [item for item in batch if "error" not in item]
+        records = [{"asset_id": item["asset_id"], "faces": [], "error": item["error"]}
+                   for item in batch if "error" in item]
+        if not ok:
+            return records
+
+        if self.detector is None:
+            embeddings = self.inferencer.infer_tensor(np.stack([item["row"] for item in ok]))
+            for item, embedding in zip(ok, embeddings):
+                height, width = item["shape"][:2]
+                scale = item["scale"]
+                records.append({"asset_id": item["asset_id"], "error": None, "faces": [{
+                    "bbox": [0, 0, int(width * scale), int(height * scale)],
+                    "confidence": 1.0,
+                    "embedding": embedding,
+                }]})
+            return records
+
+        detections = self.detector.detect_batch([item["image"] for item in ok], batch_size=len(ok))
+        rows, owners = [], []
+        for n, (item, (bboxes, kpss)) in enumerate(zip(ok, detections)):
+            if len(bboxes) and kpss is not None:
+                rows.append(align_and_preprocess(item["image"], kpss))
+                owners.extend([n] * len(bboxes))
+        embeddings = self.inferencer.infer_tensor(np.concatenate(rows)) if rows else []
+
+        faces_per_item = [[] for _ in ok]
+        face_iter = iter(embeddings)
+        for n, (item, (bboxes, kpss)) in enumerate(zip(ok, detections)):
+            if not len(bboxes) or kpss is None:
+                continue
+            scale = item["scale"]
+            for det in bboxes:
+                x1, y1, x2, y2 = det[:4] * scale
+                faces_per_item[n].append({
+                    "bbox": [int(x1), int(y1), int(x2 - x1), int(y2 - y1)],
+                    "confidence": float(det[4]),
+                    "embedding": next(face_iter),
+                })
+        for item, faces in zip(ok, faces_per_item):
+            records.append({"asset_id": item["asset_id"], "faces": faces, "error": None})
+        return records
+
+    def _infer_loop(self):
+        pending_done = [self.num_decoders]
+        while pending_done[0] > 0:
+            batch = self._collect_batch(pending_done)
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                records = self._infer_batch(batch)
+            except Exception as e:
+                records = [{"asset_id": item["asset_id"], "faces": [], "error": str(e)} for item in batch]
+            end = time.perf_counter()
+            self.stats["infer"].record(end - start, len(batch))
+            # Decode-to-embedding latency per asset, for the run journal; file details for fingerprints
+            items = {item["asset_id"]: item for item in batch}
+            for record in records:
+                item = items[record["asset_id"]]
+                record["seconds"] = end - item["started"]
+                record["path"] = item["path"]
+                if "digest" in item:
+                    record["digest"], record["stat"] = item["digest"], item["stat"]
+                self.result_queue.put(record)
+        self.result_queue.put(_DONE)
+
+    # ---- write stage --------------------------------------------------
+    def _flush(self, records):
+        if not records:
+            return
+        start = time.perf_counter()
+        try:
+            self.save_batch(records)
+            self.saved_count += sum(1 for r in records if r["error"] is None)
+            self.error_count += sum(1 for r in records if r["error"] is not None)
+            self.face_count += sum(len(r["faces"]) for r in records)
+        except Exception as e:
+            print(f"❌ Pipeline write error: {e}")
+            self.error_count += len(records)
+        self.stats["write"].record(time.perf_counter() - start, len(records))
+
+    def _writer_loop(self):
+        pending = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self.result_queue.get(timeout=self.commit_interval)
+            except queue.Empty:
+                record = None
+            if record is _DONE:
+                self._flush(pending)
+                return
+            if record is not None:
+                pending.append(record)
+            if len(pending) >= self.commit_size or time.monotonic() - last_flush >= self.commit_interval:
+                self._flush(pending)
+                pending = []
+                last_flush = time.monotonic()
+
+    # ---- driver -------------------------------------------------------
+    def report(self):
+        """One-line stage utilization summary; the busiest stage is the bottleneck"""
+        elapsed = time.time() - self.start_time if self.start_time else 0.0
+        parts = [
+            f"{name}: {stats.utilization(elapsed) * 100:.0f}%"
+            for name, stats in self.stats.items()
+        ]
+        depths = f"queues in/dec/res: {self.input_queue.qsize()}/{self.decoded_queue.qsize()}/{self.result_queue.qsize()}"
+        rate = self.saved_count / elapsed if elapsed > 0 else 0.0
+        return f"📊 {' | '.join(parts)} | {depths} | {rate:.1f} img/s"
+
+    def run(self, work_items, report_interval=10.0):
+        """
+        Push every (asset_id, path) through the pipeline and block until all are written
+
+        Returns:
+            dict: saved, errors, faces, elapsed seconds and per-stage utilization
+        """
+        self.start_time = time.time()
+        threads = [threading.Thread(target=self._decoder_loop, name=f"decode-{i}", daemon=True)
+                   for i in range(self.num_decoders)]
+        threads.append(threading.Thread(target=self._infer_loop, name="infer", daemon=True))
+        writer = threading.Thread(target=self._writer_loop, name="write", daemon=True)
+        threads.append(writer)
+        for thread in threads:
+            thread.start()
+
+        last_report = time.time()
+        for item in work_items:
+            if self.stop_event.is_set():
+                break
+            self.input_queue.put(item)  # blocks when decoders fall behind
+            if report_interval and time.time() - last_report >= report_interval:
+                print(self.report())
+                last_report = time.time()
+        for _ in range(self.num_decoders):
+            self.input_queue.put(_DONE)
+
+        while writer.is_alive():
+            writer.join(timeout=report_interval or None)
+            if writer.is_alive() and report_interval:
+                print(self.report())
+
+        elapsed = time.time() - self.start_time
+        return {
+            "saved": self.saved_count,
+            "errors": self.error_count,
+            "faces": self.face_count,
+            "elapsed": elapsed,
+            "utilization": {name: stats.utilization(elapsed) for name, stats in self.stats.items()},
+        }
+
+    def stop(self):
+        """Stop feeding new work; items already queued are still drained and written"""
+        self.stop_event.set()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Resolution-aware image decoding
+JPEGs are decoded at 1/2, 1/4 or 1/8 scale (libjpeg DCT scaling via cv2.IMREAD_REDUCED_*)
+when detection or alignment does not need the full 12-50 MP frame.
+Every function takes either a file path or the encoded bytes (e.g. an HTTP request body),
+which are decoded in place through np.frombuffer without another copy.
+"""
+
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg', '.jpe', '.jfif')
+
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Aligned crops are 112x112; decode so the smallest face is at least this wide
+MIN_ALIGN_FACE_PX = 112
+
+# Faces up to this much narrower than the crop are aligned from the detection decode:
+# a second decode costs more than the detail a <= 2x upscale loses
+MAX_ALIGN_UPSCALE = 2.0
+
+
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+
+def is_jpeg(source):
+    """Whether DCT-domain downscaling applies to this file path or encoded buffer"""
+    if isinstance(source, str):
+        return source.lower().endswith(JPEG_EXTENSIONS)
+    return bytes(memoryview(source)[:3]) == JPEG_MAGIC
+
+
+def read_image_size(source):
+    """Return (width, height) from the file header without decoding pixels"""
+    try:
+        with Image.open(source if isinstance(source, str) else BytesIO(source)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode_image_bytes(data, flags=cv2.IMREAD_COLOR):
+    """Decode an encoded image buffer (bytes, bytearray, memoryview) without copying it"""
+    if data is None or len(data) == 0:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+def choose_reduction(image_size, target_size):
+    """
+    Pick the largest JPEG reduction (1, 2, 4 or 8) that keeps the image at least as
+    large as its aspect-preserving fit into ``target_size``
+
+    Args:
+        image_size: (width, height) of the full-resolution image
+        target_size: (width, height) the image will be letterboxed into
+    """
+    if not image_size or min(image_size) <= 0:
+        return 1
+    fit_scale = min(target_size[0] / image_size[0], target_size[1] / image_size[1])
+    for reduction in (8, 4, 2):
+        if reduction * fit_scale <= 1.0:
+            return reduction
+    return 1
+
+
+def decode_reduced(source, reduction=1):
+    """Decode a path or buffer at 1/reduction scale (falls back to full decode for non-JPEGs)"""
+    if reduction > 1 and not is_jpeg(source):
+        reduction = 1
+    if isinstance(source, str):
+        return cv2.imread(source, REDUCED_FLAGS[reduction]), reduction
+    return decode_image_bytes(source, REDUCED_FLAGS[reduction]), reduction
+
+
+def decode_for_detection(source, det_size=(640, 640)):
+    """
+    Decode an image at the coarsest resolution that still fills the detector input
+
+    Returns:
+        (np.ndarray, float): BGR image (None if unreadable) and its scale, i.e. the
+        number of full-resolution pixels per decoded pixel; multiply detected
+        coordinates by it to get full-resolution coordinates
+    """
+    reduction = choose_reduction(read_image_size(source), det_size) if is_jpeg(source) else 1
+    image, reduction = decode_reduced(source, reduction)
+    if image is None and reduction > 1:
+        image, reduction = decode_reduced(source, 1)
+    return image, float(reduction)
+
+
+def decode_for_alignment(source, face_widths, decoded=None, min_face_px=MIN_ALIGN_FACE_PX,
+                         max_upscale=MAX_ALIGN_UPSCALE):
+    """
+    Get an image fine enough to align every face
+
+    Reuses the detection decode unless the smallest face would be upscaled by more
+    than ``max_upscale`` into the ``min_face_px`` crop; only then decodes again, at the
+    coarsest reduction where that no longer happens. Ordinary group photos therefore
+    cost the one (reduced) detection decode.
+
+    Args:
+        source: Image file path or encoded bytes
+        face_widths: Face box widths in full-resolution pixels
+        decoded: Optional (image, scale) pair from decode_for_detection
+
+    Returns:
+        (np.ndarray, float): BGR image and its scale, as in decode_for_detection
+    """
+    smallest = float(np.min(face_widths)) if len(face_widths) else 0.0
+    min_width = min_face_px / max_upscale
+    if decoded is not None and decoded[0] is not None and smallest / decoded[1] >= min_width:
+        return decoded
+
+    needed = 1
+    for reduction in (8, 4, 2):
+        if smallest / reduction >= min_width:
+            needed = reduction
+            break
+    if not is_jpeg(source):
+        needed = 1
+    if decoded is not None and decoded[0] is not None and decoded[1] <= needed:
+        return decoded
+    image, reduction = decode_reduced(source, needed)
+    if image is None:
+        return decoded if decoded is not None else (None, 1.0)
+    return image, float(reduction)
+
+
+
+def request_image_source(req):
+    """
+    Pull the image out of a Flask request without base64 or extra copies
+
+    Accepts, in order: a multipart "image" file part, a JSON body with "image_path"
+    (a file local to the service), or the raw request body (any non-JSON,
+    non-form content type, e.g. application/octet-stream or image/jpeg).
+
+    Returns:
+        str or bytes: a file path or the encoded image bytes; None if the request has neither
+    """
+    if req.files and 'image' in req.files:
+        return req.files['image'].read()
+    if req.is_json:
+        data = req.get_json(silent=True) or {}
+        return data.get('image_path')
+    if req.mimetype not in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        body = req.get_data(cache=False)
+        return body or None
+    return None
@@ -7,6 +7,7 @@ import numpy as np
 import torch
 
 from backbones import get_model
+from face_preprocess import preprocess_face
 
 
 @torch.no_grad()
@@ -15,12 +16,8 @@ def inference(weight, name, img):
         img = np.random.randint(0, 255, size=(112, 112, 3), dtype=np.uint8)
     else:
         img = cv2.imread(img)
-        img = cv2.resize(img, (112, 112))
 
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = np.transpose(img, (2, 0, 1))
-    img = torch.from_numpy(img).unsqueeze(0).float()
-    img.div_(255).sub_(0.5).div_(0.5)
+    img = torch.from_numpy(preprocess_face(img))
     net = get_model(name, fp16=False)
     net.load_state_dict(torch.load(weight))
     net.eval()
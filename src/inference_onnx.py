@@ -4,31 +4,38 @@ import requests
 import cv2
 import numpy as np
 import onnxruntime
-from typing import Optional, Tuple, Union
-from flask import Flask, request, jsonify
+from typing import List, Optional, Sequence, Tuple, Union
+from flask import Flask, Response, request, jsonify
 import base64
 import io
 from PIL import Image
 
+from face_preprocess import preprocess_batch
+from image_decode import decode_image_bytes, request_image_source
+from session_profiles import create_session
+from similarity_matrix import NPY_MIMETYPE, similarity_matrix, stream_similarity_matrix
+
 class LVFaceONNXInferencer:
     """LVFace Inference Class using ONNX Runtime"""
     
-    def __init__(self, model_path: str, use_gpu: bool = True):
+    def __init__(self, model_path: str, use_gpu: bool = True, batch_size: int = 64,
+                 intra_op_threads: Optional[int] = None, profile: Optional[str] = None):
         """
         Initialize the LVFace ONNX inferencer
         
         Args:
             model_path (str): Path to the ONNX model file
             use_gpu (bool): Whether to use GPU acceleration (requires onnxruntime-gpu)
+            batch_size (int): Maximum number of faces per session.run in batched inference
+            intra_op_threads (int, optional): CPU threads per operator; set it when several
+                processes share the cores so their thread pools do not oversubscribe them
+            profile (str, optional): Session profile name (see session_profiles)
         """
         # Select execution provider
         providers = ['CUDAExecutionProvider'] if use_gpu else ['CPUExecutionProvider']
         
         # Initialize ONNX Runtime session
-        self.ort_session = onnxruntime.InferenceSession(
-            model_path,
-            providers=providers
-        )
+        self.ort_session = create_session(model_path, providers, profile, intra_op_threads)
         
         # Get input and output names
         self.input_name = self.ort_session.get_inputs()[0].name
@@ -36,6 +43,23 @@ class LVFaceONNXInferencer:
         
         # Input image size
         self.input_size = (112, 112)
+        
+        # Batched inference settings. Models exported by torch2onnx_v1 have a
+        # dynamic 'batch_size' axis; a fixed leading dim caps the chunk size.
+        fixed_batch = self.ort_session.get_inputs()[0].shape[0]
+        self.max_batch_size = fixed_batch if isinstance(fixed_batch, int) and fixed_batch > 0 else None
+        self.batch_size = self._clamp_batch_size(batch_size)
+        
+        output_dim = self.ort_session.get_outputs()[0].shape[-1]
+        self.feature_dim = output_dim if isinstance(output_dim, int) else 512
+
+    def _clamp_batch_size(self, batch_size: int) -> int:
+        """Clamp a requested chunk size to what the model input accepts"""
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if self.max_batch_size is not None:
+            return min(batch_size, self.max_batch_size)
+        return batch_size
 
     def _preprocess_image(self, img: np.ndarray) -> np.ndarray:
         """
@@ -47,22 +71,108 @@ class LVFaceONNXInferencer:
         Returns:
             np.ndarray: Preprocessed image tensor
         """
-        # Resize image to input size
-        img_resized = cv2.resize(img, self.input_size)
+        img_tensor = preprocess_batch([img], input_size=self.input_size)
         
-        # Convert BGR to RGB
-        img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
+        return img_tensor
+
+    def _preprocess_batch(self, imgs: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Preprocess a list of images into a single NCHW float32 tensor
         
-        # Transpose to (C, H, W)
-        img_transposed = np.transpose(img_rgb, (2, 0, 1))
+        Args:
+            imgs (Sequence[np.ndarray]): Input images in BGR format
+            
+        Returns:
+            np.ndarray: Batch tensor of shape (N, 3, 112, 112)
+        """
+        return preprocess_batch(imgs, input_size=self.input_size)
+
+    def _infer_onnx(self, img: np.ndarray) -> np.ndarray:
+        """
+        Extract the feature of a single decoded image
         
-        # Normalize to [-1, 1]
-        img_normalized = ((img_transposed / 255.0) - 0.5) / 0.5
+        Args:
+            img (np.ndarray): Input image in BGR format
+            
+        Returns:
+            np.ndarray: Feature embedding of shape (512,)
+        """
+        return self.infer_batch([img])[0]
+
+    def infer_batch(self, images: Sequence[np.ndarray], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Extract features from a list of decoded images with batched inference
         
-        # Convert to float32 and add batch dimension
-        img_tensor = img_normalized.astype(np.float32)[np.newaxis, ...]
+        Images are stacked into NCHW tensors and run through the session in
+        chunks of at most ``batch_size`` faces per ``session.run`` call.
         
-        return img_tensor
+        Args:
+            images (Sequence[np.ndarray]): Input images in BGR format
+            batch_size (Optional[int]): Chunk size, defaults to ``self.batch_size``
+            
+        Returns:
+            np.ndarray: Feature embeddings of shape (N, 512)
+        """
+        chunk_size = self._clamp_batch_size(batch_size) if batch_size else self.batch_size
+        features = np.empty((len(images), self.feature_dim), dtype=np.float32)
+        
+        for start in range(0, len(images), chunk_size):
+            chunk = images[start:start + chunk_size]
+            features[start:start + len(chunk)] = self.infer_tensor(self._preprocess_batch(chunk), chunk_size)
+            
+        return features
+
+    def infer_tensor(self, img_tensor: np.ndarray, batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Extract features from an already preprocessed NCHW tensor
+        
+        Args:
+            img_tensor (np.ndarray): Tensor of shape (N, 3, 112, 112), e.g. from face_preprocess
+            batch_size (Optional[int]): Chunk size, defaults to ``self.batch_size``
+            
+        Returns:
+            np.ndarray: Feature embeddings of shape (N, 512)
+        """
+        chunk_size = self._clamp_batch_size(batch_size) if batch_size else self.batch_size
+        features = np.empty((len(img_tensor), self.feature_dim), dtype=np.float32)
+        
+        for start in range(0, len(img_tensor), chunk_size):
+            chunk = img_tensor[start:start + chunk_size]
+            output = self.ort_session.run(
+                [self.output_name],
+                {self.input_name: chunk}
+            )
+            features[start:start + len(chunk)] = output[0].reshape(len(chunk), -1)
+            
+        return features
+
+    def infer_paths(self, img_paths: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Extract features from a list of local image files with batched inference
+        
+        Files are decoded one chunk at a time so memory stays bounded by the
+        chunk size rather than the number of paths.
+        
+        Args:
+            img_paths (Sequence[str]): Paths to the local image files
+            batch_size (Optional[int]): Chunk size, defaults to ``self.batch_size``
+            
+        Returns:
+            np.ndarray: Feature embeddings of shape (N, 512), in input order
+        """
+        chunk_size = self._clamp_batch_size(batch_size) if batch_size else self.batch_size
+        features = np.empty((len(img_paths), self.feature_dim), dtype=np.float32)
+        
+        for start in range(0, len(img_paths), chunk_size):
+            imgs: List[np.ndarray] = []
+            for img_path in img_paths[start:start + chunk_size]:
+                img = cv2.imread(img_path)
+                if img is None:
+                    raise ValueError(f"Could not read image from {img_path}")
+                imgs.append(img)
+            features[start:start + len(imgs)] = self.infer_batch(imgs, chunk_size)
+            
+        return features
 
     def infer_from_image(self, img_path: str) -> np.ndarray:
         """
@@ -148,6 +258,20 @@ class LVFaceONNXInferencer:
         
         return dot_product / (norm1 * norm2) if (norm1 > 0 and norm2 > 0) else 0.0
 
+    @staticmethod
+    def calculate_similarity_matrix(feats1: np.ndarray, feats2: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosine similarities of every pair, as one normalized matrix multiply
+        
+        Args:
+            feats1 (np.ndarray): (N, D) embeddings
+            feats2 (np.ndarray, optional): (M, D) embeddings; feats1 against itself if omitted
+            
+        Returns:
+            np.ndarray: (N, M) float32 matrix, same values as calculate_similarity per pair
+        """
+        return similarity_matrix(feats1, feats2)
+
 
 if __name__ == "__main__":
     # Initialize Flask app and model
@@ -178,17 +302,23 @@ if __name__ == "__main__":
             return jsonify({"error": "Model not loaded"}), 500
             
         try:
-            # Check if image is provided in base64 format
-            if 'image' in request.json:
-                # Decode base64 image
+            if request.is_json and 'image' in request.json:
+                # Legacy: base64 image in JSON
                 image_data = base64.b64decode(request.json['image'])
                 img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
-            elif 'url' in request.json:
+            elif request.is_json and 'url' in request.json:
                 # Download image from URL
                 response = requests.get(request.json['url'])
                 img = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
             else:
-                return jsonify({"error": "No image or url provided"}), 400
+                # Local path (JSON image_path), multipart "image" part or raw body
+                source = request_image_source(request)
+                if source is None:
+                    return jsonify({"error": "No image_path, image upload, image or url provided"}), 400
+                img = cv2.imread(source) if isinstance(source, str) else decode_image_bytes(source)
+            
+            if img is None:
+                return jsonify({"error": "Could not decode image"}), 400
                 
             # Get embedding
             embedding = inferencer._infer_onnx(img)
@@ -224,6 +354,23 @@ if __name__ == "__main__":
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/similarity_matrix', methods=['POST'])
+    def calculate_similarity_matrix():
+        """Cosine similarities between two sets of embeddings, streamed as a .npy"""
+        data = request.get_json(silent=True) or {}
+        if 'embeddings1' not in data:
+            return jsonify({"error": "embeddings1 required (embeddings2 defaults to embeddings1)"}), 400
+        try:
+            feats1 = np.atleast_2d(np.asarray(data['embeddings1'], dtype=np.float32))
+            feats2 = np.atleast_2d(np.asarray(data.get('embeddings2', data['embeddings1']), dtype=np.float32))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid embeddings: {e}"}), 400
+        if feats1.ndim != 2 or feats2.ndim != 2 or feats1.shape[1] != feats2.shape[1]:
+            return jsonify({"error": f"Embedding shapes {feats1.shape} and {feats2.shape} do not match"}), 400
+        
+        dtype = np.float16 if data.get('dtype') == 'float16' else np.float32
+        return Response(stream_similarity_matrix(feats1, feats2, dtype), mimetype=NPY_MIMETYPE)
+
     # Start Flask server
     print("🚀 Starting LVFace ONNX service on port 8003...")
     app.run(host='0.0.0.0', port=8003, debug=False)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Approximate 1:N face search for large galleries (IVF)
+An inverted-file index in plain NumPy: spherical k-means splits the gallery into
+``nlist`` cells, each face is stored contiguously with the rest of its cell, and a
+query only scores the faces of the ``nprobe`` cells whose centroids are closest.
+The index is written to a directory of .npy files and memory-mapped on load, so a
+service restart maps the gallery instead of rebuilding it.
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from face_index import l2_normalize
+
+INDEX_META = "index.json"
+INDEX_ARRAYS = ("centroids", "offsets", "ids", "vectors")
+
+# Rows assigned to centroids per matrix multiply while training / building
+ASSIGN_CHUNK = 65536
+
+
+def default_nlist(size):
+    """Roughly 4 * sqrt(N) cells, the usual IVF starting point"""
+    return max(1, min(size, int(4 * np.sqrt(size))))
+
+
+def assign(vectors, centroids):
+    """Index of the most similar centroid for each (normalized) row"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        labels[start:start + ASSIGN_CHUNK] = np.argmax(vectors[start:start + ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors, nlist, iterations=10, sample=64, seed=0):
+    """
+    Spherical k-means on at most ``sample * nlist`` rows
+
+    Empty cells are re-seeded from random training rows, so every cell ends up used.
+    """
+    rng = np.random.RandomState(seed)
+    if len(vectors) > sample * nlist:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample * nlist, replace=False))]
+    vectors = l2_normalize(vectors)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        used = counts > 0
+        sums = np.empty_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[used]
+        sums[used] = np.add.reduceat(vectors[order], starts, axis=0)
+        sums[~used] = vectors[rng.choice(len(vectors), int((~used).sum()))]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+def recall_at_k(exact_ids, approx_ids):
+    """Fraction of the exact top-k found by the approximate search (both (Q, k))"""
+    hits = sum(len(np.intersect1d(e, a)) for e, a in zip(exact_ids, approx_ids))
+    return hits / exact_ids.size if exact_ids.size else 1.0
+
+
+def recall_curve(index, exact, probes, k=10, nprobes=(1, 2, 4, 8, 16, 32, 64)):
+    """
+    recall@k and per-probe latency of ``index`` for each nprobe, against ``exact``
+    (a FaceIndex over the same faces)
+
+    Returns:
+        list of dict: nprobe, recall, ms (mean per probe)
+    """
+    exact_ids, _ = exact.search(probes, k)
+    curve = []
+    for nprobe in sorted(set(min(n, index.nlist) for n in nprobes)):
+        start = time.perf_counter()
+        approx_ids, _ = index.search(probes, k, nprobe)
+        elapsed = time.perf_counter() - start
+        curve.append({"nprobe": nprobe, "recall": recall_at_k(exact_ids, approx_ids),
+                      "ms": elapsed * 1000 / len(probes)})
+    return curve
+
+
+class IVFIndex:
+    """
+    Inverted-file cosine-similarity index
+
+    Faces of cell ``c`` are rows ``offsets[c]:offsets[c + 1]`` of ``vectors`` / ``ids``.
+    ``synced_id`` is the largest face_detections.id included, so newer faces can be
+    served from an exact FaceIndex(base_id=synced_id) next to it.
+    """
+
+    def __init__(self, centroids, offsets, ids, vectors, synced_id=0, nprobe=16):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.synced_id = synced_id
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1]
+
+    @classmethod
+    def build(cls, ids, embeddings, nlist=None, iterations=10, synced_id=None, seed=0):
+        """Train centroids on ``embeddings`` and lay the faces out cell by cell"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = l2_normalize(embeddings)
+        nlist = nlist or default_nlist(len(vectors))
+        centroids = train_centroids(vectors, nlist, iterations, seed=seed)
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        if synced_id is None:
+            synced_id = int(ids.max()) if len(ids) else 0
+        return cls(centroids, offsets, ids[order], vectors[order], synced_id)
+
+    def search(self, probes, k=10, nprobe=None):
+        """
+        Approximate top-k for each probe
+
+        Returns:
+            (ids, scores): (Q, k) arrays, best first; rows are padded with id -1 and
+            score -inf when the probed cells hold fewer than k faces
+        """
+        probes = l2_normalize(probes)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        out_ids = np.full((len(probes), k), -1, dtype=np.int64)
+        out_scores = np.full((len(probes), k), -np.inf, dtype=np.float32)
+        if not len(self) or k == 0:
+            return out_ids, out_scores
+
+        cell_scores = probes @ self.centroids.T
+        if nprobe < self.nlist:
+            cells = np.argpartition(cell_scores, self.nlist - nprobe, axis=1)[:, self.nlist - nprobe:]
+        else:
+            cells = np.broadcast_to(np.arange(self.nlist), cell_scores.shape)
+        offsets = self.offsets
+        for row, probe in enumerate(probes):
+            # Each cell is one contiguous slice: sequential reads from the memory-mapped file
+            spans = [(offsets[c], offsets[c + 1]) for c in np.sort(cells[row]) if offsets[c + 1] > offsets[c]]
+            if not spans:
+                continue
+            scores = np.concatenate([self.vectors[start:end] @ probe for start, end in spans])
+            ids = np.concatenate([self.ids[start:end] for start, end in spans])
+            top = min(k, len(scores))
+            best = np.argpartition(scores, len(scores) - top)[len(scores) - top:]
+            best = best[np.argsort(-scores[best])]
+            out_ids[row, :top] = ids[best]
+            out_scores[row, :top] = scores[best]
+        return out_ids, out_scores
+
+    def save(self, path):
+        """Write the index to directory ``path``, replacing any previous one atomically"""
+        tmp_path = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, INDEX_META), "w") as f:
+            json.dump({"kind": "ivf", "faces": len(self), "nlist": self.nlist, "dim": self.dim,
+                       "synced_id": self.synced_id, "nprobe": self.nprobe}, f)
+        if os.path.exists(path):
+            old_path = f"{tmp_path}.old"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a saved index; with ``mmap`` the face vectors stay on disk until touched"""
+        with open(os.path.join(path, INDEX_META)) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in INDEX_ARRAYS}
+        # Centroids and offsets are tiny and read on every query: keep them in memory
+        arrays["centroids"] = np.asarray(arrays["centroids"])
+        arrays["offsets"] = np.asarray(arrays["offsets"])
+        return cls(synced_id=meta["synced_id"], nprobe=meta.get("nprobe", 16), **arrays)
+
+    def stats(self):
+        return {
+            "kind": "ivf",
+            "faces": len(self),
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "synced_id": self.synced_id,
+            "mapped": isinstance(self.vectors, np.memmap),
+        }
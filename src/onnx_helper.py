@@ -16,9 +16,14 @@ import argparse
 from onnx import numpy_helper
 from insightface.data import get_image
 
+from face_preprocess import preprocess_batch
+from session_profiles import create_session
+
 class ArcFaceORT:
-    def __init__(self, model_path, cpu=False):
+    def __init__(self, model_path, cpu=False, profile=None):
         self.model_path = model_path
+        # session_profiles name; None follows $LVFACE_SESSION_PROFILE
+        self.profile = profile
         # providers = None will use available provider, for onnxruntime-gpu it will be "CUDAExecutionProvider"
         # self.providers = ['CPUExecutionProvider']# if cpu else [None]
         self.providers = ['CUDAExecutionProvider']
@@ -63,8 +68,10 @@ class ArcFaceORT:
             return "do not have onnx files"
         self.model_file = sorted(onnx_files)[-1]
         print('use onnx-model:', self.model_file)
+        # parsed once: reused for the batch-dim fix and the graph/initializer checks below
+        model = onnx.load(self.model_file)
         try:
-            session = onnxruntime.InferenceSession(self.model_file, providers=self.providers)
+            session = create_session(self.model_file, self.providers, self.profile)
         except:
             return "load onnx failed"
         input_cfg = session.get_inputs()[0]
@@ -75,14 +82,13 @@ class ArcFaceORT:
         if not isinstance(input_shape[0], str):
             #return "input_shape[0] should be str to support batch-inference"
             print('reset input-shape[0] to None')
-            model = onnx.load(self.model_file)
             model.graph.input[0].type.tensor_type.shape.dim[0].dim_param = 'None'
             new_model_file = osp.join(self.model_path, 'zzzzrefined.onnx')
             onnx.save(model, new_model_file)
             self.model_file = new_model_file
             print('use new onnx-model:', self.model_file)
             try:
-                session = onnxruntime.InferenceSession(self.model_file, providers=self.providers)
+                session = create_session(self.model_file, self.providers, self.profile)
             except:
                 return "load onnx failed"
             input_cfg = session.get_inputs()[0]
@@ -103,7 +109,6 @@ class ArcFaceORT:
         self.input_name = input_name
         self.output_names = output_names
         #print(self.output_names)
-        model = onnx.load(self.model_file)
         graph = model.graph
         if len(graph.node)<8:
             return "too small onnx graph"
@@ -159,8 +164,8 @@ class ArcFaceORT:
         self.input_mean = input_mean
         self.input_std = input_std
         for initn in graph.initializer:
-            weight_array = numpy_helper.to_array(initn)
-            dt = weight_array.dtype
+            # dtype from the tensor header; no need to materialize every weight array
+            dt = np.dtype(onnx.helper.tensor_dtype_to_np_dtype(initn.data_type))
             if dt.itemsize<4:
                 return 'invalid weight type - (%s:%s)' % (initn.name, dt.name)
         if test_img is None:
@@ -200,9 +205,7 @@ class ArcFaceORT:
                     nimg = cv2.resize(nimg, self.image_size)
                 nimgs.append(nimg)
             imgs = nimgs
-        blob = cv2.dnn.blobFromImages(
-            images=imgs, scalefactor=1.0 / self.input_std, size=self.image_size,
-            mean=(self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        blob = preprocess_batch(imgs, self.image_size, self.input_mean, self.input_std)
         net_out = self.session.run(self.output_names, {self.input_name: blob})[0]
         return net_out
 
@@ -223,7 +226,7 @@ class ArcFaceORT:
                     nimg = cv2.resize(nimg, input_size)
                 nimgs.append(nimg)
             imgs = nimgs
-        blob = cv2.dnn.blobFromImages(imgs, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        blob = preprocess_batch(imgs, input_size, self.input_mean, self.input_std)
         net_out = self.session.run(self.output_names, {self.input_name : blob})[0]
         return net_out
 
@@ -234,7 +237,7 @@ class ArcFaceORT:
             if nimg.shape[0]!=input_size[1] or nimg.shape[1]!=input_size[0]:
                 nimg = cv2.resize(nimg, input_size)
             img = nimg
-        blob = cv2.dnn.blobFromImage(img, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        blob = preprocess_batch([img], input_size, self.input_mean, self.input_std)
         costs = []
         for _ in range(50):
             ta = datetime.datetime.now()
@@ -252,8 +255,9 @@ if __name__ == '__main__':
     # general
     parser.add_argument('workdir', help='submitted work dir', type=str)
     parser.add_argument('--track', help='track name, for different challenge', type=str, default='cfat')
+    parser.add_argument('--session-profile', help='ONNX Runtime session profile', type=str, default=None)
     args = parser.parse_args()
-    handler = ArcFaceORT(args.workdir)
+    handler = ArcFaceORT(args.workdir, profile=args.session_profile)
     err = handler.check(args.track)
     print('err:', err)
 
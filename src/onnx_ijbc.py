@@ -17,6 +17,7 @@ import torch
 from sklearn.metrics import roc_curve
 from sklearn.preprocessing import normalize
 from torch.utils.data import DataLoader
+from face_codecs import make_codec
 from onnx_helper import ArcFaceORT
 
 SRC = np.array(
@@ -180,6 +181,30 @@ def verification2(template_norm_feats=None,
     return score
 
 
+def verification_encoded(template_norm_feats=None,
+                         unique_templates=None,
+                         p1=None,
+                         p2=None,
+                         encoding='float16'):
+    # p2 templates are scored as a compressed search gallery would hold them (see face_codecs),
+    # p1 templates stay full precision like a probe
+    codec = make_codec(encoding, template_norm_feats.shape[1])
+    feats = template_norm_feats.astype(np.float32)
+    codec.train(feats)
+    gallery_feats = codec.decode(*codec.encode(feats))
+    template2id = np.zeros((max(unique_templates) + 1, 1), dtype=int)
+    for count_template, uqt in enumerate(unique_templates):
+        template2id[uqt] = count_template
+    score = np.zeros((len(p1),))
+    batchsize = 100000
+    for i in range(0, len(p1), batchsize):
+        s = np.arange(i, min(i + batchsize, len(p1)))
+        feat1 = feats[template2id[p1[s]]]
+        feat2 = gallery_feats[template2id[p2[s]]]
+        score[s] = np.sum(feat1 * feat2, -1).flatten()
+    return score
+
+
 def main(args):
     use_norm_score = True  # if Ture, TestMode(N1)
     use_detector_score = True  # if Ture, TestMode(D1)
@@ -250,6 +275,14 @@ def main(args):
     score_save_file = os.path.join(save_path, "{}.npy".format(args.target))
     np.save(score_save_file, score)
     files = [score_save_file]
+    for encoding in args.gallery_encodings:
+        # TPR@FPR of the same templates scored against a compressed gallery
+        start = timeit.default_timer()
+        encoded_score = verification_encoded(template_norm_feats, unique_templates, p1, p2, encoding)
+        encoded_save_file = os.path.join(save_path, "{}_{}.npy".format(args.target, encoding))
+        np.save(encoded_save_file, encoded_score)
+        files.append(encoded_save_file)
+        print('%s gallery time: %.2f s. ' % (encoding, timeit.default_timer() - start))
     methods = []
     scores = []
     for file in files:
@@ -282,6 +315,8 @@ if __name__ == '__main__':
     parser.add_argument('--model-root', default='', help='path to load model.')
     parser.add_argument('--image-path', default='/train_tmp/IJB_release/IJBC', type=str, help='')
     parser.add_argument('--target', default='IJBC', type=str, help='target, set to IJBC or IJBB')
+    parser.add_argument('--gallery-encodings', nargs='*', default=[], choices=['float16', 'int8', 'pq'],
+                        help='also report TPR@FPR with the gallery side compressed')
 
     # os.environ["CUDA_VISIBLE_DEVICES"] = '0'
     main(parser.parse_args())
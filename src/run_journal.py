@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Run journal for batch face processing
+Records each run (id, high-water asset id, counters) and every asset outcome with its
+timing in the metadata DB, so an interrupted run can be resumed and progress/ETA are
+computed from real totals and a moving window instead of lifetime averages.
+"""
+
+import collections
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from face_work_queue import FAILED, STALE_CLAIM_SECONDS
+
+RUN_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS face_runs (
+        run_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        started_at REAL,
+        updated_at REAL,
+        finished_at REAL,
+        high_water_id INTEGER NOT NULL DEFAULT 0,
+        processed INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS face_run_assets (
+        run_id TEXT NOT NULL,
+        asset_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        seconds REAL,
+        finished_at REAL,
+        PRIMARY KEY (run_id, asset_id)
+    );
+"""
+
+RECORD_ASSET_SQL = """
+    INSERT OR REPLACE INTO face_run_assets (run_id, asset_id, status, seconds, finished_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+CHECKPOINT_SQL = """
+    UPDATE face_runs
+    SET high_water_id = MAX(high_water_id, ?), processed = ?, errors = ?, status = ?, updated_at = ?,
+        finished_at = CASE WHEN ? = 'running' THEN NULL ELSE ? END
+    WHERE run_id = ?
+"""
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "?"
+    if seconds > 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds > 60:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds:.0f}s"
+
+
+class ProgressWindow:
+    """Throughput over the last ``window_seconds`` (robust to warm-up and stalls)"""
+
+    def __init__(self, window_seconds=60.0):
+        self.window_seconds = window_seconds
+        self._points = collections.deque()
+
+    def update(self, count, now=None):
+        now = time.monotonic() if now is None else now
+        self._points.append((now, count))
+        while len(self._points) > 2 and now - self._points[1][0] >= self.window_seconds:
+            self._points.popleft()
+
+    def rate(self):
+        """Items per second across the window, None until two points are known"""
+        if len(self._points) < 2:
+            return None
+        (t0, c0), (t1, c1) = self._points[0], self._points[-1]
+        return (c1 - c0) / (t1 - t0) if t1 > t0 else None
+
+    def eta(self, remaining):
+        rate = self.rate()
+        return remaining / rate if rate else None
+
+
+class RunJournal:
+    """
+    One processing run: created fresh, or resumed from the last unfinished run of ``kind``
+
+    Asset outcomes are queued on the shared FaceDBWriter so they commit together with
+    the face rows and work-queue statuses they describe.
+    """
+
+    def __init__(self, db_path, kind, run_id=None, resume=False, checkpoint_every=100, window_seconds=60.0):
+        self.db_path = db_path
+        self.kind = kind
+        self.checkpoint_every = checkpoint_every
+        self.window = ProgressWindow(window_seconds)
+        self.lock = threading.Lock()
+
+        self.processed = 0
+        self.errors = 0
+        self.high_water_id = 0
+        self.total = None
+        self.resumed = False
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            conn.executescript(RUN_SCHEMA_SQL)
+            if resume and run_id is None:
+                row = conn.execute("""
+                    SELECT run_id FROM face_runs WHERE kind = ? AND status != 'finished'
+                    ORDER BY started_at DESC LIMIT 1
+                """, (kind,)).fetchone()
+                run_id = row[0] if row else None
+
+            existing = conn.execute(
+                "SELECT high_water_id FROM face_runs WHERE run_id = ?", (run_id,)
+            ).fetchone() if run_id else None
+            if resume and existing:
+                self.resumed = True
+                self.high_water_id = existing[0]
+                # Counters from the per-asset log, which is exact even if a checkpoint was missed
+                for status, count in conn.execute(
+                    "SELECT status, COUNT(*) FROM face_run_assets WHERE run_id = ? GROUP BY status", (run_id,)
+                ):
+                    if status == FAILED:
+                        self.errors += count
+                    else:
+                        self.processed += count
+                last_asset = conn.execute(
+                    "SELECT MAX(asset_id) FROM face_run_assets WHERE run_id = ?", (run_id,)
+                ).fetchone()[0]
+                self.high_water_id = max(self.high_water_id, last_asset or 0)
+                conn.execute("UPDATE face_runs SET status = 'running', updated_at = ? WHERE run_id = ?",
+                             (time.time(), run_id))
+            else:
+                run_id = run_id or f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+                conn.execute("""
+                    INSERT INTO face_runs (run_id, kind, started_at, updated_at) VALUES (?, ?, ?, ?)
+                """, (run_id, kind, time.time(), time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.run_id = run_id
+        self._since_checkpoint = 0
+        self.window.update(self.done)
+
+    @property
+    def done(self):
+        return self.processed + self.errors
+
+    def set_remaining(self, remaining):
+        """Total = what this run already finished + what the work queue still holds"""
+        self.total = self.done + remaining
+
+    def record(self, writer, asset_id, status, seconds=None):
+        """Log one asset outcome (done / no_faces / failed) and checkpoint periodically"""
+        with self.lock:
+            if status == FAILED:
+                self.errors += 1
+            else:
+                self.processed += 1
+            self.high_water_id = max(self.high_water_id, asset_id)
+            self.window.update(self.done)
+            self._since_checkpoint += 1
+            checkpoint = self._since_checkpoint >= self.checkpoint_every
+            if checkpoint:
+                self._since_checkpoint = 0
+        writer.insert(RECORD_ASSET_SQL, (self.run_id, asset_id, status, seconds, time.time()))
+        if checkpoint:
+            self.checkpoint(writer)
+
+    def checkpoint(self, writer, status='running'):
+        now = time.time()
+        writer.insert(CHECKPOINT_SQL, (
+            self.high_water_id, self.processed, self.errors, status, now, status, now, self.run_id
+        ))
+
+    def finish(self, writer, status='finished'):
+        """Mark the run finished (or 'interrupted', which --resume picks up again)"""
+        self.checkpoint(writer, status)
+
+    def eta_seconds(self):
+        if self.total is None:
+            return None
+        return self.window.eta(max(self.total - self.done, 0))
+
+    def progress_line(self):
+        total = f"{self.total:,}" if self.total is not None else "?"
+        pct = f" ({self.done / self.total * 100:.1f}%)" if self.total else ""
+        rate = self.window.rate() or 0.0
+        return (f"Progress: {self.done:,}/{total}{pct} | Errors: {self.errors} | "
+                f"Rate: {rate:.1f}/sec | ETA: {format_eta(self.eta_seconds())}")
+
+
+
+def open_run(db_path, work_queue, kind, resume=False, run_id=None, stale_after=STALE_CLAIM_SECONDS):
+    """
+    Start or resume a run against ``work_queue``
+
+    The run id doubles as the work-queue worker id, so resuming hands this run's
+    unfinished claims back to pending before processing continues. Claims any worker
+    has held for more than ``stale_after`` seconds are returned to pending as well, so
+    assets claimed by a crashed run are not stranded.
+    """
+    journal = RunJournal(db_path, kind, run_id=run_id, resume=resume)
+    stale = work_queue.release_stale(stale_after)
+    if stale:
+        print(f"♻️  {stale} stale claims (older than {stale_after}s) returned to the queue")
+    if journal.resumed:
+        released = work_queue.release_claims(journal.run_id)
+        print(f"♻️  Resuming run {journal.run_id}: {journal.done:,} assets already finished "
+              f"(high-water id {journal.high_water_id}), {released} claims returned to the queue")
+    else:
+        print(f"📝 Run {journal.run_id}")
+    journal.set_remaining(work_queue.remaining())
+    return journal
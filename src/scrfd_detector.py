@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Detection-only SCRFD face detector
+Runs the buffalo_l SCRFD ONNX model (det_10g.onnx) directly with ONNX Runtime, without
+FaceAnalysis' landmark-3D, gender/age and ArcFace recognition models.
+Decoding follows insightface.model_zoo.scrfd.SCRFD.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from face_preprocess import normalize_batch
+from session_profiles import create_session
+
+DEFAULT_MODEL_PATH = os.path.expanduser("~/.insightface/models/buffalo_l/det_10g.onnx")
+
+# SCRFD pixel normalization: (pixel - 127.5) / 128.0, RGB
+SCRFD_MEAN = 127.5
+SCRFD_STD = 128.0
+
+
+def distance2bbox(points, distance):
+    """Decode (K, 4) left/top/right/bottom distances from (K, 2) anchor centers to x1y1x2y2"""
+    return np.concatenate([points - distance[:, 0:2], points + distance[:, 2:4]], axis=-1)
+
+
+def distance2kps(points, distance):
+    """Decode (K, 10) keypoint offsets from (K, 2) anchor centers to (K, 5, 2) keypoints"""
+    return points[:, None, :] + distance.reshape(len(distance), distance.shape[1] // 2, 2)
+
+
+def batched_nms(dets, image_ids, thresh):
+    """
+    NMS over boxes from several images in one call
+
+    Boxes are shifted by image id times the coordinate span so boxes from
+    different images can never overlap, then a single greedy NMS runs on all of them.
+    """
+    if len(dets) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    span = dets[:, :4].max() - dets[:, :4].min() + 2.0
+    offset = (image_ids.astype(np.float32) * span)[:, None]
+    shifted = dets.copy()
+    shifted[:, :4] += offset
+    return np.asarray(nms(shifted, thresh), dtype=np.int64)
+
+
+def nms(dets, thresh):
+    """Greedy IoU non-maximum suppression over (K, 5) [x1, y1, x2, y2, score] boxes"""
+    x1, y1, x2, y2, scores = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1 + 1) * np.maximum(0.0, yy2 - yy1 + 1)
+        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[np.where(ovr <= thresh)[0] + 1]
+    return keep
+
+
+def export_dynamic_batch(model_path, output_path=None):
+    """
+    Rewrite an SCRFD ONNX model whose input has a fixed batch dim so it accepts any batch
+
+    Same approach as onnx_helper.ArcFaceORT.check: rename input dim 0 to a symbolic name.
+    """
+    import onnx
+
+    model = onnx.load(model_path)
+    model.graph.input[0].type.tensor_type.shape.dim[0].dim_param = 'batch'
+    output_path = output_path or model_path.replace('.onnx', '_batch.onnx')
+    onnx.save(model, output_path)
+    return output_path
+
+
+class SCRFDDetector:
+    """SCRFD face detector returning boxes and 5-point keypoints as NumPy arrays"""
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, providers=None, det_size=(640, 640),
+                 det_thresh=0.5, nms_thresh=0.4, intra_op_threads=None, profile=None):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"SCRFD model not found: {model_path}")
+        self.model_path = model_path
+        # intra_op_threads bounds the pool when several detector processes share the CPU
+        self.session = create_session(
+            model_path,
+            providers or ['CUDAExecutionProvider', 'CPUExecutionProvider'],
+            profile,
+            intra_op_threads
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self.det_size = tuple(det_size)
+        fixed_batch = self.session.get_inputs()[0].shape[0]
+        self.max_batch_size = fixed_batch if isinstance(fixed_batch, int) and fixed_batch > 0 else None
+        if self.max_batch_size is not None:
+            # A fixed batch dim would cap every detect_batch chunk: load a dynamic-batch export instead
+            self._load_dynamic_batch(providers or ['CUDAExecutionProvider', 'CPUExecutionProvider'],
+                                     profile, intra_op_threads)
+        self.det_thresh = det_thresh
+        self.nms_thresh = nms_thresh
+
+        # 6/9 outputs: 3 strides, 10/15: 5 strides; scores, boxes, (keypoints)
+        num_outputs = len(self.output_names)
+        self.use_kps = num_outputs in (9, 15)
+        self.fmc = 3 if num_outputs in (6, 9) else 5
+        self.feat_stride_fpn = [8, 16, 32] if self.fmc == 3 else [8, 16, 32, 64, 128]
+        self.num_anchors = 2 if self.fmc == 3 else 1
+        self._center_cache = {}
+
+    def _load_dynamic_batch(self, providers, profile, intra_op_threads):
+        """Swap in a dynamic-batch export of the model if one can be made and runs a batch of 2"""
+        fixed_batch = self.max_batch_size
+        batch_path = self.model_path.replace('.onnx', '_batch.onnx')
+        try:
+            if not os.path.exists(batch_path) or os.path.getmtime(batch_path) < os.path.getmtime(self.model_path):
+                export_dynamic_batch(self.model_path, batch_path)
+            session = create_session(batch_path, providers, profile, intra_op_threads)
+            input_w, input_h = self.det_size
+            session.run(self.output_names, {self.input_name: np.zeros((2, 3, input_h, input_w), dtype=np.float32)})
+        except Exception as e:
+            print(f"⚠️ SCRFD batch dim is fixed at {fixed_batch} and no dynamic-batch export could be loaded "
+                  f"({e}): detect_batch is capped at {fixed_batch} image(s) per forward")
+            return
+        self.session = session
+        self.max_batch_size = None
+        print(f"⚡ SCRFD batch dim was fixed at {fixed_batch}, using dynamic-batch export {batch_path}")
+
+    def _anchor_centers(self, height, width, stride):
+        key = (height, width, stride)
+        if key not in self._center_cache:
+            centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            centers = (centers * stride).reshape(-1, 2)
+            if self.num_anchors > 1:
+                centers = np.repeat(centers, self.num_anchors, axis=0)
+            self._center_cache[key] = centers
+        return self._center_cache[key]
+
+    def _resize_input(self, img, out=None):
+        """Letterbox keeping aspect ratio into a zero-padded det_size canvas (top-left aligned)"""
+        input_w, input_h = self.det_size
+        im_ratio = img.shape[0] / img.shape[1]
+        if im_ratio > input_h / input_w:
+            new_h = input_h
+            new_w = int(new_h / im_ratio)
+        else:
+            new_w = input_w
+            new_h = int(new_w * im_ratio)
+        det_scale = new_h / img.shape[0]
+
+        if out is None:
+            out = np.zeros((input_h, input_w, 3), dtype=np.uint8)
+        else:
+            out[new_h:] = 0
+            out[:new_h, new_w:] = 0
+        out[:new_h, :new_w] = cv2.resize(img, (new_w, new_h))
+        return out, det_scale
+
+    def _decode_batch(self, net_outs, batch_size, input_h, input_w):
+        """
+        Decode outputs of a batched forward for all images at once
+
+        Returns flat arrays of every above-threshold anchor across the batch plus
+        the index of the image each one belongs to.
+        """
+        image_ids, scores_list, bboxes_list, kpss_list = [], [], [], []
+        for idx, stride in enumerate(self.feat_stride_fpn):
+            # det_10g flattens the batch into rows (B*K, c); batched exports give (B, K, c)
+            scores = net_outs[idx].reshape(batch_size, -1)
+            bbox_preds = net_outs[idx + self.fmc].reshape(batch_size, -1, 4)
+            centers = self._anchor_centers(input_h // stride, input_w // stride, stride)
+
+            img_idx, anchor_idx = np.nonzero(scores >= self.det_thresh)
+            image_ids.append(img_idx)
+            scores_list.append(scores[img_idx, anchor_idx])
+            bboxes_list.append(distance2bbox(centers[anchor_idx], bbox_preds[img_idx, anchor_idx] * stride))
+            if self.use_kps:
+                kps_preds = net_outs[idx + self.fmc * 2].reshape(batch_size, scores.shape[1], -1)
+                kpss_list.append(distance2kps(centers[anchor_idx], kps_preds[img_idx, anchor_idx] * stride))
+
+        image_ids = np.concatenate(image_ids)
+        scores = np.concatenate(scores_list)
+        bboxes = np.concatenate(bboxes_list)
+        kpss = np.concatenate(kpss_list) if self.use_kps else None
+        return image_ids, scores, bboxes, kpss
+
+    def _forward_batch(self, imgs, canvas):
+        """Letterbox a chunk of images into ``canvas``, run one forward and decode all of them"""
+        input_w, input_h = self.det_size
+        det_scales = np.empty((len(imgs),), dtype=np.float32)
+        for i, img in enumerate(imgs):
+            _, det_scales[i] = self._resize_input(img, out=canvas[i])
+
+        blob = normalize_batch(canvas[:len(imgs)], mean=SCRFD_MEAN, std=SCRFD_STD)
+        net_outs = self.session.run(self.output_names, {self.input_name: blob})
+        image_ids, scores, bboxes, kpss = self._decode_batch(net_outs, len(imgs), input_h, input_w)
+
+        # Back to source coordinates, then one NMS across the whole chunk
+        scale = det_scales[image_ids]
+        dets = np.hstack((bboxes / scale[:, None], scores[:, None])).astype(np.float32, copy=False)
+        if kpss is not None:
+            kpss = (kpss / scale[:, None, None]).astype(np.float32, copy=False)
+        keep = batched_nms(dets, image_ids, self.nms_thresh)
+        return image_ids[keep], dets[keep], (kpss[keep] if kpss is not None else None)
+
+    def detect_batch(self, imgs, batch_size=16, max_num=0):
+        """
+        Detect faces in a list of BGR images with batched forwards
+
+        Every image is letterboxed into a fixed det_size slot of one preallocated
+        (B, H, W, 3) canvas, so a chunk of ``batch_size`` images costs a single
+        session.run; anchor decoding and NMS are vectorized across the chunk.
+
+        Returns:
+            list of (np.ndarray, np.ndarray): per-image (N, 5) boxes and (N, 5, 2) keypoints,
+            same format as detect()
+        """
+        if self.max_batch_size is not None:
+            batch_size = min(batch_size, self.max_batch_size)
+        input_w, input_h = self.det_size
+        canvas = np.zeros((min(batch_size, max(len(imgs), 1)), input_h, input_w, 3), dtype=np.uint8)
+
+        results = []
+        for start in range(0, len(imgs), batch_size):
+            chunk = imgs[start:start + batch_size]
+            image_ids, dets, kpss = self._forward_batch(chunk, canvas)
+            for i in range(len(chunk)):
+                mask = image_ids == i
+                img_dets = dets[mask]
+                img_kpss = kpss[mask] if kpss is not None else None
+                if max_num > 0 and img_dets.shape[0] > max_num:
+                    area = (img_dets[:, 2] - img_dets[:, 0]) * (img_dets[:, 3] - img_dets[:, 1])
+                    index = np.argsort(area)[::-1][:max_num]
+                    img_dets = img_dets[index]
+                    img_kpss = img_kpss[index] if img_kpss is not None else None
+                results.append((img_dets, img_kpss))
+        return results
+
+    def detect(self, img, max_num=0):
+        """
+        Detect faces in one BGR image
+
+        Returns:
+            (np.ndarray, np.ndarray): (N, 5) [x1, y1, x2, y2, score] boxes and
+            (N, 5, 2) keypoints in source image coordinates (None if the model has no kps head)
+        """
+        return self.detect_batch([img], batch_size=1, max_num=max_num)[0]
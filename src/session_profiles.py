@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Named ONNX Runtime session profiles
+One place that turns a deployment profile (``latency``, ``throughput``,
+``low-memory``, ...) into SessionOptions and provider options, so every
+InferenceSession in the service, the batch processors and the eval helpers is tuned
+the same way. Profiles can be added or overridden from a JSON file
+(``--session-profiles`` / $LVFACE_SESSION_PROFILES) and picked by name
+(``--session-profile`` / $LVFACE_SESSION_PROFILE). A pre-optimized graph written
+by optimize_model is loaded whenever one matching the model's digest sits next to
+it; the model is only hashed (once, cached in a ``.digest`` sidecar) when such
+artifacts exist.
+"""
+
+import glob
+import json
+import os
+import platform
+
+import onnxruntime as ort
+
+from face_cache import content_hash
+
+PROFILE_ENV = "LVFACE_SESSION_PROFILE"
+PROFILES_FILE_ENV = "LVFACE_SESSION_PROFILES"
+OPTIMIZED_MODEL_ENV = "LVFACE_USE_OPTIMIZED_MODEL"
+DEFAULT_PROFILE = "default"
+
+# Keys (all optional):
+#   intra_op_threads / inter_op_threads   0 = ORT decides
+#   execution_mode                        sequential | parallel
+#   graph_optimization_level              disable | basic | extended | all
+#   enable_mem_pattern / enable_cpu_mem_arena
+#   allow_spinning                        worker threads busy-wait between runs
+#   thread_affinities                     ORT "session.intra_op_thread_affinities" string
+#   gpu_mem_limit_mb / cuda_arena_extend_strategy (kNextPowerOfTwo | kSameAsRequested)
+#   optimized_model_dir                   where optimized graphs are kept (default: next to the
+#                                         model); when set, a missing one is written on first load
+#   use_optimized_model                   load a matching optimized graph when present (default True;
+#                                         $LVFACE_USE_OPTIMIZED_MODEL=0 also opts out)
+PROFILES = {
+    # ORT defaults, i.e. what every session used before profiles existed
+    "default": {},
+    # Single small requests: one parallel operator pool, spinning threads, full fusion
+    "latency": {
+        "inter_op_threads": 1,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "all",
+        "enable_mem_pattern": True,
+        "enable_cpu_mem_arena": True,
+        "allow_spinning": True,
+    },
+    # Large batches from the batch processors: keep every core busy, no spinning
+    "throughput": {
+        "inter_op_threads": 2,
+        "execution_mode": "parallel",
+        "graph_optimization_level": "all",
+        "enable_mem_pattern": True,
+        "enable_cpu_mem_arena": True,
+        "allow_spinning": False,
+        "cuda_arena_extend_strategy": "kNextPowerOfTwo",
+    },
+    # Shared hosts: few threads, no pre-planned buffers, arenas grow only as needed
+    "low-memory": {
+        "intra_op_threads": 2,
+        "inter_op_threads": 1,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "basic",
+        "enable_mem_pattern": False,
+        "enable_cpu_mem_arena": False,
+        "allow_spinning": False,
+        "gpu_mem_limit_mb": 2048,
+        "cuda_arena_extend_strategy": "kSameAsRequested",
+    },
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def load_profiles(path=None):
+    """Built-in profiles updated with the JSON file at ``path`` (or $LVFACE_SESSION_PROFILES)"""
+    profiles = {name: dict(profile) for name, profile in PROFILES.items()}
+    path = path or os.environ.get(PROFILES_FILE_ENV)
+    if path:
+        with open(path) as f:
+            for name, profile in json.load(f).items():
+                # "extends" starts from another profile, e.g. {"extends": "throughput", "intra_op_threads": 8}
+                base = profiles.get(profile.pop("extends", None), {})
+                profiles[name] = dict(base, **profile)
+    return profiles
+
+
+def get_profile(name=None, path=None):
+    """Resolve a profile by name (default: $LVFACE_SESSION_PROFILE, then 'default')"""
+    if isinstance(name, dict):
+        return name
+    name = name or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(f"Unknown session profile '{name}' (available: {', '.join(sorted(profiles))})")
+    return dict(profiles[name], name=name)
+
+
+def session_options(profile=None, intra_op_threads=None):
+    """SessionOptions for a profile; ``intra_op_threads`` overrides it (e.g. per shard)"""
+    profile = get_profile(profile)
+    options = ort.SessionOptions()
+    if intra_op_threads:
+        # Several sessions share the cores: one bounded pool each
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+    else:
+        if profile.get("intra_op_threads"):
+            options.intra_op_num_threads = profile["intra_op_threads"]
+        if profile.get("inter_op_threads"):
+            options.inter_op_num_threads = profile["inter_op_threads"]
+    if "execution_mode" in profile:
+        options.execution_mode = EXECUTION_MODES[profile["execution_mode"]]
+    if "graph_optimization_level" in profile:
+        options.graph_optimization_level = OPTIMIZATION_LEVELS[profile["graph_optimization_level"]]
+    if "enable_mem_pattern" in profile:
+        options.enable_mem_pattern = profile["enable_mem_pattern"]
+    if "enable_cpu_mem_arena" in profile:
+        options.enable_cpu_mem_arena = profile["enable_cpu_mem_arena"]
+    if "allow_spinning" in profile:
+        spin = "1" if profile["allow_spinning"] else "0"
+        options.add_session_config_entry("session.intra_op.allow_spinning", spin)
+        options.add_session_config_entry("session.inter_op.allow_spinning", spin)
+    if profile.get("thread_affinities"):
+        options.add_session_config_entry("session.intra_op_thread_affinities", profile["thread_affinities"])
+    return options
+
+
+def provider_options(providers, profile=None):
+    """Attach the profile's CUDA arena settings to CUDAExecutionProvider"""
+    profile = get_profile(profile)
+    cuda = {}
+    if profile.get("gpu_mem_limit_mb"):
+        cuda["gpu_mem_limit"] = str(profile["gpu_mem_limit_mb"] * 1024 * 1024)
+    if profile.get("cuda_arena_extend_strategy"):
+        cuda["arena_extend_strategy"] = profile["cuda_arena_extend_strategy"]
+    if not cuda:
+        return list(providers)
+    return [(provider, cuda) if provider == 'CUDAExecutionProvider' else provider for provider in providers]
+
+
+def model_digest(model_path):
+    """Content hash of a model file, cached in a ``.digest`` sidecar keyed by size and mtime"""
+    st = os.stat(model_path)
+    sidecar = model_path + ".digest"
+    try:
+        with open(sidecar) as f:
+            cached = json.load(f)
+        if (cached["size"], cached["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return cached["digest"]
+    except (OSError, ValueError, KeyError):
+        pass
+    digest = content_hash(model_path)
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}, f)
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        # Read-only or shared model directory: hash again next time
+        print(f"⚠️ Could not cache model digest in {sidecar} ({e})")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return digest
+
+
+def optimized_model_path(model_path, providers, profile=None):
+    """
+    Path of the optimized graph for this model and runtime
+
+    Keyed by model hash, ORT version, optimization level, the execution provider that
+    will actually run it and the CPU architecture, so an artifact is never loaded by
+    a runtime it was not optimized for.
+    """
+    profile = get_profile(profile)
+    directory = profile.get("optimized_model_dir") or os.path.dirname(os.path.abspath(model_path))
+    names = [provider[0] if isinstance(provider, tuple) else provider for provider in providers]
+    device = "cuda" if 'CUDAExecutionProvider' in names and \
+        'CUDAExecutionProvider' in ort.get_available_providers() else "cpu"
+    level = profile.get("graph_optimization_level", "all")
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    key = f"{model_digest(model_path)[:16]}.ort{ort.__version__}.{level}.{device}.{platform.machine()}"
+    return os.path.join(directory, f"{stem}.{key}.opt.onnx")
+
+
+def _build_session(model_path, options, providers, artifact_path=None):
+    """Create a session, saving its optimized graph to ``artifact_path`` atomically"""
+    if artifact_path is None:
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    options.optimized_model_filepath = tmp_path
+    session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    os.replace(tmp_path, artifact_path)  # concurrent writers never expose a partial file
+    return session
+
+
+def optimize_model(model_path, providers, profile=None):
+    """Ahead-of-time step: serialize the optimized graph for this runtime; returns its path"""
+    profile = get_profile(profile)
+    artifact_path = optimized_model_path(model_path, providers, profile)
+    _build_session(model_path, session_options(profile), provider_options(providers, profile), artifact_path)
+    return artifact_path
+
+
+def wants_optimized_model(profile):
+    """Whether create_session looks for a pre-optimized graph (unless the profile or env opts out)"""
+    if "use_optimized_model" in profile:
+        return bool(profile["use_optimized_model"])
+    return os.environ.get(OPTIMIZED_MODEL_ENV, "1") != "0"
+
+
+def has_optimized_models(model_path, profile=None):
+    """Whether any optimized graph of this model exists (a glob, no hashing)"""
+    profile = get_profile(profile)
+    directory = profile.get("optimized_model_dir") or os.path.dirname(os.path.abspath(model_path))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return bool(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(stem)}.*.opt.onnx")))
+
+
+def create_session(model_path, providers, profile=None, intra_op_threads=None):
+    """
+    InferenceSession for ``model_path`` tuned by ``profile`` (name, dict or None)
+
+    Loads the pre-optimized graph matching this model and runtime when one exists
+    (skipping graph optimization), otherwise the original model; with
+    optimized_model_dir set, a missing graph is written on the way.
+    """
+    profile = get_profile(profile)
+    options = session_options(profile, intra_op_threads)
+    providers = provider_options(providers, profile)
+    if not wants_optimized_model(profile) or \
+            not (profile.get("optimized_model_dir") or has_optimized_models(model_path, profile)):
+        print(f"📦 Model graph: {os.path.basename(model_path)}")
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+
+    try:
+        artifact_path = optimized_model_path(model_path, providers, profile)
+    except OSError as e:
+        print(f"⚠️ No optimized model lookup for {model_path} ({e})")
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+    if os.path.exists(artifact_path):
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            session = ort.InferenceSession(artifact_path, sess_options=options, providers=providers)
+            print(f"⚡ Pre-optimized graph: {os.path.basename(artifact_path)}")
+            return session
+        except Exception as e:
+            print(f"⚠️ Optimized model {artifact_path} unusable ({e}), loading {model_path}")
+            options = session_options(profile, intra_op_threads)
+    elif profile.get("optimized_model_dir"):
+        print(f"⚡ Writing optimized graph: {os.path.basename(artifact_path)}")
+        return _build_session(model_path, options, providers, artifact_path)
+    else:
+        print(f"⚠️ No optimized graph matches {os.path.basename(model_path)} (re-run utils/optimize_models.py)")
+    print(f"📦 Model graph: {os.path.basename(model_path)}")
+    return ort.InferenceSession(model_path, sess_options=options, providers=providers)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Multi-process sharded face processing for CPU-only hosts
+Splits the pending asset range into N contiguous shards and runs one worker process
+per shard, each with its own FacePipeline and ONNX sessions limited to
+cores // N intra-op threads, so decode, detection and embedding scale past one
+interpreter. Workers only compute: records come back over a multiprocessing queue
+and the parent writes them through the single FaceDBWriter and EmbeddingStore
+(neither supports writers in several processes).
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+
+import cv2
+
+from direct_gpu_processor import DirectGPUFaceProcessor
+from embedding_store import EmbeddingStore
+from face_clustering import FaceClusterer
+from face_work_queue import FaceWorkQueue
+from gpu_pipeline import FacePipeline
+
+
+def shard_worker(shard, after_id, last_id, run_id, options, batch_size, results, stop):
+    """Process one id range and send every record group back to the parent"""
+    cv2.setNumThreads(1)  # decode parallelism comes from the processes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C via ``stop``
+
+    processor = DirectGPUFaceProcessor(**options)
+    if not processor.initialize_gpu_model():
+        results.put(("failed", shard, "model failed to load"))
+        return
+    work_queue = FaceWorkQueue(processor.db_path, seed=False)
+
+    def claims():
+        cursor = after_id
+        while not stop.is_set():
+            page = work_queue.claim(run_id, batch_size, after_id=cursor, last_id=last_id)
+            if not page:
+                return
+            yield from page
+            cursor = page[-1][0]
+
+    def send(records):
+        # Records carry the digest and stat taken in the decode stage for the parent's fingerprints
+        results.put(("records", shard, records))
+
+    pipeline = FacePipeline(
+        processor.inferencer,
+        send,
+        detector=processor.detector,
+        num_decoders=processor.num_decoders,
+        batch_size=processor.infer_batch_size,
+        commit_size=processor.commit_size,
+        to_local_path=processor.to_wsl_path
+    )
+    summary = pipeline.run(claims(), report_interval=0)
+    results.put(("done", shard, summary))
+
+
+class ShardedFaceProcessor:
+    """
+    Run DirectGPUFaceProcessor's pipeline in ``num_shards`` worker processes
+
+    Args:
+        num_shards: Worker processes (default: one per core)
+        intra_op_threads: ONNX threads per worker (default: cores // num_shards)
+        decoders_per_shard: Decode threads inside each worker
+        use_gpu: Keep False on CPU-only hosts; True shares one GPU between shards
+        **options: Passed to DirectGPUFaceProcessor (use_detector, db_path, model_path, ...)
+    """
+
+    def __init__(self, num_shards=None, intra_op_threads=None, decoders_per_shard=1, use_gpu=False, **options):
+        cores = os.cpu_count() or 1
+        self.num_shards = num_shards or cores
+        self.intra_op_threads = intra_op_threads or max(1, cores // self.num_shards)
+        self.options = dict(options, use_gpu=use_gpu, intra_op_threads=self.intra_op_threads,
+                            num_decoders=decoders_per_shard)
+        # Parent side: run journal, work queue and the one writer; never loads a model
+        self.processor = DirectGPUFaceProcessor(**self.options)
+
+    def run(self, batch_size=200, resume=False, run_id=None):
+        """
+        Process every pending asset across the shards
+
+        Returns:
+            dict: saved, errors, elapsed seconds and per-shard summaries
+        """
+        processor = self.processor
+        journal = processor.open_run(resume=resume, run_id=run_id)
+        bounds = processor.work_queue.shard_bounds(self.num_shards)
+        print(f"🎯 Target: {journal.total:,} images ({journal.done:,} already done in this run)")
+        print(f"🔧 Shards: {self.num_shards} processes x {self.intra_op_threads} ONNX threads | "
+              f"ranges: {bounds}")
+
+        ctx = mp.get_context("spawn")  # fresh interpreters: no forked ORT/CUDA state
+        results = ctx.Queue(maxsize=self.num_shards * 8)
+        stop = ctx.Event()
+        workers = [
+            ctx.Process(target=shard_worker, name=f"face-shard-{shard}", daemon=True,
+                        args=(shard, after_id, last_id, journal.run_id, self.options, batch_size, results, stop))
+            for shard, (after_id, last_id) in enumerate(bounds)
+        ]
+
+        start = time.time()
+        for worker in workers:
+            worker.start()
+
+        summaries = {}
+        failed = []
+        saved = errors = 0
+        interrupted = False
+        while len(summaries) < len(workers):
+            try:
+                kind, shard, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break  # a worker died without reporting
+                continue
+            except KeyboardInterrupt:
+                print("\n⏹️  Stopping shards after their current pages (resume with --resume)")
+                stop.set()
+                interrupted = True
+                continue
+            if kind == "records":
+                processor.save_face_results(payload)
+                saved += sum(1 for record in payload if record["error"] is None)
+                errors += sum(1 for record in payload if record["error"] is not None)
+            else:
+                summaries[shard] = payload
+                if kind == "failed":
+                    failed.append(shard)
+                    print(f"❌ Shard {shard}: {payload}")
+
+        for worker in workers:
+            worker.join()
+        # Unfinished shards leave claims under the run id; --resume hands them back
+        interrupted = interrupted or bool(failed) or len(summaries) < len(workers)
+        journal.finish(processor.get_db_writer(), 'interrupted' if interrupted else 'finished')
+        processor.db_writer.close()
+        elapsed = time.time() - start
+
+        processor.processed_count, processor.error_count = saved, errors
+        print(f"\n🎉 SHARDED PROCESSING COMPLETE: {saved:,} images, {errors} errors in {elapsed:.1f}s "
+              f"({saved / elapsed if elapsed > 0 else 0:.1f} img/s)")
+        return {"saved": saved, "errors": errors, "elapsed": elapsed, "shards": summaries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded multi-process face processing (CPU)')
+    parser.add_argument('--shards', type=int, default=None, help='worker processes (default: CPU cores)')
+    parser.add_argument('--intra-op-threads', type=int, default=None,
+                        help='ONNX threads per worker (default: cores // shards)')
+    parser.add_argument('--decoders-per-shard', type=int, default=1, help='decode threads per worker')
+    parser.add_argument('--batch-size', type=int, default=200, help='assets claimed per work-queue page')
+    parser.add_argument('--infer-batch-size', type=int, default=16, help='faces per session.run')
+    parser.add_argument('--use-detector', action='store_true', help='detect and align faces with SCRFD')
+    parser.add_argument('--gpu', action='store_true', help='use CUDAExecutionProvider in every shard')
+    parser.add_argument('--session-profile', default=None, help='ONNX Runtime session profile (see session_profiles)')
+    parser.add_argument('--resume', action='store_true', help='continue the last unfinished run')
+    parser.add_argument('--run-id', help='run id to create or resume')
+    parser.add_argument('--cluster', action='store_true', help='assign person clusters to the new faces afterwards')
+    args = parser.parse_args()
+
+    runner = ShardedFaceProcessor(
+        num_shards=args.shards,
+        intra_op_threads=args.intra_op_threads,
+        decoders_per_shard=args.decoders_per_shard,
+        use_gpu=args.gpu,
+        infer_batch_size=args.infer_batch_size,
+        use_detector=args.use_detector,
+        session_profile=args.session_profile
+    )
+    runner.run(batch_size=args.batch_size, resume=args.resume, run_id=args.run_id)
+    if args.cluster:
+        processor = runner.processor
+        stats = FaceClusterer(processor.db_path, EmbeddingStore(processor.embeddings_dir)).update()
+        print(f"👥 Clustered {stats['faces']:,} faces: {stats['joined']:,} joined existing clusters, "
+              f"{stats['new_clusters']:,} new, {stats['merged']} merged ({stats['seconds']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
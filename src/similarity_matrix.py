@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Batch cosine similarity matrices
+Compares two sets of embeddings as one normalized matrix multiply instead of N x M
+calculate_similarity calls, computed in row blocks so large inputs never hold more
+than one block of scores, and serialized as a .npy stream (header first, then the
+blocks as they are computed) that ``np.load`` reads back directly.
+"""
+
+import io
+
+import numpy as np
+
+from face_index import l2_normalize
+
+# Scores per computed / streamed block (8 MB of float32)
+BLOCK_VALUES = 1 << 21
+
+NPY_MIMETYPE = "application/x-npy"
+
+
+def similarity_blocks(a, b, block_rows=None):
+    """
+    Yield (first_row, block) of the (len(a), len(b)) cosine similarity matrix
+
+    Zero vectors score 0 against everything, as in calculate_similarity.
+    """
+    a = l2_normalize(a)
+    b = l2_normalize(b)
+    block_rows = block_rows or max(1, BLOCK_VALUES // max(len(b), 1))
+    bt = np.ascontiguousarray(b.T)
+    for start in range(0, len(a), block_rows):
+        yield start, a[start:start + block_rows] @ bt
+
+
+def similarity_matrix(a, b=None):
+    """Full cosine similarity matrix of a against b (a against itself when b is None)"""
+    a = np.atleast_2d(np.asarray(a, dtype=np.float32))
+    b = a if b is None else np.atleast_2d(np.asarray(b, dtype=np.float32))
+    out = np.empty((len(a), len(b)), dtype=np.float32)
+    for start, block in similarity_blocks(a, b):
+        out[start:start + len(block)] = block
+    return out
+
+
+def npy_header(shape, dtype=np.float32):
+    """.npy header for a C-ordered array of ``shape``, so the data can follow in pieces"""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": tuple(shape),
+    })
+    return header.getvalue()
+
+
+def stream_similarity_matrix(a, b=None, dtype=np.float32, block_rows=None):
+    """Yield the similarity matrix as .npy bytes: the header, then one chunk per row block"""
+    a = np.atleast_2d(np.asarray(a, dtype=np.float32))
+    b = a if b is None else np.atleast_2d(np.asarray(b, dtype=np.float32))
+    yield npy_header((len(a), len(b)), dtype)
+    for _, block in similarity_blocks(a, b, block_rows):
+        yield block.astype(dtype, copy=False).tobytes()
@@ -4,20 +4,36 @@ Unified SCRFD Face Detection + LVFace Recognition Service
 Enhanced version of LVFace inference_onnx.py with SCRFD face detection
 """
 
+import argparse
+import atexit
 import cv2
 import numpy as np
-import onnxruntime as ort
 import requests
 import sqlite3
+import threading
 import json
 import os
 import time
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import base64
 from io import BytesIO
 from PIL import Image
 
+from batch_scheduler import MicroBatchScheduler
+from face_align import align_and_preprocess
+from embedding_store import EmbeddingStore, ensure_embedding_columns
+from face_cache import FaceResultCache
+from face_clustering import FaceClusterer
+from face_db_writer import FaceDBWriter
+from face_index import FaceIndex
+from ivf_index import IVFIndex
+from face_preprocess import preprocess_batch
+from image_decode import decode_for_alignment, decode_for_detection, decode_image_bytes, request_image_source
+from scrfd_detector import DEFAULT_MODEL_PATH as SCRFD_MODEL_PATH, SCRFDDetector
+from session_profiles import create_session, get_profile
+from similarity_matrix import NPY_MIMETYPE, similarity_matrix, stream_similarity_matrix
+
 # Import InsightFace for SCRFD
 try:
     import insightface
@@ -28,21 +44,111 @@ except ImportError as e:
     INSIGHTFACE_AVAILABLE = False
     print(f"⚠️ InsightFace not available: {e}")
 
+# Append-only binary embedding shards (see embedding_store.py)
+EMBEDDINGS_DIR = "E:/VLM_DATA/embeddings/face_store"
+
+# Extra ANN candidates fetched per probe to make up for faces deleted since its build
+ANN_OVERFETCH = 16
+
+# Largest k /search accepts (result arrays are allocated per probe x k)
+MAX_SEARCH_K = 1000
+
+INSERT_FACE_DETECTION_SQL = """
+    INSERT INTO face_detections 
+    (asset_id, bbox_x, bbox_y, bbox_w, bbox_h, confidence, 
+     embedding_shard, embedding_row, detection_model, created_at)
+    VALUES (
+        COALESCE(?, (SELECT id FROM assets WHERE path = ?)),
+        ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
 class UnifiedFaceService:
-    def __init__(self):
+    def __init__(self, max_batch_size=32, max_wait_ms=2.0, detector_mode="scrfd", detect_batch_size=8,
+                 reduced_decode=True, db_commit_size=500, db_commit_interval=2.0,
+                 embeddings_dir=EMBEDDINGS_DIR, embedding_dtype='float16', cache_size=4096,
+                 persistent_cache=True, session_profile=None, session_profiles_file=None, index_refresh=2.0,
+                 ann_index=None, ann_nprobe=None, gallery_encoding='float32', rerank=100,
+                 cluster_threshold=0.5):
         self.app = Flask(__name__)
         
+        # Decode JPEGs at 1/2-1/8 scale for detection, re-decoding finer only when faces need it
+        self.reduced_decode = reduced_decode
+        self.det_size = (640, 640)
+        
+        # Images per batched SCRFD forward in /process_images
+        self.detect_batch_size = detect_batch_size
+        
+        # "scrfd": detection-only SCRFD ONNX model; "buffalo_l": full InsightFace FaceAnalysis pack
+        self.detector_mode = detector_mode
+        
         # Initialize ONNX providers
         self.providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] 
         
+        # ONNX Runtime tuning shared by the LVFace and SCRFD sessions (see session_profiles)
+        self.session_profile = get_profile(session_profile, session_profiles_file)
+        print(f"⚙️  Session profile: {self.session_profile['name']}")
+        
         # Load LVFace recognition model
         self.load_lvface_model()
         
+        # Coalesce face crops from all in-flight requests into batched session.run calls
+        self.scheduler = MicroBatchScheduler(
+            self.run_embedding_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="lvface-batcher"
+        )
+        
         # Load SCRFD face detector
         self.load_scrfd_detector()
         
         # Database connection
         self.db_path = '/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/vlmPhotoHouse/metadata.sqlite'
+        ensure_embedding_columns(self.db_path)
+        self.embedding_store = EmbeddingStore(embeddings_dir, dtype=embedding_dtype)
+        self.db_writer = FaceDBWriter(self.db_path, commit_size=db_commit_size, commit_interval=db_commit_interval)
+        atexit.register(self.db_writer.close)
+        
+        # Content-hash result cache: LRU in memory, face_result_cache table on disk
+        self.cache = None
+        if cache_size > 0:
+            model_id = f"LVFace-B_Glint360K|{self.detector_mode}:{self.detector_type}|" \
+                       f"{self.det_size[0]}x{self.det_size[1]}|{'reduced' if reduced_decode else 'full'}"
+            self.cache = FaceResultCache(
+                model_id,
+                capacity=cache_size,
+                db_path=self.db_path if persistent_cache else None,
+                writer=self.db_writer
+            )
+        
+        # 1:N search gallery over the embedding store (see face_index), loaded on first /search
+        self.face_index = None
+        self.index_lock = threading.Lock()
+        # One refresh sync at a time, run outside index_lock so searches are not held up
+        self.index_sync_lock = threading.Lock()
+        self.index_refresh = index_refresh
+        self.index_synced_at = 0.0
+        # Gallery held as float32, float16, int8 or pq (face_codecs); lossy ones re-rank
+        # their best `rerank` candidates from the embedding store
+        self.gallery_encoding = gallery_encoding
+        self.rerank = rerank
+        
+        # Person clusters in face_clusters, updated by POST /cluster
+        self.clusterer = None
+        self.cluster_threshold = cluster_threshold
+        self.cluster_lock = threading.Lock()
+        
+        # Prebuilt approximate index for large galleries (utils/build_ann_index.py), memory-mapped
+        self.ann_index = None
+        if ann_index and os.path.exists(ann_index):
+            self.ann_index = IVFIndex.load(ann_index)
+            if ann_nprobe:
+                self.ann_index.nprobe = ann_nprobe
+            print(f"🔎 ANN index: {len(self.ann_index):,} faces in {self.ann_index.nlist} cells "
+                  f"(nprobe {self.ann_index.nprobe}) mapped from {ann_index}")
+        elif ann_index:
+            print(f"⚠️ ANN index {ann_index} not found, searching exactly")
         
         self.setup_routes()
         
@@ -54,8 +160,10 @@ class UnifiedFaceService:
             return False
             
         try:
-            self.session = ort.InferenceSession(model_path, providers=self.providers)
+            start_time = time.time()
+            self.session = create_session(model_path, self.providers, self.session_profile)
             print(f"✅ LVFace model loaded with providers: {self.session.get_providers()}")
+            print(f"⏱️ LVFace session ready in {time.time() - start_time:.2f}s")
             
             # Get input details
             self.input_name = self.session.get_inputs()[0].name
@@ -68,7 +176,10 @@ class UnifiedFaceService:
             return False
             
     def load_scrfd_detector(self):
-        """Load SCRFD face detector from InsightFace"""
+        """Load SCRFD face detector (detection-only model, or InsightFace FaceAnalysis)"""
+        if self.detector_mode == "scrfd" and self.load_scrfd_direct():
+            return True
+        
         try:
             if not INSIGHTFACE_AVAILABLE:
                 print("❌ InsightFace not available, falling back to OpenCV")
@@ -76,7 +187,11 @@ class UnifiedFaceService:
                 
             # Initialize SCRFD face analysis
             print("🔄 Initializing SCRFD FaceAnalysis...")
-            self.face_app = FaceAnalysis(providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
+            allowed_modules = ['detection'] if self.detector_mode == "scrfd" else None
+            self.face_app = FaceAnalysis(
+                providers=['CUDAExecutionProvider', 'CPUExecutionProvider'],
+                allowed_modules=allowed_modules
+            )
             
             print("📥 Preparing SCRFD models (downloading if needed)...")
             print("   This may take several minutes for first-time setup...")
@@ -104,6 +219,24 @@ class UnifiedFaceService:
             print(f"⚠️ SCRFD failed ({str(e)[:100]}...), falling back to OpenCV")
             return self.load_opencv_fallback()
     
+    def load_scrfd_direct(self, model_path=SCRFD_MODEL_PATH):
+        """Load only the SCRFD detection ONNX model and call it without FaceAnalysis"""
+        if not os.path.exists(model_path):
+            print(f"📦 {model_path} not found, using FaceAnalysis to fetch buffalo_l")
+            return False
+        
+        try:
+            start_time = time.time()
+            self.scrfd = SCRFDDetector(model_path, providers=self.providers, det_size=self.det_size,
+                                       profile=self.session_profile)
+            self.detector_type = "scrfd"
+            print(f"✅ SCRFD detection-only model loaded: {model_path}")
+            print(f"⏱️ Detector load took {time.time() - start_time:.1f} seconds")
+            return True
+        except Exception as e:
+            print(f"⚠️ Direct SCRFD load failed ({str(e)[:100]}...)")
+            return False
+    
     def load_opencv_fallback(self):
         """Fallback to OpenCV face detector"""
         try:
@@ -122,7 +255,9 @@ class UnifiedFaceService:
         Returns: List of face bounding boxes and additional info
         """
         try:
-            if self.detector_type == "scrfd" and hasattr(self, 'face_app'):
+            if self.detector_type == "scrfd" and hasattr(self, 'scrfd'):
+                return self.detect_faces_scrfd_direct(image)
+            elif self.detector_type == "scrfd" and hasattr(self, 'face_app'):
                 return self.detect_faces_scrfd(image)
             else:
                 return self.detect_faces_opencv(image)
@@ -131,6 +266,47 @@ class UnifiedFaceService:
             print(f"❌ Face detection error: {e}")
             return []
     
+    def scrfd_face_boxes(self, bboxes, kpss):
+        """Convert SCRFDDetector arrays to the service's face_info dicts"""
+        face_boxes = []
+        for i, det in enumerate(bboxes):
+            x1, y1, x2, y2 = det[:4].astype(int)
+            face_boxes.append({
+                'bbox': [int(x1), int(y1), int(x2 - x1), int(y2 - y1)],  # [x1, y1, w, h]
+                'confidence': float(det[4]),
+                'landmarks': kpss[i].tolist() if kpss is not None else None,
+                'detector': 'scrfd'
+            })
+        return face_boxes
+    
+    def detect_faces_scrfd_direct(self, image):
+        """Detect faces with the detection-only SCRFD model"""
+        try:
+            face_boxes = self.scrfd_face_boxes(*self.scrfd.detect(image))
+            print(f"🔍 SCRFD detected {len(face_boxes)} faces")
+            return face_boxes
+            
+        except Exception as e:
+            print(f"❌ SCRFD detection error: {e}")
+            return []
+    
+    def detect_faces_batch(self, images):
+        """
+        Detect faces in several images
+        The detection-only SCRFD model letterboxes them into one batched forward;
+        other detectors fall back to one call per image.
+        """
+        if self.detector_type == "scrfd" and hasattr(self, 'scrfd'):
+            try:
+                results = self.scrfd.detect_batch(images, batch_size=self.detect_batch_size)
+                face_boxes = [self.scrfd_face_boxes(bboxes, kpss) for bboxes, kpss in results]
+                print(f"🔍 SCRFD detected {sum(len(f) for f in face_boxes)} faces in {len(images)} images")
+                return face_boxes
+            except Exception as e:
+                print(f"❌ SCRFD batch detection error: {e}")
+                return [[] for _ in images]
+        return [self.detect_faces(image) for image in images]
+    
     def detect_faces_scrfd(self, image):
         """Detect faces using SCRFD"""
         try:
@@ -206,147 +382,406 @@ class UnifiedFaceService:
             print(f"❌ OpenCV detection error: {e}")
             return []
     
-    def preprocess_face(self, face_img):
-        """Preprocess face image for LVFace model"""
-        try:
-            # Resize to model input size
-            target_size = (112, 112)  # Standard face recognition input size
-            face_resized = cv2.resize(face_img, target_size)
-            
-            # Normalize
-            face_normalized = face_resized.astype(np.float32) / 255.0
-            
-            # Convert BGR to RGB and transpose to CHW
-            face_rgb = cv2.cvtColor(face_normalized, cv2.COLOR_BGR2RGB)
-            face_transposed = np.transpose(face_rgb, (2, 0, 1))
-            
-            # Add batch dimension
-            face_batch = np.expand_dims(face_transposed, axis=0)
-            
-            return face_batch
-            
-        except Exception as e:
-            print(f"❌ Face preprocessing error: {e}")
-            return None
+    def run_embedding_batch(self, face_batch):
+        """Run LVFace on a stacked (N, 3, 112, 112) batch and L2-normalize the rows"""
+        outputs = self.session.run(None, {self.input_name: face_batch})
+        embeddings = outputs[0].reshape(len(face_batch), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
     
-    def get_face_embedding(self, face_img):
-        """Get face embedding using LVFace"""
+    def embed_face_rows(self, face_rows):
+        """Embed preprocessed (3, 112, 112) rows in one scheduler submission; None rows stay None"""
+        valid = [i for i, row in enumerate(face_rows) if row is not None]
+        embeddings = [None] * len(face_rows)
+        for i, embedding in zip(valid, self.scheduler.run_many([face_rows[i] for i in valid])):
+            embeddings[i] = embedding.tolist()
+        return embeddings
+    
+    def prepare_face_rows(self, image, face_detections, scale=1.0):
+        """
+        Build the LVFace input rows for all faces of one image
+        Faces with 5-point landmarks are similarity-aligned to the ArcFace template in one
+        batched warp; faces without landmarks (OpenCV fallback) use their bbox crop.
+        Detections are in full-resolution pixels; ``scale`` is full-resolution pixels
+        per pixel of ``image`` (see image_decode).
+        """
+        face_rows = [None] * len(face_detections)
+        aligned_idx = [
+            i for i, face_info in enumerate(face_detections)
+            if face_info.get('landmarks') is not None and len(face_info['landmarks']) == 5
+        ]
+        
+        if aligned_idx:
+            try:
+                landmarks = np.array([face_detections[i]['landmarks'] for i in aligned_idx], dtype=np.float32) / scale
+                face_batch = align_and_preprocess(image, landmarks)
+                for i, row in zip(aligned_idx, face_batch):
+                    face_rows[i] = row
+                    face_detections[i]['aligned'] = True
+            except Exception as e:
+                print(f"❌ Face alignment error: {e}")
+                aligned_idx = []
+        
+        aligned_set = set(aligned_idx)
+        crop_idx = []
+        face_crops = []
+        for i in range(len(face_detections)):
+            if i in aligned_set:
+                continue
+            x, y, w, h = [int(round(v / scale)) for v in face_detections[i]['bbox']]
+            x, y = max(x, 0), max(y, 0)
+            face_crop = image[y:y+h, x:x+w]
+            if face_crop.size > 0:
+                crop_idx.append(i)
+                face_crops.append(face_crop)
+        
+        if face_crops:
+            try:
+                for i, row in zip(crop_idx, preprocess_batch(face_crops)):
+                    face_rows[i] = row
+            except Exception as e:
+                print(f"❌ Face preprocessing error: {e}")
+        
+        return face_rows
+    
+    def get_aligned_embeddings(self, image, face_detections, scale=1.0):
+        """Get embeddings for all faces of one image (aligned when landmarks are available)"""
         try:
-            # Preprocess face
-            face_input = self.preprocess_face(face_img)
-            if face_input is None:
-                return None
-                
-            # Run inference
-            outputs = self.session.run(None, {self.input_name: face_input})
-            embedding = outputs[0][0]  # Remove batch dimension
-            
-            # Normalize embedding
-            embedding = embedding / np.linalg.norm(embedding)
-            
-            return embedding.tolist()
-            
+            return self.embed_face_rows(self.prepare_face_rows(image, face_detections, scale))
         except Exception as e:
             print(f"❌ Face embedding error: {e}")
-            return None
+            return [None] * len(face_detections)
     
-    def save_face_detection(self, image_path, face_detections, embeddings):
-        """Save face detection results to database"""
+    def save_face_detection(self, image_path, face_detections, embeddings, asset_id=None):
+        """
+        Save face detection results to database (embeddings go to the binary store)
+        Rows belong to ``asset_id`` when given, else to the asset whose path is image_path.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            faces = [(face_info, embedding) for face_info, embedding in zip(face_detections, embeddings)
+                     if embedding is not None]
+            if not faces:
+                return True
             
-            for i, (face_info, embedding) in enumerate(zip(face_detections, embeddings)):
-                if embedding is None:
-                    continue
-                    
+            # One append for all faces of the image; rows reference (shard, row)
+            refs = self.embedding_store.append(np.stack([embedding for _, embedding in faces]))
+            
+            rows = []
+            created_at = datetime.now()
+            for (face_info, _), (shard, row) in zip(faces, refs):
                 bbox = face_info['bbox']
                 x, y, w, h = int(bbox[0]), int(bbox[1]), int(bbox[2]), int(bbox[3])
                 confidence = float(face_info.get('confidence', 0.95))
                 detector_model = face_info.get('detector', 'unknown')
-                
-                # Create embedding file path
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                embedding_filename = f"face_{timestamp}_{i}.json"
-                # Use Drive E location for embeddings
-                embeddings_dir = "E:/VLM_DATA/embeddings/faces"
-                embedding_path = f"{embeddings_dir}/{embedding_filename}"
-                
-                # Save embedding to file
-                os.makedirs(embeddings_dir, exist_ok=True)
-                with open(embedding_path, 'w') as f:
-                    # Ensure embedding is JSON serializable
-                    serializable_embedding = [float(x) for x in embedding] if embedding else []
-                    json.dump(serializable_embedding, f)
-                
-                # Insert into database
-                cursor.execute("""
-                    INSERT INTO face_detections 
-                    (asset_id, bbox_x, bbox_y, bbox_w, bbox_h, confidence, 
-                     embedding_path, detection_model, created_at)
-                    VALUES (
-                        (SELECT id FROM assets WHERE path = ?),
-                        ?, ?, ?, ?, ?, ?, ?, ?
-                    )
-                """, (
-                    image_path, x, y, w, h, confidence,
-                    embedding_path, f"{detector_model}_lvface", datetime.now()
+                rows.append((
+                    asset_id, image_path, x, y, w, h, confidence,
+                    shard, row, f"{detector_model}_lvface", created_at
                 ))
             
-            conn.commit()
-            conn.close()
+            self.db_writer.insert_many(INSERT_FACE_DETECTION_SQL, rows)
             
-            print(f"✅ Saved {len(embeddings)} face detections to database")
+            print(f"✅ Queued {len(rows)} face detections for database")
             return True
             
         except Exception as e:
             print(f"❌ Database save error: {e}")
             return False
     
-    def process_image(self, image_path):
-        """Process single image: detect faces + get embeddings"""
+    def load_image(self, source):
+        """
+        Decode an image (file path or encoded bytes) for detection
+        Returns (image, full-resolution pixels per image pixel)
+        """
+        if self.reduced_decode:
+            return decode_for_detection(source, self.det_size)
+        if isinstance(source, str):
+            return cv2.imread(source), 1.0
+        return decode_image_bytes(source), 1.0
+    
+    def load_alignment_image(self, source, face_detections, decoded):
+        """Reuse the detection decode, or decode finer when small faces need more pixels"""
+        if not self.reduced_decode:
+            return decoded
+        return decode_for_alignment(source, [face_info['bbox'][2] for face_info in face_detections], decoded)
+    
+    @staticmethod
+    def scale_face_detections(face_detections, scale):
+        """Map bboxes and landmarks from decoded-image to full-resolution coordinates"""
+        if scale == 1.0:
+            return face_detections
+        for face_info in face_detections:
+            face_info['bbox'] = [int(round(v * scale)) for v in face_info['bbox']]
+            if face_info.get('landmarks') is not None:
+                face_info['landmarks'] = (np.asarray(face_info['landmarks']) * scale).tolist()
+        return face_detections
+    
+    def read_source(self, image_path, image_data=None):
+        """Encoded image bytes: the upload, or the file read once for both hashing and decoding"""
+        if image_data is not None:
+            return image_data
+        with open(image_path, 'rb') as f:
+            return f.read()
+    
+    def cache_lookup(self, source):
+        """Return (key, cached faces/embeddings or None); key is None when caching is off"""
+        if self.cache is None:
+            return None, None
+        key = self.cache.key_for(source)
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        faces, matrix = cached
+        rows = iter(matrix if matrix is not None else [])
+        embeddings = [next(rows).tolist() if face.get('embedded', True) else None for face in faces]
+        return key, ([dict(face) for face in faces], embeddings)
+    
+    def cache_store(self, key, face_detections, embeddings):
+        """Remember one image's detections and embeddings under its content key"""
+        if key is None:
+            return
+        faces = [dict(face_info, embedded=emb is not None) for face_info, emb in zip(face_detections, embeddings)]
+        rows = [emb for emb in embeddings if emb is not None]
+        self.cache.put(key, faces, np.asarray(rows, dtype=np.float32) if rows else None)
+    
+    def build_image_result(self, image_path, face_detections, embeddings, cached=False, asset_id=None):
+        """Save one image's faces (when the image has an asset id or path) and build its response"""
+        if not face_detections:
+            return {"faces": 0, "embeddings": [], "cached": cached}
+        if image_path or asset_id is not None:
+            self.save_face_detection(image_path, face_detections, embeddings, asset_id)
+        
+        return {
+            "faces": len(face_detections),
+            "detector": self.detector_type,
+            "cached": cached,
+            "detections": [
+                {
+                    "bbox": face_info['bbox'],
+                    "confidence": face_info.get('confidence', 0.0),
+                    "detector": face_info.get('detector', 'unknown'),
+                    "embedding": emb,  # Include actual embedding
+                    "embedding_size": len(emb) if emb else 0,
+                    "has_landmarks": face_info.get('landmarks') is not None,
+                    "aligned": face_info.get('aligned', False)
+                }
+                for face_info, emb in zip(face_detections, embeddings)
+            ]
+        }
+    
+    def extract_faces(self, source):
+        """Detect and embed the faces of one image (path or bytes); None if it cannot be decoded"""
+        # Load image (reduced-resolution JPEG decode when detection allows)
+        image, scale = self.load_image(source)
+        if image is None:
+            return None
+        
+        # Detect faces, reported in full-resolution coordinates
+        face_detections = self.scale_face_detections(self.detect_faces(image), scale)
+        embeddings = []
+        if face_detections:
+            # Align and embed all faces in one scheduler submission
+            align_image, align_scale = self.load_alignment_image(source, face_detections, (image, scale))
+            embeddings = self.get_aligned_embeddings(align_image, face_detections, align_scale)
+        return face_detections, embeddings
+    
+    def get_face_index(self):
+        """Gallery of all stored faces, built on first use and re-synced every index_refresh seconds"""
+        with self.index_lock:
+            if self.face_index is None:
+                start_time = time.time()
+                # Only faces newer than the ANN index (if any) are held exactly
+                base_id = self.ann_index.synced_id if self.ann_index is not None else 0
+                self.face_index = FaceIndex(dim=self.embedding_store.dim, base_id=base_id,
+                                            encoding=self.gallery_encoding, rerank=self.rerank)
+                self.db_writer.flush(timeout=10)
+                self.face_index.sync(self.db_path, self.embedding_store)
+                self.index_synced_at = time.time()
+                print(f"🔎 Face index: {len(self.face_index):,} faces ({self.gallery_encoding}) "
+                      f"loaded in {time.time() - start_time:.1f}s")
+            face_index = self.face_index
+            refresh = time.time() - self.index_synced_at >= self.index_refresh
+        # The index locks itself (and trains a new codec off its lock), so other
+        # requests keep searching the current gallery while one of them re-syncs it
+        if refresh and self.index_sync_lock.acquire(blocking=False):
+            try:
+                # Commit queued face rows so faces saved moments ago are searchable
+                self.db_writer.flush(timeout=10)
+                face_index.sync(self.db_path, self.embedding_store)
+                self.index_synced_at = time.time()
+            finally:
+                self.index_sync_lock.release()
+        return face_index
+    
+    def search_ids(self, probes, k=10, nprobe=None):
+        """
+        (ids, scores) of the top stored faces per probe embedding
+        With an ANN index loaded, its approximate matches (``nprobe`` cells, all cells
+        for an exact answer) are merged with an exact search over the faces stored
+        since it was built; then up to k + ANN_OVERFETCH columns come back, padded
+        with id -1, and faces deleted since the build may be among them.
+        """
+        ids, scores = self.get_face_index().search(probes, k)
+        if self.ann_index is not None:
+            ann_ids, ann_scores = self.ann_index.search(probes, k + ANN_OVERFETCH, nprobe)
+            ids = np.concatenate([ann_ids, ids], axis=1)
+            scores = np.concatenate([ann_scores, scores], axis=1)
+            order = np.argsort(-scores, axis=1, kind="stable")
+            ids = np.take_along_axis(ids, order, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+        return ids, scores
+    
+    def search_faces(self, probes, k=10, nprobe=None):
+        """Top-k stored faces per probe embedding, with their asset ids and paths"""
+        ids, scores = self.search_ids(probes, k, nprobe)
+        
+        details = {}
+        face_ids = sorted(set(ids.ravel().tolist()) - {-1})
+        if face_ids:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                for start in range(0, len(face_ids), 900):  # sqlite host-parameter limit
+                    chunk = face_ids[start:start + 900]
+                    details.update((row[0], row[1:]) for row in conn.execute(f"""
+                        SELECT fd.id, fd.asset_id, a.path, fd.bbox_x, fd.bbox_y, fd.bbox_w, fd.bbox_h
+                        FROM face_detections fd LEFT JOIN assets a ON a.id = fd.asset_id
+                        WHERE fd.id IN ({','.join('?' * len(chunk))})
+                    """, chunk))
+            finally:
+                conn.close()
+        
+        results = []
+        for row_ids, row_scores in zip(ids.tolist(), scores.tolist()):
+            matches = []
+            for face_id, score in zip(row_ids, row_scores):
+                if face_id not in details:
+                    continue  # padding, or deleted since the index was built
+                asset_id, path, x, y, w, h = details[face_id]
+                matches.append({"face_id": face_id, "asset_id": asset_id, "path": path,
+                                "bbox": [x, y, w, h], "score": score})
+                if len(matches) == k:
+                    break
+            results.append(matches)
+        return results
+    
+    def stored_embeddings(self, face_ids):
+        """Embeddings of face_detections rows, in the order of ``face_ids``; raises KeyError for unknown ids"""
+        face_ids = [int(face_id) for face_id in face_ids]
+        refs = {}
+        unique_ids = sorted(set(face_ids))
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for start in range(0, len(unique_ids), 900):  # sqlite host-parameter limit
+                chunk = unique_ids[start:start + 900]
+                refs.update((row[0], row[1:]) for row in conn.execute(f"""
+                    SELECT id, embedding_shard, embedding_row FROM face_detections
+                    WHERE embedding_shard IS NOT NULL AND id IN ({','.join('?' * len(chunk))})
+                """, chunk))
+        finally:
+            conn.close()
+        missing = [face_id for face_id in unique_ids if face_id not in refs]
+        if missing:
+            raise KeyError(f"No stored embedding for face ids {missing[:20]}")
+        return self.embedding_store.get_many([refs[face_id] for face_id in face_ids])
+    
+    def get_clusterer(self):
+        """Person clustering over the same gallery /search uses (see face_clustering)"""
+        if self.clusterer is None:
+            self.clusterer = FaceClusterer(self.db_path, self.embedding_store, threshold=self.cluster_threshold,
+                                           search=self.search_ids)
+        return self.clusterer
+    
+    def process_image(self, image_path, image_data=None, asset_id=None, asset_path=None):
+        """
+        Process single image: detect faces + get embeddings
+        image_data (encoded bytes from an upload) is decoded instead of reading
+        image_path; image_path is then only used to link results to the asset.
+        Faces are saved under ``asset_id``, else the asset at ``asset_path`` (the
+        original path when image_path is a mapped one, e.g. /mnt/e/...), else image_path.
+        """
+        target = asset_path or image_path
+        source = image_data if image_data is not None else image_path
         try:
-            # Load image
-            image = cv2.imread(image_path)
-            if image is None:
+            # Duplicate photos are answered from the content-hash cache
+            key = None
+            if self.cache is not None:
+                source = self.read_source(image_path, image_data)
+                key, cached = self.cache_lookup(source)
+                if cached is not None:
+                    return self.build_image_result(target, *cached, cached=True, asset_id=asset_id)
+            
+            extracted = self.extract_faces(source)
+            if extracted is None:
                 return {"error": "Could not load image"}
+            face_detections, embeddings = extracted
             
-            # Detect faces
-            face_detections = self.detect_faces(image)
-            if not face_detections:
-                return {"faces": 0, "embeddings": []}
-            
-            # Get embeddings for each face
-            embeddings = []
-            for face_info in face_detections:
-                bbox = face_info['bbox']
-                x, y, w, h = bbox
-                face_crop = image[y:y+h, x:x+w]
-                embedding = self.get_face_embedding(face_crop)
-                embeddings.append(embedding)
-            
-            # Save to database
-            self.save_face_detection(image_path, face_detections, embeddings)
-            
-            return {
-                "faces": len(face_detections),
-                "detector": self.detector_type,
-                "detections": [
-                    {
-                        "bbox": face_info['bbox'],
-                        "confidence": face_info.get('confidence', 0.0),
-                        "detector": face_info.get('detector', 'unknown'),
-                        "embedding": emb,  # Include actual embedding
-                        "embedding_size": len(emb) if emb else 0,
-                        "has_landmarks": face_info.get('landmarks') is not None
-                    }
-                    for face_info, emb in zip(face_detections, embeddings)
-                ]
-            }
+            self.cache_store(key, face_detections, embeddings)
+            return self.build_image_result(target, face_detections, embeddings, asset_id=asset_id)
             
         except Exception as e:
             return {"error": str(e)}
     
+    def process_images(self, image_paths, asset_ids=None, asset_paths=None):
+        """
+        Process several images: one batched detection pass, then the faces of
+        all images embedded in a single scheduler submission
+        ``asset_ids`` / ``asset_paths`` (one per image) attribute the faces as in process_image.
+        """
+        results = [None] * len(image_paths)
+        asset_ids = asset_ids or [None] * len(image_paths)
+        targets = [asset_path or image_path
+                   for image_path, asset_path in zip(image_paths, asset_paths or [None] * len(image_paths))]
+        try:
+            images = []
+            scales = []
+            loaded_idx = []
+            sources = list(image_paths)
+            keys = [None] * len(image_paths)
+            for i, image_path in enumerate(image_paths):
+                if self.cache is not None:
+                    try:
+                        sources[i] = self.read_source(image_path)
+                    except OSError as e:
+                        results[i] = {"error": str(e)}
+                        continue
+                    keys[i], cached = self.cache_lookup(sources[i])
+                    if cached is not None:
+                        results[i] = self.build_image_result(targets[i], *cached, cached=True,
+                                                             asset_id=asset_ids[i])
+                        continue
+                image, scale = self.load_image(sources[i])
+                if image is None:
+                    results[i] = {"error": "Could not load image"}
+                else:
+                    images.append(image)
+                    scales.append(scale)
+                    loaded_idx.append(i)
+            
+            detections = self.detect_faces_batch(images) if images else []
+            
+            face_rows = []
+            spans = []
+            for i, image, scale, face_detections in zip(loaded_idx, images, scales, detections):
+                rows = []
+                if face_detections:
+                    self.scale_face_detections(face_detections, scale)
+                    align_image, align_scale = self.load_alignment_image(sources[i], face_detections, (image, scale))
+                    rows = self.prepare_face_rows(align_image, face_detections, align_scale)
+                spans.append((len(face_rows), len(face_rows) + len(rows)))
+                face_rows.extend(rows)
+            embeddings = self.embed_face_rows(face_rows)
+            
+            for i, face_detections, (start, end) in zip(loaded_idx, detections, spans):
+                try:
+                    self.cache_store(keys[i], face_detections, embeddings[start:end])
+                    results[i] = self.build_image_result(targets[i], face_detections, embeddings[start:end],
+                                                         asset_id=asset_ids[i])
+                except Exception as e:
+                    results[i] = {"error": str(e)}
+            return results
+            
+        except Exception as e:
+            return [result or {"error": str(e)} for result in results]
+    
     def setup_routes(self):
         """Setup Flask routes"""
         
@@ -357,18 +792,152 @@ class UnifiedFaceService:
                 "service": "unified_scrfd_lvface",
                 "providers": self.session.get_providers() if hasattr(self, 'session') else [],
                 "face_detector": getattr(self, 'detector_type', 'unknown'),
-                "insightface_available": INSIGHTFACE_AVAILABLE
+                "detector_mode": self.detector_mode,
+                "insightface_available": INSIGHTFACE_AVAILABLE,
+                "batching": self.scheduler.stats(),
+                "db_writer": self.db_writer.stats(),
+                "stored_embeddings": self.embedding_store.count(),
+                "cache": self.cache.stats() if self.cache is not None else None,
+                "session_profile": self.session_profile['name'],
+                "face_index": self.face_index.stats() if self.face_index is not None else None,
+                "ann_index": self.ann_index.stats() if self.ann_index is not None else None
             })
         
         @self.app.route('/process_image', methods=['POST'])
         def process_image_endpoint():
-            data = request.json
-            image_path = data.get('image_path')
-            
-            if not image_path:
-                return jsonify({"error": "image_path required"}), 400
-                
-            result = self.process_image(image_path)
+            # JSON {"image_path": ...} for local files; multipart "image" or a raw
+            # body for uploads, with ?image_path= naming the asset to save under.
+            # An optional asset_id (or, for a mapped local path, asset_path) attributes the faces
+            source = request_image_source(request)
+            
+            if source is None:
+                return jsonify({"error": "image_path, multipart image or raw image body required"}), 400
+            
+            options = (request.get_json(silent=True) or {}) if request.is_json else request.args
+            try:
+                asset_id = int(options['asset_id']) if options.get('asset_id') is not None else None
+            except (TypeError, ValueError):
+                return jsonify({"error": "asset_id must be an integer"}), 400
+            if isinstance(source, str):
+                result = self.process_image(source, asset_id=asset_id, asset_path=options.get('asset_path'))
+            else:
+                result = self.process_image(request.args.get('image_path'), image_data=source, asset_id=asset_id)
+            return jsonify(result)
+        
+        @self.app.route('/process_images', methods=['POST'])
+        def process_images_endpoint():
+            data = request.get_json(silent=True) or {}
+            image_paths = data.get('image_paths')
+            
+            if not image_paths or not isinstance(image_paths, list):
+                return jsonify({"error": "image_paths list required"}), 400
+            # Optional per-image attribution, as for /process_image
+            asset_ids = data.get('asset_ids')
+            asset_paths = data.get('asset_paths')
+            for name, values in (('asset_ids', asset_ids), ('asset_paths', asset_paths)):
+                if values is not None and (not isinstance(values, list) or len(values) != len(image_paths)):
+                    return jsonify({"error": f"{name} must be a list matching image_paths"}), 400
+            if asset_ids is not None:
+                try:
+                    asset_ids = [int(asset_id) if asset_id is not None else None for asset_id in asset_ids]
+                except (TypeError, ValueError):
+                    return jsonify({"error": "asset_ids must be integers"}), 400
+            
+            results = self.process_images(image_paths, asset_ids, asset_paths)
+            return jsonify({"results": results})
+        
+        @self.app.route('/search', methods=['POST'])
+        def search_endpoint():
+            # JSON {"embedding": [...]} / {"embeddings": [[...], ...]}, or an image (path or
+            # upload, as for /process_image) whose detected faces are used as probes
+            data = request.get_json(silent=True) or {}
+            try:
+                k = int(data.get('k', request.args.get('k', 10)))
+                nprobe = data.get('nprobe', request.args.get('nprobe'))
+                nprobe = int(nprobe) if nprobe else None
+            except (TypeError, ValueError):
+                return jsonify({"error": "k and nprobe must be integers"}), 400
+            if not 0 < k <= MAX_SEARCH_K or (nprobe is not None and nprobe <= 0):
+                return jsonify({"error": f"k must be between 1 and {MAX_SEARCH_K}, nprobe positive"}), 400
+            faces = None
+            if 'embedding' in data or 'embeddings' in data:
+                probes = data['embeddings'] if 'embeddings' in data else [data['embedding']]
+            else:
+                source = request_image_source(request)
+                if source is None:
+                    return jsonify({"error": "embedding(s), image_path, multipart image or raw image body required"}), 400
+                extracted = self.extract_faces(source)
+                if extracted is None:
+                    return jsonify({"error": "Could not load image"}), 400
+                faces = [(face_info, emb) for face_info, emb in zip(*extracted) if emb is not None]
+                probes = [emb for _, emb in faces]
+            
+            if not probes:
+                return jsonify({"results": []})
+            try:
+                probes = np.asarray(probes, dtype=np.float32)
+            except (TypeError, ValueError):
+                probes = None
+            if probes is None or probes.ndim != 2 or probes.shape[1] != self.embedding_store.dim:
+                return jsonify({"error": f"embeddings must be lists of {self.embedding_store.dim} numbers"}), 400
+            start_time = time.perf_counter()
+            results = self.search_faces(probes, k, nprobe)
+            response = {
+                "results": [{"matches": matches} for matches in results],
+                "gallery_size": len(self.face_index) + (len(self.ann_index) if self.ann_index is not None else 0),
+                "search_ms": round((time.perf_counter() - start_time) * 1000, 2)
+            }
+            if faces is not None:
+                for result, (face_info, _) in zip(response["results"], faces):
+                    result["bbox"] = face_info["bbox"]
+                    result["confidence"] = face_info.get("confidence")
+            return jsonify(response)
+        
+        @self.app.route('/similarity_matrix', methods=['POST'])
+        def similarity_matrix_endpoint():
+            # JSON with "embeddings1" / "embeddings2" lists or "face_ids1" / "face_ids2" stored faces
+            # (side 2 defaults to side 1).
+            # Streams a float32 (or "dtype": "float16") .npy of the cosine matrix; "format": "json" for small ones
+            data = request.get_json(silent=True) or {}
+            try:
+                sides = []
+                for side in ('1', '2'):
+                    if f'face_ids{side}' in data:
+                        sides.append(self.stored_embeddings(data[f'face_ids{side}']))
+                    elif f'embeddings{side}' in data:
+                        sides.append(np.atleast_2d(np.asarray(data[f'embeddings{side}'], dtype=np.float32)))
+                    else:
+                        sides.append(None)
+            except KeyError as e:
+                return jsonify({"error": str(e.args[0])}), 404
+            except (TypeError, ValueError) as e:
+                return jsonify({"error": f"Invalid embeddings: {e}"}), 400
+            a, b = sides
+            if a is None:
+                return jsonify({"error": "embeddings1 or face_ids1 required"}), 400
+            b = a if b is None else b
+            if a.ndim != 2 or b.ndim != 2 or a.shape[1] != b.shape[1]:
+                return jsonify({"error": f"Embedding shapes {a.shape} and {b.shape} do not match"}), 400
+            
+            if data.get('format') == 'json':
+                return jsonify({"shape": [len(a), len(b)], "matrix": similarity_matrix(a, b).tolist()})
+            dtype = np.float16 if data.get('dtype') == 'float16' else np.float32
+            return Response(stream_similarity_matrix(a, b, dtype), mimetype=NPY_MIMETYPE,
+                            headers={"X-Matrix-Shape": f"{len(a)},{len(b)}"})
+        
+        @self.app.route('/cluster', methods=['POST'])
+        def cluster_endpoint():
+            # Assign cluster ids to faces that have none ({"recluster": true} rebuilds all of them)
+            data = request.get_json(silent=True) or {}
+            with self.cluster_lock:
+                self.db_writer.flush(timeout=10)
+                clusterer = self.get_clusterer()
+                if data.get('recluster'):
+                    # The loaded ANN index answers the k-NN queries; otherwise a temporary IVF one does
+                    result = clusterer.recluster(search=self.search_ids if self.ann_index is not None else None)
+                else:
+                    result = clusterer.update()
+                result["clusters"] = clusterer.stats()
             return jsonify(result)
         
         @self.app.route('/health', methods=['GET'])
@@ -376,14 +945,64 @@ class UnifiedFaceService:
             return jsonify({"status": "healthy"})
 
 def main():
+    parser = argparse.ArgumentParser(description='Unified SCRFD + LVFace service')
+    parser.add_argument('--port', type=int, default=8003, help='port to listen on')
+    parser.add_argument('--max-batch-size', type=int, default=32, help='max faces per batched LVFace run')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='max time a face waits for its batch to fill')
+    parser.add_argument('--detector-mode', choices=['scrfd', 'buffalo_l'], default='scrfd',
+                        help='scrfd: detection-only model; buffalo_l: full InsightFace FaceAnalysis')
+    parser.add_argument('--detect-batch-size', type=int, default=8, help='images per batched SCRFD forward')
+    parser.add_argument('--full-decode', action='store_true', help='always decode images at full resolution')
+    parser.add_argument('--db-commit-size', type=int, default=500, help='face rows per database commit')
+    parser.add_argument('--embedding-dtype', choices=['float16', 'float32'], default='float16',
+                        help='storage precision for new embedding stores')
+    parser.add_argument('--cache-size', type=int, default=4096, help='in-memory result cache entries (0 disables caching)')
+    parser.add_argument('--no-persistent-cache', action='store_true', help='keep the result cache in memory only')
+    parser.add_argument('--db-commit-interval', type=float, default=2.0, help='max seconds between database commits')
+    parser.add_argument('--session-profile', default=None,
+                        help='ONNX Runtime profile: default, latency, throughput, low-memory or one from --session-profiles')
+    parser.add_argument('--session-profiles', default=None, help='JSON file with extra/overridden session profiles')
+    parser.add_argument('--index-refresh', type=float, default=2.0,
+                        help='seconds between face index syncs with the database for /search')
+    parser.add_argument('--ann-index', default=None,
+                        help='IVF index directory from utils/build_ann_index.py for approximate /search')
+    parser.add_argument('--ann-nprobe', type=int, default=None, help='IVF cells scanned per probe')
+    parser.add_argument('--gallery-encoding', default='float32', choices=['float32', 'float16', 'int8', 'pq'],
+                        help='in-memory /search gallery encoding')
+    parser.add_argument('--rerank', type=int, default=100,
+                        help='candidates re-scored at full precision for lossy gallery encodings (0 = off)')
+    parser.add_argument('--cluster-threshold', type=float, default=0.5,
+                        help='cosine similarity linking two faces in /cluster')
+    args = parser.parse_args()
+    
     print("🚀 Starting Unified SCRFD + LVFace Service")
     
     # Initialize service
-    service = UnifiedFaceService()
+    service = UnifiedFaceService(
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        detector_mode=args.detector_mode,
+        detect_batch_size=args.detect_batch_size,
+        reduced_decode=not args.full_decode,
+        db_commit_size=args.db_commit_size,
+        db_commit_interval=args.db_commit_interval,
+        embedding_dtype=args.embedding_dtype,
+        cache_size=args.cache_size,
+        persistent_cache=not args.no_persistent_cache,
+        session_profile=args.session_profile,
+        session_profiles_file=args.session_profiles,
+        index_refresh=args.index_refresh,
+        ann_index=args.ann_index,
+        ann_nprobe=args.ann_nprobe,
+        gallery_encoding=args.gallery_encoding,
+        rerank=args.rerank,
+        cluster_threshold=args.cluster_threshold
+    )
+    print(f"📦 Micro-batching: up to {args.max_batch_size} faces, {args.max_wait_ms}ms max wait")
     
-    # Start Flask server
-    print("🌐 Starting server on port 8003...")
-    service.app.run(host='0.0.0.0', port=8003, debug=False)
+    # Start Flask server (threaded so concurrent requests share batches)
+    print(f"🌐 Starting server on port {args.port}...")
+    service.app.run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
 
 if __name__ == "__main__":
     main()
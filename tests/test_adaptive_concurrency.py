@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Test AdaptiveConcurrency growth and back-off"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from adaptive_concurrency import AdaptiveConcurrency
+
+
+def feed(controller, latency, windows=1):
+    for _ in range(controller.window * windows):
+        controller.record(latency)
+    return controller.limit
+
+
+def test_grows_while_latency_is_flat():
+    controller = AdaptiveConcurrency(min_limit=1, max_limit=8, initial=2, window=10)
+    assert feed(controller, 0.05, windows=3) == 5
+    assert feed(controller, 0.05, windows=10) == 8
+    print("✅ limit climbs to max_limit while latency stays at baseline")
+
+
+def test_backs_off_on_latency_or_queue_depth():
+    controller = AdaptiveConcurrency(min_limit=1, max_limit=16, initial=12, window=10, tolerance=2.0)
+    feed(controller, 0.05)
+    assert feed(controller, 0.5) == 9
+
+    controller.observe_queue_depth(500)
+    assert feed(controller, 0.05) < 9
+    controller.observe_queue_depth(0)
+    before = controller.limit
+    assert feed(controller, 0.05) == before + 1
+    print("✅ limit drops on latency spikes and a backed-up service queue")
+
+
+if __name__ == "__main__":
+    test_grows_while_latency_is_flat()
+    test_backs_off_on_latency_or_queue_depth()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Test incremental re-scan from recorded file fingerprints"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from asset_fingerprint import RECORD_FINGERPRINT_SQL, fingerprint_params, rescan
+from face_work_queue import FINISH_SQL, FaceWorkQueue, finish_params
+
+
+def make_library(tmpdir, num_assets=6):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER)")
+    for i in range(1, num_assets + 1):
+        path = os.path.join(tmpdir, f"{i}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + bytes([i]) * 100)
+        conn.execute("INSERT INTO assets VALUES (?, ?, 'image/jpeg')", (i, path))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_rescan_requeues_only_changed_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_library(tmpdir)
+        queue = FaceWorkQueue(db_path)
+        conn = sqlite3.connect(db_path)
+        for asset_id, path in queue.claim("test", limit=10):
+            conn.execute(FINISH_SQL, finish_params(asset_id, face_count=1))
+            conn.execute("INSERT INTO face_detections (asset_id) VALUES (?)", (asset_id,))
+            if asset_id != 6:  # asset 6 was processed before fingerprints existed
+                conn.execute(RECORD_FINGERPRINT_SQL, fingerprint_params(asset_id, path))
+        conn.commit()
+
+        first = rescan(db_path)
+        assert (first["unchanged"], first["adopted"]) == (5, 1)
+
+        def bump_mtime(path):
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        bump_mtime(os.path.join(tmpdir, "2.jpg"))             # same bytes, new mtime
+        with open(os.path.join(tmpdir, "3.jpg"), "r+b") as f:  # edited in place
+            f.seek(10)
+            f.write(b"edit")
+        bump_mtime(os.path.join(tmpdir, "3.jpg"))
+        os.remove(os.path.join(tmpdir, "4.jpg"))               # drive offline / deleted
+
+        stats = rescan(db_path)
+        assert stats == {"scanned": 6, "unchanged": 3, "touched": 1, "changed": 1, "adopted": 0, "missing": 1}
+        statuses = dict(conn.execute("SELECT asset_id, status FROM face_work_queue"))
+        assert statuses == {1: "done", 2: "done", 3: "pending", 4: "done", 5: "done", 6: "done"}
+        assert conn.execute("SELECT COUNT(*) FROM face_detections WHERE asset_id = 3").fetchone()[0] == 0
+
+        assert rescan(db_path)["unchanged"] == 4  # the touched file's new mtime was recorded
+        conn.close()
+        print("✅ only the edited file is requeued; touched, missing and adopted files keep their faces")
+
+
+if __name__ == "__main__":
+    test_rescan_requeues_only_changed_files()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Test AsyncFaceProcessingOrchestrator against a local stand-in service"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from async_face_orchestrator import AsyncFaceProcessingOrchestrator
+from face_work_queue import MAX_ATTEMPTS, FaceWorkQueue
+
+
+def start_fake_service(unavailable=()):
+    """unavailable: asset id -> number of 503s to answer before serving it"""
+    app = Flask("fake_face_service")
+    seen = []
+    unavailable = dict(unavailable)
+
+    @app.route('/process_image', methods=['POST'])
+    def process_image():
+        asset_id = request.json.get("asset_id") if request.is_json else None
+        if unavailable.get(asset_id):
+            unavailable[asset_id] -= 1
+            return jsonify({"error": "busy"}), 503
+        seen.append((request.content_type, asset_id))
+        if request.is_json:
+            return jsonify({"faces": 0 if request.json["image_path"].endswith("3.jpg") else 2})
+        return jsonify({"faces": 1 if request.get_data() else 0})
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen
+
+
+def make_db(tmpdir, num_assets=40):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER)")
+    for i in range(1, num_assets + 1):
+        path = os.path.join(tmpdir, f"{i}.jpg")
+        if i % 10:
+            with open(path, "wb") as f:
+                f.write(b"\xff\xd8\xff")
+        conn.execute("INSERT INTO assets VALUES (?, ?, 'image/jpeg')", (i, path))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_statuses_stream_into_work_queue():
+    server, seen = start_fake_service()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = make_db(tmpdir)
+            orchestrator = AsyncFaceProcessingOrchestrator(
+                db_path=db_path, service_url=f"http://127.0.0.1:{server.server_port}", max_in_flight=8
+            )
+            processed, errors = orchestrator.start_processing(batch_size=7)
+            assert (processed, errors) == (36, 4)
+
+            conn = sqlite3.connect(db_path)
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM face_work_queue GROUP BY status"))
+            conn.close()
+            assert counts == {"done": 32, "no_faces": 4, "failed": 4}
+            assert all(content_type == "application/json" for content_type, _ in seen)
+            # Path mode sends a mapped path, so the asset id travels with it
+            assert sorted(asset_id for _, asset_id in seen) == [i for i in range(1, 41) if i % 10]
+            print("✅ 40 assets: 32 done, 4 without faces, 4 missing files")
+    finally:
+        server.shutdown()
+
+
+def test_transient_errors_are_retried_then_capped():
+    # Asset 1 recovers after one 503, asset 2 never does
+    server, seen = start_fake_service(unavailable={1: 1, 2: 100})
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = make_db(tmpdir, num_assets=5)
+            orchestrator = AsyncFaceProcessingOrchestrator(
+                db_path=db_path, service_url=f"http://127.0.0.1:{server.server_port}", max_in_flight=4
+            )
+            processed, errors = orchestrator.start_processing(batch_size=2)
+            assert (processed, errors) == (4, 1)
+
+            conn = sqlite3.connect(db_path)
+            rows = dict((asset_id, (status, attempts)) for asset_id, status, attempts in conn.execute(
+                "SELECT asset_id, status, attempts FROM face_work_queue"))
+            conn.close()
+            assert rows[1] == ("done", 2)
+            assert rows[2] == ("failed", MAX_ATTEMPTS)
+            assert orchestrator.requeued_count == 1 + MAX_ATTEMPTS - 1
+
+            # --retry-failed puts the capped asset back with a fresh attempt budget
+            assert FaceWorkQueue(db_path).retry_failed() == 1
+            print("✅ 503 once: retried to done; 503 always: failed after", MAX_ATTEMPTS, "attempts")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_statuses_stream_into_work_queue()
+    test_transient_errors_are_retried_then_capped()
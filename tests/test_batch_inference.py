@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Test batched LVFaceONNXInferencer.infer_batch / infer_paths against single-image inference"""
+
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inference_onnx import LVFaceONNXInferencer
+
+
+def build_tiny_model(path, feat_dim=512):
+    """Build a small ONNX graph with the LVFace input/output layout and a dynamic batch axis"""
+    rng = np.random.RandomState(0)
+    weight = numpy_helper.from_array(rng.randn(3 * 8 * 8, feat_dim).astype(np.float32), name="W")
+    nodes = [
+        helper.make_node("AveragePool", ["data"], ["pooled"], kernel_shape=[14, 14], strides=[14, 14]),
+        helper.make_node("Flatten", ["pooled"], ["flat"], axis=1),
+        helper.make_node("MatMul", ["flat", "W"], ["feat"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_lvface",
+        [helper.make_tensor_value_info("data", TensorProto.FLOAT, ["batch_size", 3, 112, 112])],
+        [helper.make_tensor_value_info("feat", TensorProto.FLOAT, ["batch_size", feat_dim])],
+        initializer=[weight],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+    return path
+
+
+def test_infer_batch_matches_single():
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = build_tiny_model(os.path.join(tmp, "tiny.onnx"))
+        inferencer = LVFaceONNXInferencer(model_path, use_gpu=False, batch_size=4)
+
+        imgs = [np.random.randint(0, 255, (100 + i, 90 + i, 3), dtype=np.uint8) for i in range(10)]
+        batched = inferencer.infer_batch(imgs)
+        assert batched.shape == (10, 512)
+        assert batched.dtype == np.float32
+
+        for img, feat in zip(imgs, batched):
+            single = inferencer.ort_session.run(
+                [inferencer.output_name],
+                {inferencer.input_name: inferencer._preprocess_image(img)}
+            )[0][0]
+            np.testing.assert_allclose(feat, single, rtol=1e-4, atol=1e-4)
+
+        assert inferencer.infer_batch([]).shape == (0, 512)
+        print("✅ infer_batch matches single-image inference")
+
+
+def test_infer_paths():
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = build_tiny_model(os.path.join(tmp, "tiny.onnx"))
+        inferencer = LVFaceONNXInferencer(model_path, use_gpu=False)
+
+        paths = []
+        for i in range(5):
+            path = os.path.join(tmp, f"face_{i}.png")
+            cv2.imwrite(path, np.random.randint(0, 255, (112, 112, 3), dtype=np.uint8))
+            paths.append(path)
+
+        feats = inferencer.infer_paths(paths, batch_size=2)
+        assert feats.shape == (5, 512)
+        np.testing.assert_allclose(feats[3], inferencer.infer_batch([cv2.imread(paths[3])])[0], rtol=1e-5)
+
+        try:
+            inferencer.infer_paths([os.path.join(tmp, "missing.jpg")])
+            raise AssertionError("missing file should raise")
+        except ValueError:
+            pass
+        print("✅ infer_paths returns features in input order")
+
+
+if __name__ == "__main__":
+    test_infer_batch_matches_single()
+    test_infer_paths()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Test MicroBatchScheduler coalescing and result scatter"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from batch_scheduler import MicroBatchScheduler
+
+
+def test_concurrent_requests_share_batches():
+    seen_sizes = []
+
+    def run_batch(batch):
+        seen_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1).sum(axis=1)
+
+    scheduler = MicroBatchScheduler(run_batch, max_batch_size=8, max_wait_ms=50)
+    results = {}
+
+    def caller(i):
+        results[i] = scheduler.run_many([np.full((3, 2, 2), i, dtype=np.float32)] * 2)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    scheduler.close()
+
+    for i in range(8):
+        assert results[i] == [12.0 * i, 12.0 * i]
+    assert max(seen_sizes) <= 8
+    assert len(seen_sizes) < 16
+    stats = scheduler.stats()
+    assert stats["items"] == 16
+    print(f"✅ 16 faces served in {stats['batches']} batches (mean {stats['mean_batch_size']:.1f})")
+
+
+def test_errors_propagate_to_callers():
+    def run_batch(batch):
+        raise RuntimeError("session failed")
+
+    scheduler = MicroBatchScheduler(run_batch, max_batch_size=4, max_wait_ms=1)
+    try:
+        scheduler.run_many([np.zeros(3)])
+        raise AssertionError("error should reach caller")
+    except RuntimeError as e:
+        assert "session failed" in str(e)
+    scheduler.close()
+    print("✅ batch errors reach every caller")
+
+
+def test_close_flushes_queued_and_rejects_new():
+    release = threading.Event()
+
+    def run_batch(batch):
+        release.wait(5)
+        return batch * 2
+
+    scheduler = MicroBatchScheduler(run_batch, max_batch_size=1, max_wait_ms=0)
+    futures = [scheduler.submit(np.full(2, i, dtype=np.float32)) for i in range(3)]
+    closer = threading.Thread(target=scheduler.close)
+    closer.start()
+    release.set()
+    closer.join()
+    assert [future.result(timeout=1)[0] for future in futures] == [0.0, 2.0, 4.0]
+    try:
+        scheduler.submit(np.zeros(2))
+        raise AssertionError("submit after close should raise")
+    except RuntimeError as e:
+        assert "closed" in str(e)
+    scheduler.close()  # idempotent
+    print("✅ close flushes queued items and rejects new ones")
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_batches()
+    test_errors_propagate_to_callers()
+    test_close_flushes_queued_and_rejects_new()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Test FaceResultCache keys, LRU eviction and the persistent tier"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_cache import FaceResultCache, cache_key, content_hash
+from face_preprocess import PREPROCESS_VERSION
+
+
+def test_key_depends_on_content_and_model():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "a.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + os.urandom(3 << 20))
+        with open(path, "rb") as f:
+            data = f.read()
+        assert content_hash(path) == content_hash(data)
+        assert content_hash(data) != content_hash(data + b"\x00")
+
+        key = cache_key(content_hash(data), "lvface|scrfd")
+        assert key.endswith(f":p{PREPROCESS_VERSION}")
+        assert key != cache_key(content_hash(data), "lvface|buffalo_l")
+        print("✅ file and buffer hash alike; model id and preprocess version are in the key")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = FaceResultCache("m", capacity=2)
+    cache.put("a", [{"bbox": [0, 0, 1, 1]}], np.ones((1, 4)))
+    cache.put("b", [], None)
+    assert cache.get("a") is not None  # "b" is now the oldest
+    cache.put("c", [], None)
+    assert cache.get("b") is None
+    assert cache.get("c") == ([], None)
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["memory_entries"]) == (2, 1, 2)
+    print("✅ LRU keeps the 2 most recently used entries")
+
+
+def test_persistent_tier_survives_restart():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "metadata.sqlite")
+        embeddings = np.random.rand(3, 512).astype(np.float32)
+        faces = [{"bbox": [i, i, 10, 10], "confidence": 0.9} for i in range(3)]
+        FaceResultCache("m", db_path=db_path).put("k", faces, embeddings)
+
+        restarted = FaceResultCache("m", db_path=db_path)
+        cached_faces, cached_embeddings = restarted.get("k")
+        assert cached_faces == faces
+        assert np.array_equal(cached_embeddings, embeddings)
+        restarted.get("k")
+        stats = restarted.stats()
+        assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+        print("✅ results read back from sqlite after a restart, then served from memory")
+
+
+if __name__ == "__main__":
+    test_key_depends_on_content_and_model()
+    test_lru_evicts_least_recently_used()
+    test_persistent_tier_survives_restart()
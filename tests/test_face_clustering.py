@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test incremental k-NN graph face clustering"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_clustering import FaceClusterer, connected_components
+
+
+def test_connected_components():
+    labels = connected_components(7, [0, 4, 2, 5], [3, 3, 1, 5])
+    assert labels.tolist() == [0, 1, 1, 0, 0, 5, 6]
+    assert connected_components(3, [], []).tolist() == [0, 1, 2]
+    print("✅ components labelled by their smallest node")
+
+
+def add_faces(conn, store, vectors):
+    for shard, row in store.append(vectors):
+        conn.execute("INSERT INTO face_detections (asset_id, embedding_shard, embedding_row) VALUES (1, ?, ?)",
+                     (shard, row))
+    conn.commit()
+
+
+def test_incremental_clusters_persist():
+    rng = np.random.RandomState(0)
+    centers = rng.randn(6, 64).astype(np.float32)
+
+    def faces(identity, count):
+        return centers[identity] + 0.4 * rng.randn(count, 64).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "metadata.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER,
+                        embedding_shard INTEGER, embedding_row INTEGER)""")
+        store = EmbeddingStore(os.path.join(tmpdir, "store"), dim=64, dtype="float32")
+        add_faces(conn, store, np.concatenate([faces(0, 8), faces(1, 8), faces(2, 8)]))
+
+        clusterer = FaceClusterer(db_path, store, threshold=0.5, k=5)
+        stats = clusterer.update(batch_size=10)  # batches cut across identities
+        assert stats["faces"] == 24 and stats["new_clusters"] >= 3
+
+        def clusters():
+            return dict(conn.execute("SELECT face_id, cluster_id FROM face_clusters"))
+
+        first = clusters()
+        groups = [{first[i] for i in range(start, start + 8)} for start in (1, 9, 17)]
+        assert all(len(group) == 1 for group in groups), groups
+        assert len(set.union(*groups)) == 3
+
+        add_faces(conn, store, np.concatenate([faces(1, 3), faces(5, 4)]))
+        stats = clusterer.update()
+        assert stats == dict(stats, faces=7, joined=3, new_clusters=1, merged=0)
+        second = clusters()
+        assert {second[i] for i in (25, 26, 27)} == groups[1].copy()
+        assert {second[i] for i in range(1, 25)} == set(first.values())  # ids untouched
+
+        conn.execute("DELETE FROM face_detections WHERE id <= 8")
+        conn.commit()
+        assert clusterer.update()["pruned"] == 8
+        result = clusterer.recluster(nprobe=4, nlist=4)
+        assert result["faces"] == 23 and result["clusters"] == 3 and result["kept_ids"] == 3
+        assert clusters() == {face_id: cluster_id for face_id, cluster_id in second.items() if face_id > 8}
+        assert clusterer.stats()["largest"] == 11
+        conn.close()
+        print("✅ new faces join, start or keep their clusters; recluster keeps ids")
+
+
+if __name__ == "__main__":
+    test_connected_components()
+    test_incremental_clusters_persist()
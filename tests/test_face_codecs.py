@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Test compressed gallery encodings and re-ranking"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_codecs import make_codec
+from face_index import FaceIndex, l2_normalize
+
+
+def test_codecs_approximate_the_vectors():
+    rng = np.random.RandomState(0)
+    vectors = l2_normalize(rng.randn(2000, 64))
+    probes = l2_normalize(rng.randn(3, 64))
+    expected = probes @ vectors.T
+    for name, tolerance, size in (("float16", 1e-3, 128), ("int8", 2e-2, 68), ("pq", 0.3, 8)):
+        codec = make_codec(name, 64, **({"subspaces": 8} if name == "pq" else {}))
+        codec.train(vectors)
+        codes, scales = codec.encode(vectors)
+        assert codec.bytes_per_face == size
+        scores = codec.scores(probes, codes, scales)
+        np.testing.assert_allclose(scores, probes @ codec.decode(codes, scales).T, rtol=1e-4, atol=1e-4)
+        assert np.abs(scores - expected).max() < tolerance, name
+    try:
+        make_codec("pq", 100)
+        assert False, "PQ accepted a dim not divisible into sub-spaces"
+    except ValueError:
+        pass
+    print("✅ float16 / int8 / pq scores track float32 (PQ via distance tables)")
+
+
+def test_pq_gallery_reranks_from_store():
+    rng = np.random.RandomState(1)
+    vectors = rng.randn(3000, 64).astype(np.float32)
+    probes = vectors[:20] + 0.3 * rng.randn(20, 64).astype(np.float32)
+    ids = np.arange(1, len(vectors) + 1)
+    exact = FaceIndex(dim=64)
+    exact.add(ids, vectors)
+    expected, expected_scores = exact.search(probes, 5)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EmbeddingStore(tmpdir, dim=64, dtype="float32")
+        index = FaceIndex(dim=64, encoding=make_codec("pq", 64, subspaces=8, min_train_size=2000),
+                          rerank=200, store=store)
+        index.add(ids, vectors, store.append(vectors))
+        found, scores = index.search(probes, 5)
+        assert found.tolist() == expected.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-5)
+
+        index.remove([1])
+        assert index.search(probes[0], 5)[0][0, 0] != 1 and index.stats()["encoding"] == "pq"
+    print("✅ PQ gallery re-ranked from the store returns the exact top-k")
+
+
+def test_pq_waits_for_enough_faces_and_retrains():
+    rng = np.random.RandomState(2)
+    vectors = l2_normalize(rng.randn(1200, 64))
+    codec = make_codec("pq", 64, subspaces=8, min_train_size=300, retrain_growth=2.0)
+    try:
+        codec.train(vectors[:100])
+        assert False, "PQ trained 256 centroids on 100 vectors"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EmbeddingStore(tmpdir, dim=64, dtype="float32")
+        refs = store.append(vectors)
+        index = FaceIndex(dim=64, encoding=codec, store=store)
+        index.add(np.arange(1, 101), vectors[:100], refs[:100])
+        assert index.stats()["encoding"] == "float16" and not codec.trained
+        index.add(np.arange(101, 401), vectors[100:400], refs[100:400])
+        assert index.stats()["encoding"] == "pq" and index._trained_size == 400
+        first = index.codec.centroids
+        index.add(np.arange(401, 701), vectors[400:700], refs[400:700])
+        assert index._trained_size == 400
+        index.add(np.arange(701, 1201), vectors[700:], refs[700:])
+        assert index._trained_size == 1200 and index.codec.centroids is not first
+
+        # Every face was re-encoded from its full-precision row with the current centroids
+        codes, _ = index.codec.encode(vectors)
+        np.testing.assert_array_equal(index._matrix[:len(index)], codes)
+    print("✅ PQ stays float16 below min_train_size, then retrains as the gallery doubles")
+
+
+def test_pq_training_does_not_hold_the_search_lock():
+    rng = np.random.RandomState(3)
+    vectors = l2_normalize(rng.randn(700, 64))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EmbeddingStore(tmpdir, dim=64, dtype="float32")
+        refs = store.append(vectors)
+        codec = make_codec("pq", 64, subspaces=8, min_train_size=300, retrain_growth=2.0)
+        index = FaceIndex(dim=64, encoding=codec, store=store)
+        index.add(np.arange(1, 301), vectors[:300], refs[:300])
+        assert index.stats()["encoding"] == "pq"
+
+        # Between the snapshot and the codec swap: search, add new faces and remove one
+        seen = {}
+        train_snapshot = index._train
+
+        def train(snapshot_ids, snapshot_refs):
+            result = {}
+            thread = threading.Thread(target=lambda: result.update(
+                hits=index.search(vectors[5], k=1)[0][0, 0],
+                added=index.add(np.arange(601, 701), vectors[600:], refs[600:]),
+                removed=index.remove([7])))
+            thread.start()
+            thread.join(timeout=5)
+            seen.update(result, blocked=thread.is_alive())
+            return train_snapshot(snapshot_ids, snapshot_refs)
+
+        index._train = train
+        index.add(np.arange(301, 601), vectors[300:600], refs[300:600])
+        assert seen == {"hits": 6, "added": None, "removed": 1, "blocked": False}, seen
+        assert index._trained_size == 600 and len(index) == 699
+
+        # Faces added and removed during training are consistent with the swapped-in codec
+        live = np.setdiff1d(np.arange(1, 701), [7])
+        codes, _ = index.codec.encode(vectors[live - 1])
+        order = np.argsort(index.ids)
+        np.testing.assert_array_equal(index._matrix[:len(index)][order], codes)
+    print("✅ PQ retrain runs outside the lock; concurrent adds/removes survive the swap")
+
+
+if __name__ == "__main__":
+    test_codecs_approximate_the_vectors()
+    test_pq_gallery_reranks_from_store()
+    test_pq_waits_for_enough_faces_and_retrains()
+    test_pq_training_does_not_hold_the_search_lock()
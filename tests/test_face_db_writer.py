@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Test FaceDBWriter grouped commits from concurrent threads"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_db_writer import FaceDBWriter, StatementGroup
+
+INSERT_SQL = "INSERT INTO face_detections (asset_id, bbox_x, bbox_y, bbox_w, bbox_h) VALUES (?, ?, ?, ?, ?)"
+
+
+def make_db(tmpdir):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE face_detections (
+            id INTEGER PRIMARY KEY, asset_id INTEGER NOT NULL,
+            bbox_x INTEGER, bbox_y INTEGER, bbox_w INTEGER, bbox_h INTEGER
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM face_detections").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_concurrent_inserts_grouped_into_few_commits():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        writer = FaceDBWriter(db_path, commit_size=100, commit_interval=60)
+
+        def worker(asset_base):
+            for i in range(50):
+                writer.insert(INSERT_SQL, (asset_base + i, 0, 0, 112, 112))
+
+        threads = [threading.Thread(target=worker, args=(n * 1000,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.flush()
+
+        assert count_rows(db_path) == 400
+        stats = writer.stats()
+        assert stats["rows_written"] == 400
+        assert stats["commits"] <= 5
+        writer.close()
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+        print(f"✅ 400 rows from 8 threads in {stats['commits']} commits")
+
+
+def test_bad_rows_are_isolated():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        writer = FaceDBWriter(db_path, commit_size=1000, commit_interval=60)
+        writer.insert_many(INSERT_SQL, [(1, 0, 0, 1, 1), (None, 0, 0, 1, 1), (2, 0, 0, 1, 1)])
+        writer.close()
+
+        assert count_rows(db_path) == 2
+        stats = writer.stats()
+        assert stats["rows_written"] == 2
+        assert stats["rows_failed"] == 1
+        print("✅ a failing row does not drop the rest of the batch")
+
+
+def test_interval_commit_without_flush():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        writer = FaceDBWriter(db_path, commit_size=1000, commit_interval=0.05)
+        writer.insert(INSERT_SQL, (1, 0, 0, 1, 1))
+        deadline = threading.Event()
+        for _ in range(100):
+            if count_rows(db_path) == 1:
+                break
+            deadline.wait(0.02)
+        assert count_rows(db_path) == 1
+        writer.close()
+        print("✅ pending rows commit after commit_interval")
+
+
+def test_group_is_written_atomically():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        writer = FaceDBWriter(db_path, commit_size=1000, commit_interval=60)
+        good = StatementGroup()
+        good.insert(INSERT_SQL, (1, 0, 0, 1, 1))
+        good.insert_many(INSERT_SQL, [(1, 0, 0, 2, 2), (1, 0, 0, 3, 3)])
+        bad = StatementGroup()
+        bad.insert(INSERT_SQL, (2, 0, 0, 1, 1))
+        bad.insert(INSERT_SQL, (None, 0, 0, 1, 1))
+        writer.insert_group(good.statements)
+        writer.insert_group(bad.statements)
+        writer.insert(INSERT_SQL, (3, 0, 0, 1, 1))
+        writer.close()
+
+        conn = sqlite3.connect(db_path)
+        assets = [row[0] for row in conn.execute("SELECT asset_id FROM face_detections ORDER BY id")]
+        conn.close()
+        assert assets == [1, 1, 1, 3]
+        stats = writer.stats()
+        assert stats["rows_written"] == 4
+        assert stats["rows_failed"] == 2
+        print("✅ a failing row rolls back its whole group and nothing else")
+
+
+if __name__ == "__main__":
+    test_concurrent_inserts_grouped_into_few_commits()
+    test_bad_rows_are_isolated()
+    test_interval_commit_without_flush()
+    test_group_is_written_atomically()
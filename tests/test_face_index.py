@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test the 1:N face search index"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_index import FaceIndex, l2_normalize
+
+
+def test_search_matches_brute_force():
+    rng = np.random.RandomState(0)
+    gallery = rng.randn(500, 64).astype(np.float32)
+    probes = rng.randn(7, 64).astype(np.float32)
+    index = FaceIndex(dim=64, capacity=16)  # grows while adding
+    index.add(np.arange(1000, 1500), gallery)
+
+    ids, scores = index.search(probes, k=5)
+    expected = l2_normalize(probes) @ l2_normalize(gallery).T
+    for row in range(len(probes)):
+        best = np.argsort(-expected[row])[:5]
+        assert ids[row].tolist() == (best + 1000).tolist()
+        np.testing.assert_allclose(scores[row], expected[row, best], rtol=1e-5, atol=1e-6)
+
+    ids, _ = index.search(gallery[42], k=1000)  # k capped at the gallery size
+    assert ids.shape == (1, 500) and ids[0, 0] == 1042
+    print("✅ top-k equals brute-force cosine ranking")
+
+
+def test_remove_and_replace_keep_gallery_contiguous():
+    rng = np.random.RandomState(1)
+    vectors = rng.randn(5, 8).astype(np.float32)
+    index = FaceIndex(dim=8)
+    index.add([1, 2, 3, 4, 5], vectors)
+
+    assert index.remove([2, 9]) == 1
+    assert len(index) == 4 and sorted(index.ids.tolist()) == [1, 3, 4, 5]
+    assert index.search(vectors[4], k=1)[0][0, 0] == 5  # moved into the freed slot
+
+    index.add([3], vectors[0])  # replace in place
+    assert len(index) == 4
+    assert set(index.search(vectors[0], k=2)[0][0].tolist()) == {1, 3}
+    print("✅ removal swaps the last row in; re-adding an id replaces it")
+
+
+def test_sync_follows_database():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "metadata.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER,
+                        embedding_shard INTEGER, embedding_row INTEGER)""")
+        store = EmbeddingStore(os.path.join(tmpdir, "store"), dim=16)
+        vectors = np.random.RandomState(2).randn(6, 16).astype(np.float32)
+
+        def insert(rows):
+            for (shard, row), asset_id in zip(store.append(vectors[rows]), rows):
+                conn.execute("INSERT INTO face_detections (asset_id, embedding_shard, embedding_row) "
+                             "VALUES (?, ?, ?)", (asset_id, shard, row))
+            conn.commit()
+
+        insert([0, 1, 2, 3])
+        conn.execute("INSERT INTO face_detections (asset_id) VALUES (99)")  # no embedding
+        conn.commit()
+        index = FaceIndex(dim=16)
+        assert index.sync(db_path, store) == (4, 0)
+
+        conn.execute("DELETE FROM face_detections WHERE asset_id IN (1, 2)")  # re-scan dropped them
+        conn.commit()
+        insert([4, 5])
+        assert index.sync(db_path, store) == (2, 2)
+        assert index.sync(db_path, store) == (0, 0)
+        assert sorted(index.ids.tolist()) == [1, 4, 6, 7]
+        assert index.search(vectors[5], k=1)[0][0, 0] == 7
+        conn.close()
+        print("✅ sync adds new faces and drops deleted ones")
+
+
+if __name__ == "__main__":
+    test_search_matches_brute_force()
+    test_remove_and_replace_keep_gallery_contiguous()
+    test_sync_follows_database()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Test shared preprocess_batch against the legacy per-path preprocessing math"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_preprocess import preprocess_batch
+
+
+def test_matches_legacy_paths():
+    imgs = [np.random.randint(0, 255, (90 + 7 * i, 130, 3), dtype=np.uint8) for i in range(6)]
+    batch = preprocess_batch(imgs)
+    assert batch.shape == (6, 3, 112, 112) and batch.dtype == np.float32
+
+    for img, tensor in zip(imgs, batch):
+        rgb = cv2.cvtColor(cv2.resize(img, (112, 112)), cv2.COLOR_BGR2RGB)
+        legacy = ((np.transpose(rgb, (2, 0, 1)) / 255.0) - 0.5) / 0.5
+        np.testing.assert_allclose(tensor, legacy, atol=1e-5)
+
+    blob = cv2.dnn.blobFromImages(imgs, 1.0 / 127.5, (112, 112), (127.5, 127.5, 127.5), swapRB=True)
+    np.testing.assert_allclose(batch, blob, atol=1e-5)
+    print("✅ preprocess_batch matches inferencer and blobFromImages math")
+
+
+def test_buffers_and_dtypes():
+    imgs = [np.random.randint(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(3)]
+    out = np.zeros((8, 3, 112, 112), dtype=np.float32)
+    result = preprocess_batch(imgs, out=out)
+    assert result.shape[0] == 3 and np.shares_memory(result, out)
+
+    half = preprocess_batch(imgs, dtype=np.float16)
+    assert half.dtype == np.float16
+    np.testing.assert_allclose(half, result, atol=2e-3)
+
+    gray = preprocess_batch([np.full((40, 40), 255, dtype=np.uint8)])
+    np.testing.assert_allclose(gray, 1.0)
+    print("✅ preallocated buffers, float16 and grayscale inputs supported")
+
+
+if __name__ == "__main__":
+    test_matches_legacy_paths()
+    test_buffers_and_dtypes()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Test FaceWorkQueue seeding, atomic claims and terminal statuses"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_work_queue import FINISH_SQL, FaceWorkQueue, finish_params
+
+
+def make_db(tmpdir, num_assets=200):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER)")
+    conn.executemany("INSERT INTO assets (id, path, mime) VALUES (?, ?, ?)", [
+        (i, f"E:\\photos\\{i}.jpg", "video/mp4" if i % 10 == 0 else "image/jpeg")
+        for i in range(1, num_assets + 1)
+    ])
+    conn.executemany("INSERT INTO face_detections (asset_id) VALUES (?)", [(1,), (2,)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_seed_and_concurrent_claims():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        queue = FaceWorkQueue(db_path)
+        assert queue.counts() == {"done": 2, "pending": 178}
+
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(n):
+            worker_queue = FaceWorkQueue(db_path, seed=False)
+            for rows in worker_queue.iter_claims(f"worker-{n}", batch_size=7):
+                with lock:
+                    claimed.extend(asset_id for asset_id, _ in rows)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(claimed) == 178
+        assert len(set(claimed)) == 178
+        assert queue.counts() == {"done": 2, "claimed": 178}
+        print("✅ 6 workers claimed 178 assets with no duplicates")
+
+
+def test_failed_and_no_face_assets_are_not_reclaimed():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir, num_assets=5)
+        queue = FaceWorkQueue(db_path)
+        rows = queue.claim("w", limit=10)
+        assert [asset_id for asset_id, _ in rows] == [3, 4, 5]
+
+        conn = sqlite3.connect(db_path)
+        conn.executemany(FINISH_SQL, [
+            finish_params(3, face_count=2),
+            finish_params(4, face_count=0),
+            finish_params(5, error="Could not load image"),
+        ])
+        conn.commit()
+        conn.close()
+
+        assert queue.counts() == {"done": 3, "no_faces": 1, "failed": 1}
+        assert FaceWorkQueue(db_path).claim("w2", limit=10) == []
+        assert queue.retry_failed() == 1
+        assert queue.claim("w2", limit=10) == [(5, "E:\\photos\\5.jpg")]
+        print("✅ terminal statuses stop rescans; retry_failed re-queues")
+
+
+def test_release_stale_claims():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir, num_assets=4)
+        queue = FaceWorkQueue(db_path)
+        assert len(queue.claim("crashed", limit=10)) == 2
+        assert queue.release_stale(older_than=-1) == 2
+        assert len(queue.claim("w", limit=10)) == 2
+        print("✅ stale claims return to pending")
+
+
+if __name__ == "__main__":
+    test_seed_and_concurrent_claims()
+    test_failed_and_no_face_assets_are_not_reclaimed()
+    test_release_stale_claims()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test the staged decode -> infer -> write FacePipeline on tiny ONNX models"""
+
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from face_cache import content_hash
+from gpu_pipeline import FacePipeline
+from inference_onnx import LVFaceONNXInferencer
+from scrfd_detector import SCRFDDetector
+from test_batch_inference import build_tiny_model
+from test_scrfd_detector import blue_block_image, build_tiny_scrfd
+
+
+def test_whole_image_pipeline_groups_commits():
+    with tempfile.TemporaryDirectory() as tmp:
+        inferencer = LVFaceONNXInferencer(build_tiny_model(os.path.join(tmp, "m.onnx")), use_gpu=False)
+        items = []
+        for i in range(23):
+            path = os.path.join(tmp, f"{i}.jpg")
+            cv2.imwrite(path, np.random.randint(0, 255, (120, 160, 3), dtype=np.uint8))
+            items.append((i + 1, path))
+        items.append((99, os.path.join(tmp, "missing.jpg")))
+
+        commits = []
+        pipeline = FacePipeline(inferencer, commits.append, num_decoders=3, batch_size=4,
+                                queue_size=4, commit_size=10, commit_interval=5.0)
+        summary = pipeline.run(iter(items), report_interval=0)
+
+        records = [r for batch in commits for r in batch]
+        assert summary["saved"] == 23 and summary["errors"] == 1
+        assert sorted(r["asset_id"] for r in records) == [r[0] for r in items]
+        assert max(len(batch) for batch in commits) <= 10 and len(commits) >= 3
+
+        ok = {r["asset_id"]: r for r in records if r["error"] is None}
+        expected = inferencer.infer_batch([cv2.imread(items[5][1])])[0]
+        np.testing.assert_allclose(ok[6]["faces"][0]["embedding"], expected, rtol=1e-4, atol=1e-4)
+        assert set(summary["utilization"]) == {"decode", "infer", "write"}
+        # Fingerprint inputs come from the single read done by the decoder
+        st = os.stat(items[5][1])
+        assert ok[6]["digest"] == content_hash(items[5][1])
+        assert ok[6]["stat"] == (st.st_size, st.st_mtime_ns)
+        assert "digest" not in next(r for r in records if r["error"] is not None)
+        print(f"✅ {summary['saved']} images in {len(commits)} grouped commits")
+
+
+def test_detector_pipeline_reports_faces():
+    with tempfile.TemporaryDirectory() as tmp:
+        inferencer = LVFaceONNXInferencer(build_tiny_model(os.path.join(tmp, "m.onnx")), use_gpu=False)
+        detector = SCRFDDetector(build_tiny_scrfd(os.path.join(tmp, "d.onnx")), providers=['CPUExecutionProvider'])
+        face_path = os.path.join(tmp, "face.png")
+        empty_path = os.path.join(tmp, "empty.png")
+        cv2.imwrite(face_path, blue_block_image(1280, 960, 512, 320, 64))
+        cv2.imwrite(empty_path, np.zeros((480, 640, 3), dtype=np.uint8))
+
+        commits = []
+        pipeline = FacePipeline(inferencer, commits.append, detector=detector, num_decoders=2, batch_size=8)
+        summary = pipeline.run(iter([(1, face_path), (2, empty_path)]), report_interval=0)
+
+        records = {r["asset_id"]: r for batch in commits for r in batch}
+        assert summary["faces"] == 1
+        assert records[1]["faces"][0]["bbox"] == [448, 256, 128, 128]
+        assert len(records[1]["faces"][0]["embedding"]) == 512
+        assert records[2]["faces"] == [] and records[2]["error"] is None
+        print("✅ detector pipeline returns full-resolution boxes with embeddings")
+
+
+if __name__ == "__main__":
+    test_whole_image_pipeline_groups_commits()
+    test_detector_pipeline_reports_faces()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Test reduced-resolution JPEG decoding for detection and alignment"""
+
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from image_decode import (choose_reduction, decode_for_alignment, decode_for_detection,
+                          request_image_source)
+
+
+def test_choose_reduction():
+    assert choose_reduction((4000, 3000), (640, 640)) == 4   # fit scale 0.16
+    assert choose_reduction((2000, 1500), (640, 640)) == 2   # fit scale 0.32
+    assert choose_reduction((8000, 6000), (640, 640)) == 8
+    assert choose_reduction((1000, 800), (640, 640)) == 1
+    assert choose_reduction(None, (640, 640)) == 1
+    print("✅ reduction keeps the decode at least as large as the detector input")
+
+
+def test_detection_and_alignment_decodes():
+    with tempfile.TemporaryDirectory() as tmp:
+        jpg = os.path.join(tmp, "photo.jpg")
+        png = os.path.join(tmp, "photo.png")
+        img = np.random.randint(0, 255, (3000, 4000, 3), dtype=np.uint8)
+        cv2.imwrite(jpg, img)
+        cv2.imwrite(png, img[:1500, :2000])
+
+        small, scale = decode_for_detection(jpg)
+        assert scale == 4.0 and small.shape == (750, 1000, 3)
+
+        full, scale = decode_for_detection(png)
+        assert scale == 1.0 and full.shape == (1500, 2000, 3)
+
+        # Big faces reuse the detection decode, tiny faces trigger a finer one
+        reused = decode_for_alignment(jpg, [900, 1200], decoded=(small, 4.0))
+        assert reused[0] is small
+        finer, scale = decode_for_alignment(jpg, [150], decoded=(small, 4.0))
+        assert scale == 2.0 and finer.shape == (1500, 2000, 3)
+        print("✅ detection decodes at 1/4, alignment re-decodes only for tiny faces")
+
+
+def test_group_photo_small_faces_decode_once():
+    import image_decode
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jpg = os.path.join(tmp, "group.jpg")
+        cv2.imwrite(jpg, np.random.randint(0, 255, (3000, 4000, 3), dtype=np.uint8))
+        decodes = []
+        imread = image_decode.cv2.imread
+        image_decode.cv2.imread = lambda *args: decodes.append(args[1]) or imread(*args)
+        try:
+            decoded = decode_for_detection(jpg, (1280, 1280))
+            assert decoded[1] == 2.0
+            # 120-220 px faces are 60-110 px in the 1/2-scale decode: aligned from it
+            image, scale = decode_for_alignment(jpg, [120, 160, 220], decoded=decoded)
+            assert image is decoded[0] and len(decodes) == 1
+            # A 50 px face would be upscaled more than 2x: one extra full-resolution decode
+            image, scale = decode_for_alignment(jpg, [50, 160], decoded=decoded)
+            assert scale == 1.0 and len(decodes) == 2
+        finally:
+            image_decode.cv2.imread = imread
+        print("✅ a group photo with 120-220 px faces is decoded once")
+
+
+def test_buffer_decode_matches_path_decode():
+    with tempfile.TemporaryDirectory() as tmp:
+        jpg = os.path.join(tmp, "photo.jpg")
+        cv2.imwrite(jpg, np.random.randint(0, 255, (3000, 4000, 3), dtype=np.uint8))
+        with open(jpg, "rb") as f:
+            data = f.read()
+
+        from_path, path_scale = decode_for_detection(jpg)
+        from_bytes, bytes_scale = decode_for_detection(data)
+        assert bytes_scale == path_scale == 4.0
+        np.testing.assert_array_equal(from_bytes, from_path)
+        print("✅ uploaded bytes decode at reduced scale like files do")
+
+
+def test_request_image_source():
+    from io import BytesIO
+    from flask import Flask, request
+
+    app = Flask(__name__)
+    payload = b"\xff\xd8\xff\xe0fake-jpeg"
+    with app.test_request_context("/", method="POST", json={"image_path": "/data/a.jpg"}):
+        assert request_image_source(request) == "/data/a.jpg"
+    with app.test_request_context("/", method="POST", data=payload, content_type="application/octet-stream"):
+        assert request_image_source(request) == payload
+    with app.test_request_context("/", method="POST", data={"image": (BytesIO(payload), "a.jpg")},
+                                  content_type="multipart/form-data"):
+        assert request_image_source(request) == payload
+    with app.test_request_context("/", method="POST", json={}):
+        assert request_image_source(request) is None
+    print("✅ path, raw body and multipart uploads are all accepted")
+
+
+if __name__ == "__main__":
+    test_choose_reduction()
+    test_detection_and_alignment_decodes()
+    test_group_photo_small_faces_decode_once()
+    test_buffer_decode_matches_path_decode()
+    test_request_image_source()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Test RunJournal resume and ProgressWindow ETA"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_db_writer import FaceDBWriter
+from face_work_queue import FINISH_SQL, FaceWorkQueue, finish_params, outcome_status
+from run_journal import ProgressWindow, open_run
+
+
+def make_db(tmpdir, num_assets=30):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER)")
+    conn.executemany("INSERT INTO assets VALUES (?, ?, 'image/jpeg')",
+                     [(i, f"/photos/{i}.jpg") for i in range(1, num_assets + 1)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def finish(writer, journal, asset_id, face_count=None, error=None):
+    writer.insert(FINISH_SQL, finish_params(asset_id, face_count, error))
+    journal.record(writer, asset_id, outcome_status(face_count, error), seconds=0.01)
+
+
+def test_progress_window_uses_recent_rate():
+    window = ProgressWindow(window_seconds=10)
+    for t in range(0, 100):
+        window.update(t * 10 if t < 50 else 500 + (t - 50), now=float(t))  # 10/s, then 1/s
+    assert abs(window.rate() - 1.0) < 1e-6
+    assert abs(window.eta(60) - 60.0) < 1e-6
+    print("✅ ETA follows the last window, not the lifetime average")
+
+
+def test_resume_restores_counters_and_releases_claims():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir)
+        queue = FaceWorkQueue(db_path)
+        writer = FaceDBWriter(db_path, commit_size=1000, commit_interval=60)
+
+        journal = open_run(db_path, queue, "test")
+        assert journal.total == 30
+        claimed = queue.claim(journal.run_id, limit=20)
+        for asset_id, _ in claimed[:12]:
+            finish(writer, journal, asset_id, face_count=asset_id % 3)
+        finish(writer, journal, claimed[12][0], error="Could not load image")
+        journal.finish(writer, "interrupted")  # crash: 7 claims never finished
+        writer.flush()
+
+        resumed = open_run(db_path, FaceWorkQueue(db_path), "test", resume=True)
+        assert resumed.run_id == journal.run_id
+        assert (resumed.processed, resumed.errors) == (12, 1)
+        assert resumed.high_water_id == claimed[12][0]
+        assert resumed.total == 30
+        rest = []
+        while True:
+            rows = queue.claim(resumed.run_id, limit=50)
+            if not rows:
+                break
+            rest.extend(rows)
+        assert len(rest) == 17
+        writer.close()
+        print("✅ resumed run keeps its counters and re-claims the 7 abandoned assets")
+
+
+def test_new_run_releases_stale_claims():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_db(tmpdir, num_assets=10)
+        queue = FaceWorkQueue(db_path)
+        queue.claim("crashed-run", limit=4)
+        queue.claim("live-run", limit=3)
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE face_work_queue SET claimed_at = claimed_at - 7200 WHERE claimed_by = 'crashed-run'")
+        conn.commit()
+        conn.close()
+
+        journal = open_run(db_path, queue, "test")
+        assert journal.total == 10
+        assert queue.counts() == {"pending": 7, "claimed": 3}
+        print("✅ a new run returns claims abandoned by a crashed worker")
+
+
+if __name__ == "__main__":
+    test_progress_window_uses_recent_rate()
+    test_resume_restores_counters_and_releases_claims()
+    test_new_run_releases_stale_claims()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Test the detection-only SCRFD wrapper end to end on a tiny SCRFD-shaped ONNX graph"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from scrfd_detector import SCRFDDetector, nms
+
+
+def build_tiny_scrfd(path, batch="batch"):
+    """
+    Nine-output graph with det_10g's layout (scores / boxes / kps for strides 8, 16, 32,
+    rows ordered (batch, y, x, anchor)). The score of a cell is the mean of one RGB
+    channel over it (R for stride 8, G for 16, B for 32); every box is the anchor
+    center +- 1 stride and every keypoint is the center + 0.5 stride.
+    """
+    nodes, initializers = [], []
+    score_outs, box_outs, kps_outs = [], [], []
+
+    def const(name, values, dtype=TensorProto.INT64):
+        initializers.append(helper.make_tensor(name, dtype, [len(values)], values))
+        return name
+
+    const("zero", [0.0], TensorProto.FLOAT)
+    for ch, stride in enumerate([8, 16, 32]):
+        p = f"s{stride}"
+        nodes += [
+            helper.make_node("AveragePool", ["data"], [p + "_pool"], kernel_shape=[stride, stride], strides=[stride, stride]),
+            helper.make_node("Slice", [p + "_pool", const(p + "_st", [ch]), const(p + "_en", [ch + 1]), const(p + "_ax", [1])], [p + "_ch"]),
+            helper.make_node("Transpose", [p + "_ch"], [p + "_hw"], perm=[0, 2, 3, 1]),
+            helper.make_node("Tile", [p + "_hw", const(p + "_t2", [1, 1, 1, 2])], [p + "_sc"]),
+            helper.make_node("Reshape", [p + "_sc", const(p + "_r1", [-1, 1])], [f"score_{stride}"]),
+            helper.make_node("Mul", [p + "_hw", "zero"], [p + "_z"]),
+            helper.make_node("Add", [p + "_z", const(p + "_one", [1.0], TensorProto.FLOAT)], [p + "_ones"]),
+            helper.make_node("Tile", [p + "_ones", const(p + "_t8", [1, 1, 1, 8])], [p + "_bx"]),
+            helper.make_node("Reshape", [p + "_bx", const(p + "_r4", [-1, 4])], [f"bbox_{stride}"]),
+            helper.make_node("Add", [p + "_z", const(p + "_half", [0.5], TensorProto.FLOAT)], [p + "_halves"]),
+            helper.make_node("Tile", [p + "_halves", const(p + "_t20", [1, 1, 1, 20])], [p + "_kp"]),
+            helper.make_node("Reshape", [p + "_kp", const(p + "_r10", [-1, 10])], [f"kps_{stride}"]),
+        ]
+        score_outs.append(helper.make_tensor_value_info(f"score_{stride}", TensorProto.FLOAT, None))
+        box_outs.append(helper.make_tensor_value_info(f"bbox_{stride}", TensorProto.FLOAT, None))
+        kps_outs.append(helper.make_tensor_value_info(f"kps_{stride}", TensorProto.FLOAT, None))
+
+    graph = helper.make_graph(
+        nodes, "tiny_scrfd",
+        [helper.make_tensor_value_info("data", TensorProto.FLOAT, [batch, 3, "height", "width"])],
+        score_outs + box_outs + kps_outs,
+        initializer=initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+    return path
+
+
+def blue_block_image(width, height, x, y, size):
+    """Black BGR image with one pure-blue square, which only fires the stride-32 head"""
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[y:y + size, x:x + size, 0] = 255
+    return img
+
+
+def test_detect_maps_back_to_source_coordinates():
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = SCRFDDetector(build_tiny_scrfd(os.path.join(tmp, "det.onnx")), providers=['CPUExecutionProvider'])
+        assert detector.use_kps and detector.fmc == 3
+
+        # 1280x960 -> 640x480 letterbox (scale 0.5); the block covers stride-32 cell (8, 5)
+        img = blue_block_image(1280, 960, 512, 320, 64)
+        bboxes, kpss = detector.detect(img)
+
+        assert bboxes.shape == (1, 5), bboxes
+        np.testing.assert_allclose(bboxes[0, :4], [448, 256, 576, 384], atol=1e-3)
+        assert bboxes[0, 4] > 0.9
+        assert kpss.shape == (1, 5, 2)
+        np.testing.assert_allclose(kpss[0], np.tile([544.0, 352.0], (5, 1)), atol=1e-3)
+
+        empty, _ = detector.detect(np.zeros((300, 300, 3), dtype=np.uint8))
+        assert empty.shape == (0, 5)
+        print("✅ SCRFD boxes and keypoints decoded in source coordinates")
+
+
+def test_detect_batch_matches_single_image():
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = SCRFDDetector(build_tiny_scrfd(os.path.join(tmp, "det.onnx")), providers=['CPUExecutionProvider'])
+        imgs = [
+            blue_block_image(1280, 960, 512, 320, 64),   # scale 0.5
+            blue_block_image(640, 640, 96, 160, 32),     # scale 1.0
+            np.zeros((200, 500, 3), dtype=np.uint8),     # no faces
+            blue_block_image(320, 640, 0, 0, 32),        # scale 1.0, portrait
+            blue_block_image(1920, 1280, 0, 480, 96),    # scale 1/3
+        ]
+        batched = detector.detect_batch(imgs, batch_size=3)
+        assert len(batched) == len(imgs)
+        for img, (dets, kpss) in zip(imgs, batched):
+            single_dets, single_kpss = detector.detect(img)
+            np.testing.assert_allclose(dets, single_dets, atol=1e-3)
+            np.testing.assert_allclose(kpss, single_kpss, atol=1e-3)
+        assert [len(d) for d, _ in batched] == [1, 1, 0, 1, 1]
+        print("✅ detect_batch matches per-image detection")
+
+
+def test_fixed_batch_model_loads_dynamic_export():
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = build_tiny_scrfd(os.path.join(tmp, "det.onnx"), batch=1)
+        detector = SCRFDDetector(model_path, providers=['CPUExecutionProvider'])
+        assert detector.max_batch_size is None
+        assert os.path.exists(os.path.join(tmp, "det_batch.onnx"))
+        assert not isinstance(detector.session.get_inputs()[0].shape[0], int)
+
+        imgs = [blue_block_image(640, 640, 96, 160, 32), blue_block_image(1280, 960, 512, 320, 64)]
+        batched = detector.detect_batch(imgs, batch_size=2)
+        assert [len(d) for d, _ in batched] == [1, 1]
+        np.testing.assert_allclose(batched[1][0], detector.detect(imgs[1])[0], atol=1e-3)
+        print("✅ fixed batch-1 model replaced by its dynamic-batch export")
+
+
+def test_nms():
+    dets = np.array([
+        [0, 0, 10, 10, 0.9],
+        [1, 1, 11, 11, 0.8],
+        [50, 50, 60, 60, 0.7],
+    ], dtype=np.float32)
+    assert nms(dets, 0.4) == [0, 2]
+    print("✅ NMS drops overlapping boxes")
+
+
+if __name__ == "__main__":
+    test_detect_maps_back_to_source_coordinates()
+    test_detect_batch_matches_single_image()
+    test_fixed_batch_model_loads_dynamic_export()
+    test_nms()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Test named ONNX Runtime session profiles"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import onnxruntime as ort
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session_profiles import (create_session, get_profile, optimize_model, optimized_model_path,
+                              provider_options, session_options)
+from test_batch_inference import build_tiny_model
+
+
+def test_builtin_profiles_map_to_session_options():
+    options = session_options("low-memory")
+    assert options.intra_op_num_threads == 2 and options.inter_op_num_threads == 1
+    assert options.execution_mode == ort.ExecutionMode.ORT_SEQUENTIAL
+    assert options.graph_optimization_level == ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+    assert not options.enable_mem_pattern and not options.enable_cpu_mem_arena
+
+    assert session_options("throughput", intra_op_threads=3).intra_op_num_threads == 3
+    providers = provider_options(['CUDAExecutionProvider', 'CPUExecutionProvider'], "low-memory")
+    assert providers[0] == ('CUDAExecutionProvider', {
+        "gpu_mem_limit": str(2048 * 1024 * 1024), "arena_extend_strategy": "kSameAsRequested"
+    })
+    assert providers[1] == 'CPUExecutionProvider'
+    try:
+        get_profile("turbo")
+        assert False, "unknown profile accepted"
+    except ValueError as e:
+        assert "low-memory" in str(e)
+    print("✅ built-in profiles set threads, execution mode, optimization level and arenas")
+
+
+def test_profiles_file_extends_and_writes_optimized_model():
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "profiles.json")
+        with open(config, "w") as f:
+            json.dump({"host-a": {"extends": "latency", "intra_op_threads": 1,
+                                  "optimized_model_dir": os.path.join(tmp, "opt")}}, f)
+
+        profile = get_profile("host-a", config)
+        assert profile["execution_mode"] == "sequential" and profile["intra_op_threads"] == 1
+
+        model_path = build_tiny_model(os.path.join(tmp, "m.onnx"))
+        session = create_session(model_path, ['CPUExecutionProvider'], profile)
+        assert session.get_inputs()[0].name == "data"
+        artifact_path = optimized_model_path(model_path, ['CPUExecutionProvider'], profile)
+        assert os.path.dirname(artifact_path) == os.path.join(tmp, "opt") and os.path.exists(artifact_path)
+        print("✅ JSON profile extends 'latency' and saves the optimized graph")
+
+
+def test_optimized_graph_is_keyed_and_loaded():
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = build_tiny_model(os.path.join(tmp, "m.onnx"))
+        providers = ['CPUExecutionProvider']
+        batch = np.random.RandomState(0).rand(2, 3, 112, 112).astype(np.float32)
+        expected = create_session(model_path, providers).run(None, {"data": batch})[0]
+        assert not os.path.exists(model_path + ".digest")  # nothing optimized yet: the model is not hashed
+
+        artifact_path = optimize_model(model_path, providers)
+        assert os.path.dirname(artifact_path) == tmp and f"ort{ort.__version__}" in artifact_path
+        assert artifact_path != optimized_model_path(model_path, providers, "low-memory")  # level "basic"
+
+        opt_out = dict(get_profile(), use_optimized_model=False)
+        assert create_session(model_path, providers, opt_out)._model_path == model_path
+        session = create_session(model_path, providers)
+        assert session._model_path == artifact_path
+        np.testing.assert_allclose(session.run(None, {"data": batch})[0], expected, rtol=1e-5, atol=1e-5)
+
+        build_tiny_model(model_path, feat_dim=128)  # new weights -> new hash -> artifact no longer matches
+        assert create_session(model_path, providers)._model_path == model_path
+        print("✅ pre-optimized graph is loaded until the model changes")
+
+
+if __name__ == "__main__":
+    test_builtin_profiles_map_to_session_options()
+    test_profiles_file_extends_and_writes_optimized_model()
+    test_optimized_graph_is_keyed_and_loaded()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test ShardedFaceProcessor end to end on a tiny ONNX model"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_store import EmbeddingStore
+from face_work_queue import FaceWorkQueue
+from sharded_processor import ShardedFaceProcessor
+from test_batch_inference import build_tiny_model
+
+
+def make_library(tmpdir, num_assets):
+    db_path = os.path.join(tmpdir, "metadata.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("""
+        CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER,
+            bbox_x INTEGER, bbox_y INTEGER, bbox_w INTEGER, bbox_h INTEGER, confidence REAL)
+    """)
+    for i in range(1, num_assets + 1):
+        path = os.path.join(tmpdir, f"{i}.jpg")
+        cv2.imwrite(path, np.random.randint(0, 255, (96, 128, 3), dtype=np.uint8))
+        conn.execute("INSERT INTO assets VALUES (?, ?, 'image/jpeg')", (i, path))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_shard_bounds_split_pending_evenly():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_library(tmpdir, 10)
+        bounds = FaceWorkQueue(db_path).shard_bounds(3)
+        assert bounds == [(0, 3), (3, 6), (6, None)]  # 3 + 3 + 4 assets
+        print("✅ 10 pending assets -> 3 contiguous shards")
+
+
+def test_shards_write_through_one_writer():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = make_library(tmpdir, 24)
+        runner = ShardedFaceProcessor(
+            num_shards=2,
+            db_path=db_path,
+            embeddings_dir=os.path.join(tmpdir, "store"),
+            model_path=build_tiny_model(os.path.join(tmpdir, "m.onnx")),
+            infer_batch_size=4,
+            commit_size=5
+        )
+        summary = runner.run(batch_size=5)
+        assert (summary["saved"], summary["errors"]) == (24, 0)
+        assert sorted(summary["shards"]) == [0, 1]
+        assert all(shard["saved"] > 0 for shard in summary["shards"].values())
+
+        conn = sqlite3.connect(db_path)
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM face_work_queue GROUP BY status"))
+        faces = conn.execute("SELECT COUNT(DISTINCT asset_id) FROM face_detections").fetchone()[0]
+        fingerprints = conn.execute("SELECT COUNT(*) FROM face_asset_files").fetchone()[0]
+        conn.close()
+        assert counts == {"done": 24} and faces == 24 and fingerprints == 24
+        assert EmbeddingStore(os.path.join(tmpdir, "store")).count() == 24
+        print("✅ 2 worker processes, 24 assets, one writer and one embedding store")
+
+
+if __name__ == "__main__":
+    test_shard_bounds_split_pending_evenly()
+    test_shards_write_through_one_writer()
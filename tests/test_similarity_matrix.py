@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Test batch cosine similarity matrices"""
+
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from similarity_matrix import similarity_blocks, similarity_matrix, stream_similarity_matrix
+
+
+def pairwise(a, b):
+    # calculate_similarity, pair by pair
+    out = np.zeros((len(a), len(b)))
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            norms = np.linalg.norm(x) * np.linalg.norm(y)
+            out[i, j] = np.dot(x, y) / norms if norms > 0 else 0.0
+    return out
+
+
+def test_matrix_matches_pairwise():
+    rng = np.random.RandomState(0)
+    a = rng.randn(7, 32).astype(np.float32) * 3
+    b = rng.randn(5, 32).astype(np.float32)
+    b[2] = 0  # zero vector scores 0
+    np.testing.assert_allclose(similarity_matrix(a, b), pairwise(a, b), rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(similarity_matrix(a), pairwise(a, a), rtol=1e-5, atol=1e-6)
+
+    blocks = list(similarity_blocks(a, b, block_rows=3))
+    assert [start for start, _ in blocks] == [0, 3, 6] and blocks[-1][1].shape == (1, 5)
+    print("✅ one GEMM gives the same matrix as pairwise calculate_similarity")
+
+
+def test_stream_is_a_loadable_npy():
+    rng = np.random.RandomState(1)
+    a = rng.randn(10, 16).astype(np.float32)
+    b = rng.randn(4, 16).astype(np.float32)
+    chunks = list(stream_similarity_matrix(a, b, block_rows=4))
+    assert len(chunks) == 1 + 3  # header, then one chunk per row block
+    loaded = np.load(io.BytesIO(b"".join(chunks)))
+    assert loaded.dtype == np.float32 and loaded.shape == (10, 4)
+    np.testing.assert_allclose(loaded, similarity_matrix(a, b), rtol=1e-6)
+
+    half = np.load(io.BytesIO(b"".join(stream_similarity_matrix(a, b, np.float16))))
+    assert half.dtype == np.float16
+    np.testing.assert_allclose(half, loaded, atol=1e-3)
+    print("✅ streamed chunks form a .npy that np.load reads")
+
+
+if __name__ == "__main__":
+    test_matrix_matches_pairwise()
+    test_stream_is_a_loadable_npy()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark approximate (IVF) against exact face search
+Synthetic galleries where each identity has several noisy embeddings around its own
+direction (as real face galleries do), so cells mean something; reports build
+time, load time of the memory-mapped index, and recall@k vs latency per nprobe next
+to the exact FaceIndex latency.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_index import FaceIndex
+from ivf_index import IVFIndex, recall_curve
+
+
+def synthetic_gallery(size, dim, faces_per_identity, noise, rng):
+    """Unit embeddings clustered by identity, plus probes that are new photos of gallery identities"""
+    identities = max(1, size // faces_per_identity)
+    centers = rng.randn(identities, dim).astype(np.float32)
+    owners = rng.randint(0, identities, size)
+    gallery = centers[owners] + noise * rng.randn(size, dim).astype(np.float32)
+    return gallery, centers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark IVF vs exact face search')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100000, 1000000], help='gallery sizes')
+    parser.add_argument('--dim', type=int, default=512, help='embedding size')
+    parser.add_argument('--k', type=int, default=10, help='matches per probe')
+    parser.add_argument('--probes', type=int, default=100, help='probe queries')
+    parser.add_argument('--nlist', type=int, default=None, help='IVF cells (default ~4*sqrt(N))')
+    parser.add_argument('--nprobes', type=int, nargs='*', default=[1, 4, 8, 16, 32, 64], help='nprobe sweep')
+    parser.add_argument('--faces-per-identity', type=int, default=20, help='gallery faces per identity')
+    parser.add_argument('--noise', type=float, default=0.8, help='per-face noise around an identity')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print(f"📊 IVF vs exact | dim {args.dim} | k {args.k} | {args.probes} probes | {os.cpu_count()} cores")
+    for size in args.sizes:
+        gallery, centers = synthetic_gallery(size, args.dim, args.faces_per_identity, args.noise, rng)
+        exact = FaceIndex(dim=args.dim, capacity=size)
+        exact.add(np.arange(1, size + 1), gallery)
+        probe_owners = rng.randint(0, len(centers), args.probes)
+        probes = centers[probe_owners] + args.noise * rng.randn(args.probes, args.dim).astype(np.float32)
+
+        start = time.perf_counter()
+        exact.search(probes, args.k)
+        exact_ms = (time.perf_counter() - start) * 1000 / args.probes
+
+        start = time.perf_counter()
+        index = IVFIndex.build(exact.ids, gallery, args.nlist)
+        build_seconds = time.perf_counter() - start
+        del gallery
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "ivf")
+            index.save(path)
+            del index
+            start = time.perf_counter()
+            mapped = IVFIndex.load(path)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            print("=" * 60)
+            print(f"🗂️  {size:,} faces | {mapped.nlist} cells | build {build_seconds:.1f}s | "
+                  f"mmap load {load_ms:.1f} ms")
+            print(f"   {'nprobe':>6} {'recall':>7} {'ms/probe':>9} {'speedup':>8}")
+            print(f"   {'exact':>6} {1.0:7.3f} {exact_ms:9.2f} {1.0:7.1f}x")
+            for point in recall_curve(mapped, exact, probes, args.k, args.nprobes):
+                print(f"   {point['nprobe']:>6} {point['recall']:7.3f} {point['ms']:9.2f} "
+                      f"{exact_ms / point['ms']:7.1f}x")
+            del mapped
+        del exact
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark person clustering
+Writes a synthetic gallery (default 100k faces, several photos per identity) into a
+temporary metadata.sqlite + embedding store, times a full recluster() and an
+incremental update() of newly added faces, and scores the clusters against the
+true identities with pairwise precision / recall.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_clustering import FaceClusterer
+
+
+def pairs(counts):
+    return int((counts * (counts - 1) // 2).sum())
+
+
+def pairwise_scores(truth, predicted):
+    """Precision / recall over same-cluster face pairs"""
+    _, joint = np.unique(np.stack([truth, predicted]), axis=1, return_counts=True)
+    together = pairs(joint)
+    precision = together / max(pairs(np.unique(predicted, return_counts=True)[1]), 1)
+    recall = together / max(pairs(np.unique(truth, return_counts=True)[1]), 1)
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark incremental face clustering')
+    parser.add_argument('--size', type=int, default=100000, help='faces clustered from scratch')
+    parser.add_argument('--new-faces', type=int, default=2000, help='faces added for the incremental update')
+    parser.add_argument('--dim', type=int, default=512, help='embedding size')
+    parser.add_argument('--faces-per-identity', type=int, default=20, help='mean photos per identity')
+    parser.add_argument('--noise', type=float, default=0.8, help='per-face noise around an identity')
+    parser.add_argument('--threshold', type=float, default=0.45, help='cosine similarity linking two faces')
+    parser.add_argument('--k', type=int, default=10, help='neighbours per face')
+    parser.add_argument('--nprobe', type=int, default=8, help='IVF cells probed by recluster')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    identities = max(1, args.size // args.faces_per_identity)
+    centers = rng.randn(identities, args.dim).astype(np.float32)
+    truth = rng.randint(0, identities, args.size + args.new_faces)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "metadata.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER,
+                        embedding_shard INTEGER, embedding_row INTEGER)""")
+        store = EmbeddingStore(os.path.join(tmpdir, "store"), dim=args.dim)
+
+        def add(owners):
+            for first in range(0, len(owners), 50000):
+                chunk = owners[first:first + 50000]
+                vectors = centers[chunk] + args.noise * rng.randn(len(chunk), args.dim).astype(np.float32)
+                conn.executemany("INSERT INTO face_detections (asset_id, embedding_shard, embedding_row) "
+                                 "VALUES (0, ?, ?)", store.append(vectors))
+            conn.commit()
+
+        add(truth[:args.size])
+        clusterer = FaceClusterer(db_path, store, threshold=args.threshold, k=args.k)
+        print(f"📊 {args.size:,} faces of {identities:,} identities | dim {args.dim} | k {args.k} | "
+              f"threshold {args.threshold} | {os.cpu_count()} cores")
+        print("=" * 72)
+
+        def report(label, stats, faces):
+            assigned = dict(conn.execute("SELECT face_id, cluster_id FROM face_clusters"))
+            predicted = np.array([assigned[i] for i in range(1, faces + 1)])
+            precision, recall = pairwise_scores(truth[:faces], predicted)
+            print(f"{label}: {stats['seconds']:.1f}s | {len(np.unique(predicted)):,} clusters | "
+                  f"pairwise precision {precision:.3f} recall {recall:.3f}")
+
+        stats = clusterer.recluster(nprobe=args.nprobe)
+        report(f"🔁 Full recluster of {args.size:,}", stats, args.size)
+
+        start = time.time()
+        again = clusterer.recluster(nprobe=args.nprobe)
+        print(f"🔁 Recluster again: {time.time() - start:.1f}s | "
+              f"{again['kept_ids']:,}/{again['clusters']:,} cluster ids kept")
+
+        add(truth[args.size:])
+        stats = clusterer.update()
+        report(f"➕ Incremental update of {args.new_faces:,}", stats, args.size + args.new_faces)
+        print(f"   joined {stats['joined']:,} | new clusters {stats['new_clusters']:,} | merged {stats['merged']:,}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark 1:N face search
+Builds FaceIndex galleries of random unit embeddings (default 10k, 100k and 1M faces)
+and reports build time, memory, single-probe latency and batched probe throughput,
+against the per-pair LVFaceONNXInferencer.calculate_similarity loop it replaces.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_index import FaceIndex
+from inference_onnx import LVFaceONNXInferencer
+
+CHUNK = 100000
+
+
+def build(size, dim, rng):
+    """Index of ``size`` random faces, added in chunks as sync would"""
+    index = FaceIndex(dim=dim, capacity=size)
+    start = time.perf_counter()
+    for first in range(0, size, CHUNK):
+        rows = min(CHUNK, size - first)
+        index.add(np.arange(first + 1, first + rows + 1), rng.randn(rows, dim).astype(np.float32))
+    return index, time.perf_counter() - start
+
+
+def pairwise_ms(gallery, probe, limit):
+    """Per-pair loop over the first ``limit`` faces, scaled to the whole gallery"""
+    limit = min(limit, len(gallery))
+    start = time.perf_counter()
+    for row in gallery[:limit]:
+        LVFaceONNXInferencer.calculate_similarity(probe, row)
+    return (time.perf_counter() - start) * 1000 * len(gallery) / limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FaceIndex search')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000, 1000000], help='gallery sizes')
+    parser.add_argument('--dim', type=int, default=512, help='embedding size')
+    parser.add_argument('--k', type=int, default=10, help='matches per probe')
+    parser.add_argument('--batch', type=int, default=64, help='probes per batched query')
+    parser.add_argument('--repeats', type=int, default=20, help='single-probe queries per size')
+    parser.add_argument('--pairwise-limit', type=int, default=20000,
+                        help='pairs timed for the calculate_similarity baseline')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print(f"📊 FaceIndex | dim {args.dim} | k {args.k} | {os.cpu_count()} cores")
+    print("=" * 80)
+    print(f"  {'faces':>9} {'build s':>8} {'MB':>7} {'p50 ms':>8} {'batch ms':>9} {'probes/s':>9} {'pairwise ms':>12}")
+    for size in args.sizes:
+        index, build_seconds = build(size, args.dim, rng)
+        probes = rng.randn(args.batch, args.dim).astype(np.float32)
+
+        index.search(probes[0], args.k)  # warm up
+        times = []
+        for i in range(args.repeats):
+            start = time.perf_counter()
+            index.search(probes[i % len(probes)], args.k)
+            times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        index.search(probes, args.k)
+        batch_ms = (time.perf_counter() - start) * 1000
+
+        baseline = pairwise_ms(index._matrix[:size], probes[0], args.pairwise_limit)
+        print(f"  {size:>9,} {build_seconds:8.2f} {index.stats()['memory_mb']:7.0f} "
+              f"{np.percentile(times, 50):8.2f} {batch_ms:9.1f} {args.batch / batch_ms * 1000:9.0f} "
+              f"{baseline:12.0f}")
+        del index
+
+
+if __name__ == "__main__":
+    main()
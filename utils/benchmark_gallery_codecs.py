@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark compressed search galleries
+For each FaceIndex encoding (float32, float16, int8, pq) reports memory per face,
+encode time, batched search latency and recall@k against the float32 gallery, with
+and without re-ranking from a float32 embedding store. Verification TPR@FPR on
+IJB-C for the same encodings comes from ``src/onnx_ijbc.py --gallery-encodings``.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_index import FaceIndex
+from ivf_index import recall_at_k
+from benchmark_ann import synthetic_gallery
+
+
+def timed_search(index, probes, k):
+    index.search(probes[:1], k)  # warm up
+    start = time.perf_counter()
+    ids, _ = index.search(probes, k)
+    return ids, (time.perf_counter() - start) * 1000 / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compressed FaceIndex encodings')
+    parser.add_argument('--size', type=int, default=100000, help='gallery faces')
+    parser.add_argument('--dim', type=int, default=512, help='embedding size')
+    parser.add_argument('--k', type=int, default=10, help='matches per probe')
+    parser.add_argument('--probes', type=int, default=64, help='probe queries')
+    parser.add_argument('--rerank', type=int, default=100, help='candidates re-scored at full precision')
+    parser.add_argument('--encodings', nargs='*', default=['float32', 'float16', 'int8', 'pq'])
+    parser.add_argument('--faces-per-identity', type=int, default=20, help='gallery faces per identity')
+    parser.add_argument('--noise', type=float, default=0.8, help='per-face noise around an identity')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    gallery, centers = synthetic_gallery(args.size, args.dim, args.faces_per_identity, args.noise, rng)
+    probes = centers[rng.randint(0, len(centers), args.probes)] + \
+        args.noise * rng.randn(args.probes, args.dim).astype(np.float32)
+    ids = np.arange(1, args.size + 1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EmbeddingStore(tmpdir, dim=args.dim, dtype="float32")
+        refs = store.append(gallery)
+
+        print(f"📊 {args.size:,} faces | dim {args.dim} | k {args.k} | {args.probes} probes | "
+              f"re-rank {args.rerank} | {os.cpu_count()} cores")
+        print("=" * 84)
+        print(f"  {'encoding':<9} {'B/face':>7} {'MB':>7} {'encode s':>9} {'ms/probe':>9} {'recall':>7} "
+              f"{'+rerank ms':>11} {'recall':>7}")
+        exact = FaceIndex(dim=args.dim, capacity=args.size)
+        exact.add(ids, gallery)
+        exact_ids = exact.search(probes, args.k)[0]
+        del exact
+        for encoding in args.encodings:
+            index = FaceIndex(dim=args.dim, capacity=args.size, encoding=encoding, rerank=args.rerank)
+            start = time.perf_counter()
+            index.add(ids, gallery, refs)
+            encode_seconds = time.perf_counter() - start
+            found, ms = timed_search(index, probes, args.k)
+            row = (f"  {encoding:<9} {index.codec.bytes_per_face:>7} {index.stats()['memory_mb']:7.1f} "
+                   f"{encode_seconds:9.2f} {ms:9.2f} {recall_at_k(exact_ids, found):7.3f}")
+            if encoding != 'float32' and args.rerank:
+                index.store = store
+                reranked, rerank_ms = timed_search(index, probes, args.k)
+                row += f" {rerank_ms:11.2f} {recall_at_k(exact_ids, reranked):7.3f}"
+            print(row)
+            del index
+
+
+if __name__ == "__main__":
+    main()
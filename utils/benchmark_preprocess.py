@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: legacy per-face preprocessing vs shared batched preprocess_batch
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from face_preprocess import preprocess_batch
+
+
+def legacy_inferencer(imgs):
+    """Old LVFaceONNXInferencer._preprocess_image path (float64 intermediates)"""
+    tensors = []
+    for img in imgs:
+        img_rgb = cv2.cvtColor(cv2.resize(img, (112, 112)), cv2.COLOR_BGR2RGB)
+        img_normalized = ((np.transpose(img_rgb, (2, 0, 1)) / 255.0) - 0.5) / 0.5
+        tensors.append(img_normalized.astype(np.float32)[np.newaxis, ...])
+    return np.concatenate(tensors, axis=0)
+
+
+def legacy_blob(imgs):
+    """Old ArcFaceORT.forward path"""
+    return cv2.dnn.blobFromImages(imgs, 1.0 / 127.5, (112, 112), (127.5, 127.5, 127.5), swapRB=True)
+
+
+def time_it(fn, imgs, repeats):
+    fn(imgs)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(imgs)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LVFace preprocessing')
+    parser.add_argument('--batch-size', type=int, default=64, help='faces per batch')
+    parser.add_argument('--crop-size', type=int, default=160, help='side of the synthetic face crops')
+    parser.add_argument('--repeats', type=int, default=50, help='timed iterations per method')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    imgs = [rng.randint(0, 255, (args.crop_size, args.crop_size, 3), dtype=np.uint8)
+            for _ in range(args.batch_size)]
+    out = np.empty((args.batch_size, 3, 112, 112), dtype=np.float32)
+    staging = np.empty((args.batch_size, 112, 112, 3), dtype=np.uint8)
+
+    methods = [
+        ("legacy float64 per-face", legacy_inferencer),
+        ("cv2.dnn.blobFromImages", legacy_blob),
+        ("preprocess_batch", preprocess_batch),
+        ("preprocess_batch (reused buffers)", lambda x: preprocess_batch(x, out=out, staging=staging)),
+        ("preprocess_batch float16", lambda x: preprocess_batch(x, dtype=np.float16)),
+    ]
+
+    print(f"📊 Preprocessing {args.batch_size} crops of {args.crop_size}x{args.crop_size} ({args.repeats} runs)")
+    print("=" * 60)
+    baseline = None
+    for name, fn in methods:
+        elapsed = time_it(fn, imgs, args.repeats)
+        baseline = baseline or elapsed
+        per_face_us = elapsed / args.batch_size * 1e6
+        print(f"  {name:<36} {per_face_us:8.1f} µs/face  {baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sharded CPU face processing throughput from 1 to N worker processes
+Builds a synthetic JPEG library once, then runs ShardedFaceProcessor on a fresh
+copy of the database for every shard count and reports images/s, speedup and
+parallel efficiency.
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sharded_processor import ShardedFaceProcessor
+
+
+def build_library(root, num_images, width, height):
+    db_path = os.path.join(root, "library.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE assets (id INTEGER PRIMARY KEY, path TEXT, mime TEXT)")
+    conn.execute("""
+        CREATE TABLE face_detections (id INTEGER PRIMARY KEY, asset_id INTEGER,
+            bbox_x INTEGER, bbox_y INTEGER, bbox_w INTEGER, bbox_h INTEGER, confidence REAL)
+    """)
+    rng = np.random.RandomState(0)
+    for i in range(1, num_images + 1):
+        path = os.path.join(root, f"{i:06d}.jpg")
+        noise = rng.randint(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+        cv2.imwrite(path, cv2.resize(noise, (width, height)), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        conn.execute("INSERT INTO assets VALUES (?, ?, 'image/jpeg')", (i, path))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def shard_counts(max_shards):
+    counts = [1]
+    while counts[-1] * 2 < max_shards:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_shards:
+        counts.append(max_shards)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded multi-process face processing')
+    parser.add_argument('--model', default='models/LVFace-B_Glint360K.onnx', help='LVFace ONNX model')
+    parser.add_argument('--images', type=int, default=400, help='synthetic images in the library')
+    parser.add_argument('--width', type=int, default=1920, help='synthetic image width')
+    parser.add_argument('--height', type=int, default=1080, help='synthetic image height')
+    parser.add_argument('--max-shards', type=int, default=os.cpu_count() or 1, help='largest shard count')
+    parser.add_argument('--infer-batch-size', type=int, default=16, help='faces per session.run')
+    parser.add_argument('--use-detector', action='store_true', help='include SCRFD detection and alignment')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as root:
+        print(f"🖼️  Writing {args.images} synthetic {args.width}x{args.height} JPEGs...")
+        library = build_library(root, args.images, args.width, args.height)
+
+        print(f"📊 {args.images} images, {cores} cores, model {args.model}")
+        print("=" * 60)
+        baseline = None
+        for shards in shard_counts(args.max_shards):
+            run_dir = os.path.join(root, f"run{shards}")
+            os.makedirs(run_dir)
+            db_path = os.path.join(run_dir, "metadata.sqlite")
+            shutil.copy(library, db_path)
+
+            runner = ShardedFaceProcessor(
+                num_shards=shards,
+                intra_op_threads=max(1, cores // shards),
+                db_path=db_path,
+                embeddings_dir=os.path.join(run_dir, "store"),
+                model_path=args.model,
+                infer_batch_size=args.infer_batch_size,
+                use_detector=args.use_detector
+            )
+            start = time.perf_counter()
+            summary = runner.run(batch_size=50)
+            elapsed = time.perf_counter() - start
+            rate = summary["saved"] / elapsed
+            baseline = baseline or rate
+            speedup = rate / baseline
+            print(f"  {shards:>3} shards x {runner.intra_op_threads:>2} threads  {rate:8.1f} img/s  "
+                  f"{speedup:5.2f}x  efficiency {speedup / shards * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
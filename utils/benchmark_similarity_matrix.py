@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch similarity matrices
+Compares N x M comparisons done the /similarity way (JSON-encode two 512-float
+lists, decode, calculate_similarity per pair) with one similarity_matrix GEMM and
+with the streamed .npy the /similarity_matrix endpoint returns.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inference_onnx import LVFaceONNXInferencer
+from similarity_matrix import similarity_matrix, stream_similarity_matrix
+
+
+def per_pair_seconds(a, b, limit):
+    """Time ``limit`` /similarity-style round trips (minus the network), scaled to N x M"""
+    pairs = [(i % len(a), (i // len(a)) % len(b)) for i in range(limit)]
+    start = time.perf_counter()
+    for i, j in pairs:
+        body = json.loads(json.dumps({"embedding1": a[i].tolist(), "embedding2": b[j].tolist()}))
+        similarity = LVFaceONNXInferencer.calculate_similarity(np.array(body["embedding1"]),
+                                                               np.array(body["embedding2"]))
+        json.dumps({"similarity": float(similarity)})
+    return (time.perf_counter() - start) * len(a) * len(b) / limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /similarity vs /similarity_matrix')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100, 1000, 10000], help='N (= M) embeddings per side')
+    parser.add_argument('--dim', type=int, default=512, help='embedding size')
+    parser.add_argument('--pair-limit', type=int, default=2000, help='pairs timed for the per-pair baseline')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print(f"📊 Similarity matrix | dim {args.dim} | {os.cpu_count()} cores")
+    print("=" * 76)
+    print(f"  {'N x M':>13} {'per-pair s':>11} {'matrix s':>9} {'stream s':>9} {'npy MB':>8} {'speedup':>9}")
+    for n in args.sizes:
+        a = rng.randn(n, args.dim).astype(np.float32)
+        b = rng.randn(n, args.dim).astype(np.float32)
+        baseline = per_pair_seconds(a, b, args.pair_limit)
+
+        start = time.perf_counter()
+        similarity_matrix(a, b)
+        matrix_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        payload = io.BytesIO()
+        for chunk in stream_similarity_matrix(a, b):
+            payload.write(chunk)
+        stream_seconds = time.perf_counter() - start
+        print(f"  {f'{n}x{n}':>13} {baseline:11.2f} {matrix_seconds:9.3f} {stream_seconds:9.3f} "
+              f"{payload.tell() / 2**20:8.1f} {baseline / stream_seconds:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
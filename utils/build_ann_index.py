@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Build the IVF index used by the service's approximate /search
+Loads every stored face embedding (face_detections -> embedding store), trains the
+IVF cells, writes the memory-mappable index directory and prints recall@k vs
+latency against the exact search for a sample of gallery faces as probes.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_store import EmbeddingStore
+from face_index import FaceIndex
+from ivf_index import IVFIndex, default_nlist, recall_curve
+
+DB_PATH = '/mnt/c/Users/yanbo/wSpace/vlm-photo-engine/vlmPhotoHouse/metadata.sqlite'
+EMBEDDINGS_DIR = "E:/VLM_DATA/embeddings/face_store"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the IVF face index from the database')
+    parser.add_argument('output', help='index directory (replaced atomically)')
+    parser.add_argument('--db', default=DB_PATH, help='metadata.sqlite')
+    parser.add_argument('--embeddings-dir', default=EMBEDDINGS_DIR, help='embedding store directory')
+    parser.add_argument('--nlist', type=int, default=None, help='IVF cells (default ~4*sqrt(N))')
+    parser.add_argument('--nprobe', type=int, default=16, help='default cells scanned per probe')
+    parser.add_argument('--iterations', type=int, default=10, help='k-means iterations')
+    parser.add_argument('--k', type=int, default=10, help='k for the recall report')
+    parser.add_argument('--probes', type=int, default=200, help='gallery faces used as report probes (0 = none)')
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.embeddings_dir)
+    exact = FaceIndex(dim=store.dim)
+    start = time.perf_counter()
+    exact.sync(args.db, store)
+    print(f"📥 {len(exact):,} faces loaded in {time.perf_counter() - start:.1f}s")
+    if not len(exact):
+        print("❌ No stored face embeddings")
+        return
+
+    nlist = args.nlist or default_nlist(len(exact))
+    start = time.perf_counter()
+    index = IVFIndex.build(exact.ids, exact.embeddings, nlist, args.iterations, synced_id=exact.synced_id)
+    index.nprobe = args.nprobe
+    index.save(args.output)
+    print(f"✅ IVF index: {len(index):,} faces, {nlist} cells, built in {time.perf_counter() - start:.1f}s "
+          f"-> {args.output}")
+
+    if args.probes:
+        rng = np.random.RandomState(0)
+        probes = exact.embeddings[rng.choice(len(exact), min(args.probes, len(exact)), replace=False)]
+        mapped = IVFIndex.load(args.output)
+        print(f"📊 recall@{args.k} vs latency ({len(probes)} probes)")
+        print(f"   {'nprobe':>6} {'recall':>7} {'ms/probe':>9}")
+        for point in recall_curve(mapped, exact, probes, args.k):
+            print(f"   {point['nprobe']:>6} {point['recall']:7.3f} {point['ms']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
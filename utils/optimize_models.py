@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Ahead-of-time ONNX Runtime optimization with a cold-start report
+Serializes the optimized graph of each model next to it (keyed by model hash, ORT
+version, optimization level and execution provider; see
+session_profiles.optimized_model_path) and measures session creation plus first
+inference in fresh processes, before and after.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from session_profiles import get_profile, optimize_model, optimized_model_path
+
+# Runs in a fresh interpreter so every sample is a real cold start
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import numpy as np
+from session_profiles import create_session, get_profile
+profile = get_profile(sys.argv[2])
+profile["use_optimized_model"] = sys.argv[4] == "1"
+session = create_session(sys.argv[1], json.loads(sys.argv[3]), profile)
+ready = time.perf_counter()
+inp = session.get_inputs()[0]
+shape = [1 if not isinstance(d, int) else d for d in inp.shape]
+session.run(None, {inp.name: np.zeros(shape, dtype=np.float32)})
+print(json.dumps({"session": ready - start, "first_run": time.perf_counter() - ready}))
+"""
+
+
+def cold_start(model_path, profile, providers, use_optimized, repeats):
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START, model_path, profile, json.dumps(providers), "1" if use_optimized else "0"],
+            cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: sorted(sample[key] for sample in samples)[len(samples) // 2] for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-optimize ONNX models and report cold-start time')
+    parser.add_argument('models', nargs='*', default=['models/LVFace-B_Glint360K.onnx'], help='ONNX models')
+    parser.add_argument('--session-profile', default='default', help='session profile to optimize for')
+    parser.add_argument('--gpu', action='store_true', help='optimize for CUDAExecutionProvider')
+    parser.add_argument('--repeats', type=int, default=3, help='cold starts per measurement (median)')
+    parser.add_argument('--no-benchmark', action='store_true', help='only write the optimized graphs')
+    args = parser.parse_args()
+
+    providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if args.gpu else ['CPUExecutionProvider']
+    profile = get_profile(args.session_profile)
+    for model_path in args.models:
+        model_path = os.path.abspath(model_path)
+        print(f"📦 {model_path} ({os.path.getsize(model_path) / 2**20:.1f} MB, profile {profile['name']})")
+        if not args.no_benchmark:
+            before = cold_start(model_path, args.session_profile, providers, False, args.repeats)
+
+        artifact_path = optimize_model(model_path, providers, profile)
+        assert artifact_path == optimized_model_path(model_path, providers, profile)
+        print(f"✅ Optimized graph: {artifact_path}")
+        if args.no_benchmark:
+            continue
+
+        after = cold_start(model_path, args.session_profile, providers, True, args.repeats)
+        print(f"⏱️  Cold start (median of {args.repeats} fresh processes):")
+        print(f"   {'':<16} {'session s':>10} {'first run s':>12}")
+        print(f"   {'original':<16} {before['session']:10.3f} {before['first_run']:12.3f}")
+        print(f"   {'pre-optimized':<16} {after['session']:10.3f} {after['first_run']:12.3f}")
+        print(f"   🚀 session creation {before['session'] / after['session']:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Sweep ONNX Runtime session profiles on this host
+Loads the LVFace model once per profile and reports batched throughput (images/s)
+and single-image latency, so the profile for a deployment is picked from numbers
+measured on that machine.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inference_onnx import LVFaceONNXInferencer
+from session_profiles import load_profiles
+
+
+def measure(inferencer, batch, seconds):
+    """Images/s for repeated batched runs over roughly ``seconds``"""
+    inferencer.infer_tensor(batch)  # warm up (allocations, kernel selection)
+    runs = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        inferencer.infer_tensor(batch)
+        runs += 1
+    return runs * len(batch) / (time.perf_counter() - start)
+
+
+def single_latency_ms(inferencer, row, repeats):
+    inferencer.infer_tensor(row)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        inferencer.infer_tensor(row)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(times, 50)), float(np.percentile(times, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ONNX Runtime session profiles')
+    parser.add_argument('--model', default='models/LVFace-B_Glint360K.onnx', help='LVFace ONNX model')
+    parser.add_argument('--profiles', nargs='*', default=None, help='profiles to sweep (default: all)')
+    parser.add_argument('--session-profiles', default=None, help='JSON file with extra/overridden profiles')
+    parser.add_argument('--batch-size', type=int, default=32, help='faces per batched run')
+    parser.add_argument('--seconds', type=float, default=5.0, help='timed seconds per profile')
+    parser.add_argument('--latency-repeats', type=int, default=50, help='single-image runs for latency')
+    parser.add_argument('--gpu', action='store_true', help='use CUDAExecutionProvider')
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.session_profiles)
+    names = args.profiles or list(profiles)
+    batch = np.random.RandomState(0).uniform(-1, 1, (args.batch_size, 3, 112, 112)).astype(np.float32)
+
+    print(f"📊 {args.model} | batch {args.batch_size} | {os.cpu_count()} cores | "
+          f"{'CUDA' if args.gpu else 'CPU'}")
+    print("=" * 72)
+    print(f"  {'profile':<16} {'load s':>7} {'img/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    results = []
+    for name in names:
+        start = time.perf_counter()
+        inferencer = LVFaceONNXInferencer(args.model, use_gpu=args.gpu, batch_size=args.batch_size,
+                                          profile=dict(profiles[name], name=name))
+        load_seconds = time.perf_counter() - start
+        rate = measure(inferencer, batch, args.seconds)
+        p50, p95 = single_latency_ms(inferencer, batch[:1], args.latency_repeats)
+        results.append((name, rate, p50))
+        print(f"  {name:<16} {load_seconds:7.2f} {rate:9.1f} {p50:8.2f} {p95:8.2f}")
+        del inferencer
+
+    best_rate = max(results, key=lambda r: r[1])
+    best_latency = min(results, key=lambda r: r[2])
+    print(f"🏆 Throughput: {best_rate[0]} ({best_rate[1]:.1f} img/s) | "
+          f"Latency: {best_latency[0]} ({best_latency[2]:.2f} ms p50)")
+
+
+if __name__ == "__main__":
+    main()